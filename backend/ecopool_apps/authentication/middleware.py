@@ -0,0 +1,51 @@
+"""
+JWT authentication for WebSocket connections
+
+Browsers cannot set headers on a WebSocket handshake, so the access token
+is read from the ?token= query parameter, falling back to an
+"Authorization: Bearer <token>" header for other clients.
+"""
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .models import User
+
+
+@database_sync_to_async
+def get_user_for_token(raw_token):
+    """Active user of a valid access token, AnonymousUser otherwise"""
+    try:
+        token = AccessToken(raw_token)
+    except TokenError:
+        return AnonymousUser()
+    user = User.objects.select_related('organization').filter(
+        **{api_settings.USER_ID_FIELD: token.get(api_settings.USER_ID_CLAIM)}, is_active=True
+    ).first()
+    return user or AnonymousUser()
+
+
+def token_from_scope(scope):
+    query = parse_qs(scope.get('query_string', b'').decode())
+    if query.get('token'):
+        return query['token'][0]
+    for name, value in scope.get('headers', []):
+        if name == b'authorization':
+            parts = value.decode().split()
+            if len(parts) == 2 and parts[0] in api_settings.AUTH_HEADER_TYPES:
+                return parts[1]
+    return None
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """Populate scope['user'] from a simplejwt access token"""
+
+    async def __call__(self, scope, receive, send):
+        raw_token = token_from_scope(scope)
+        scope = dict(scope, user=await get_user_for_token(raw_token) if raw_token else AnonymousUser())
+        return await super().__call__(scope, receive, send)
@@ -0,0 +1,111 @@
+"""
+Leaderboard ranking for diamond wallets
+
+Ranks are competition ranks on lifetime_earned (1 + number of wallets that
+earned strictly more), computed globally or within an organization.
+"""
+from bisect import bisect_left, insort
+from threading import RLock
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import DiamondWallet
+
+
+GLOBAL_SCOPE = None
+
+
+class InMemoryLeaderboard:
+    """
+    Per-scope sorted arrays of negated lifetime_earned values.
+    Each scope is loaded from the database on first use and then kept
+    current incrementally through record_wallet(), which runs once the
+    wallet change commits. A wallet the scope does not know yet (created in
+    another process) reloads the scope; changes other processes make to
+    known wallets are not seen, so this is for single-process deployments.
+    """
+
+    def __init__(self):
+        self._lock = RLock()
+        self._scores = {}    # scope -> sorted list of -lifetime_earned
+        self._earned = {}    # scope -> {wallet_id: lifetime_earned}
+
+    def _load(self, scope):
+        wallets = DiamondWallet.objects.all()
+        if scope is not GLOBAL_SCOPE:
+            wallets = wallets.filter(user__organization_id=scope)
+        earned = dict(wallets.values_list('id', 'lifetime_earned'))
+        self._earned[scope] = earned
+        self._scores[scope] = sorted(-value for value in earned.values())
+
+    def _ensure_loaded(self, scope):
+        if scope not in self._scores:
+            self._load(scope)
+
+    def rank(self, wallet, organization_id=GLOBAL_SCOPE):
+        """Rank of the wallet within the scope (O(log N) after the first load)"""
+        with self._lock:
+            self._ensure_loaded(organization_id)
+            if wallet.id not in self._earned[organization_id]:
+                self._load(organization_id)
+            earned = self._earned[organization_id].get(wallet.id, wallet.lifetime_earned)
+            return bisect_left(self._scores[organization_id], -earned) + 1
+
+    def record_wallet(self, wallet, organization_id=GLOBAL_SCOPE):
+        """Apply a wallet's new lifetime_earned to every loaded scope it belongs to"""
+        with self._lock:
+            for scope in (GLOBAL_SCOPE, organization_id):
+                if scope not in self._scores:
+                    continue
+                scores = self._scores[scope]
+                earned = self._earned[scope]
+                previous = earned.get(wallet.id)
+                if previous is not None:
+                    del scores[bisect_left(scores, -previous)]
+                earned[wallet.id] = wallet.lifetime_earned
+                insort(scores, -wallet.lifetime_earned)
+                if scope is GLOBAL_SCOPE and organization_id is GLOBAL_SCOPE:
+                    break
+
+    def clear(self):
+        with self._lock:
+            self._scores.clear()
+            self._earned.clear()
+
+
+in_memory_leaderboard = InMemoryLeaderboard()
+
+
+def in_memory_enabled():
+    return getattr(settings, 'LEADERBOARD_IN_MEMORY', False)
+
+
+class LeaderboardService:
+    """Service for wallet leaderboard ranks"""
+
+    @staticmethod
+    def get_rank(wallet, organization_id=GLOBAL_SCOPE):
+        """
+        Rank of a wallet by lifetime_earned, globally or within one
+        organization. Uses the in-memory leaderboard when enabled, otherwise
+        a single indexed COUNT of wallets that earned more.
+        """
+        if in_memory_enabled():
+            return in_memory_leaderboard.rank(wallet, organization_id)
+
+        higher = DiamondWallet.objects.filter(lifetime_earned__gt=wallet.lifetime_earned)
+        if organization_id is not GLOBAL_SCOPE:
+            higher = higher.filter(user__organization_id=organization_id)
+        return higher.count() + 1
+
+    @staticmethod
+    def record_wallet_change(wallet):
+        """
+        Keep the in-memory leaderboard current after a wallet update, once
+        the surrounding transaction commits (a rolled back change is never
+        applied)
+        """
+        if in_memory_enabled():
+            organization_id = wallet.user.organization_id
+            transaction.on_commit(lambda: in_memory_leaderboard.record_wallet(wallet, organization_id))
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rewards', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='diamondtransaction',
+            index=models.Index(fields=['wallet', '-created_at'], name='diamondtxn_wallet_created_idx'),
+        ),
+    ]
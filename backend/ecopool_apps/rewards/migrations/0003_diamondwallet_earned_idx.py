@@ -0,0 +1,19 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rewards', '0002_diamondtransaction_diamondtxn_wallet_created_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='diamondwallet',
+            index=models.Index(fields=['-lifetime_earned'], name='diamondwallet_earned_idx'),
+        ),
+    ]
@@ -17,6 +17,9 @@ class DiamondWallet(models.Model):
 
     class Meta:
         db_table = 'diamond_wallets'
+        indexes = [
+            models.Index(fields=['-lifetime_earned'], name='diamondwallet_earned_idx'),
+        ]
 
 
 class DiamondTransaction(models.Model):
@@ -46,6 +49,9 @@ class DiamondTransaction(models.Model):
     class Meta:
         db_table = 'diamond_transactions'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['wallet', '-created_at'], name='diamondtxn_wallet_created_idx'),
+        ]
 
 
 class NGOPartner(models.Model):
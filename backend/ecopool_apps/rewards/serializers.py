@@ -82,4 +82,5 @@ class DashboardSerializer(serializers.Serializer):
     total_distance_km = serializers.DecimalField(max_digits=10, decimal_places=2)
     total_donations = serializers.DecimalField(max_digits=10, decimal_places=2)
     rank = serializers.IntegerField()
+    organization_rank = serializers.IntegerField(allow_null=True)
     level = serializers.CharField()
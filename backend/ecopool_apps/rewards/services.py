@@ -1,11 +1,14 @@
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
+from django.db.models import Sum, Q, OuterRef, Subquery, Value, DecimalField
+from django.db.models.functions import Coalesce
 from decimal import Decimal
 from datetime import timedelta
 from django.utils import timezone
 import uuid
 from .models import DiamondWallet, DiamondTransaction, Donation, Redemption, ConversionRate
+from .leaderboard import LeaderboardService
 
 User = get_user_model()
 
@@ -60,6 +63,7 @@ class DiamondEconomyService:
         wallet.balance += diamonds
         wallet.lifetime_earned += diamonds
         wallet.save()
+        LeaderboardService.record_wallet_change(wallet)
         
         # Create transaction
         DiamondTransaction.objects.create(
@@ -83,6 +87,7 @@ class DiamondEconomyService:
         wallet.balance += donation.diamonds_earned
         wallet.lifetime_earned += donation.diamonds_earned
         wallet.save()
+        LeaderboardService.record_wallet_change(wallet)
         
         # Create transaction
         DiamondTransaction.objects.create(
@@ -117,6 +122,7 @@ class DiamondEconomyService:
         wallet.balance -= redemption_option.diamond_cost
         wallet.lifetime_redeemed += redemption_option.diamond_cost
         wallet.save()
+        LeaderboardService.record_wallet_change(wallet)
         
         # Create redemption
         voucher_code = f"EC-{uuid.uuid4().hex[:8].upper()}"
@@ -146,6 +152,25 @@ class DiamondEconomyService:
         
         return redemption
     
+    @staticmethod
+    def get_wallet_with_stats(user):
+        """
+        Fetch a user's wallet with its dashboard totals in a single query
+        Annotates total_co2_saved and total_distance_km (over all ride
+        transactions) and total_donations (over all donations)
+        """
+        zero = Value(Decimal('0'), output_field=DecimalField(max_digits=12, decimal_places=2))
+        ride_earnings = Q(transactions__transaction_type='EARN_RIDE')
+        donation_totals = Donation.objects.filter(
+            user=OuterRef('user')
+        ).values('user').annotate(total=Sum('amount')).values('total')
+
+        return DiamondWallet.objects.filter(user=user).annotate(
+            total_co2_saved=Coalesce(Sum('transactions__co2_saved', filter=ride_earnings), zero),
+            total_distance_km=Coalesce(Sum('transactions__distance_km', filter=ride_earnings), zero),
+            total_donations=Coalesce(Subquery(donation_totals), zero),
+        ).get()
+    
     @staticmethod
     def get_user_level(lifetime_earned):
         """Calculate user level based on lifetime earnings"""
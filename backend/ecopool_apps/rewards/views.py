@@ -2,7 +2,7 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Sum, Q
+from django.db.models import Q
 from decimal import Decimal
 from .models import (
     DiamondWallet, DiamondTransaction, NGOPartner,
@@ -15,6 +15,7 @@ from .serializers import (
     DashboardSerializer
 )
 from .services import DiamondEconomyService
+from .leaderboard import LeaderboardService
 
 
 class DiamondWalletViewSet(viewsets.ReadOnlyModelViewSet):
@@ -28,28 +29,15 @@ class DiamondWalletViewSet(viewsets.ReadOnlyModelViewSet):
     @action(detail=False, methods=['get'])
     def dashboard(self, request):
         """Get complete dashboard data"""
-        wallet = DiamondWallet.objects.get(user=request.user)
+        # Wallet and all totals come from one aggregate query
+        wallet = DiamondEconomyService.get_wallet_with_stats(request.user)
         transactions = DiamondTransaction.objects.filter(wallet=wallet)[:10]
         
-        # Calculate stats
-        ride_transactions = transactions.filter(
-            transaction_type='EARN_RIDE'
-        )
-        total_co2 = ride_transactions.aggregate(
-            total=Sum('co2_saved')
-        )['total'] or Decimal('0')
-        
-        total_distance = ride_transactions.aggregate(
-            total=Sum('distance_km')
-        )['total'] or Decimal('0')
-        
-        total_donations = Donation.objects.filter(
-            user=request.user
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
-        
         # Calculate rank
-        all_wallets = DiamondWallet.objects.all().order_by('-lifetime_earned')
-        rank = list(all_wallets.values_list('id', flat=True)).index(wallet.id) + 1
+        rank = LeaderboardService.get_rank(wallet)
+        organization_rank = None
+        if request.user.organization_id:
+            organization_rank = LeaderboardService.get_rank(wallet, request.user.organization_id)
         
         # Get level
         level_name, level_num = DiamondEconomyService.get_user_level(
@@ -59,10 +47,11 @@ class DiamondWalletViewSet(viewsets.ReadOnlyModelViewSet):
         data = {
             'wallet': DiamondWalletSerializer(wallet).data,
             'recent_transactions': DiamondTransactionSerializer(transactions, many=True).data,
-            'total_co2_saved': total_co2,
-            'total_distance_km': total_distance,
-            'total_donations': total_donations,
+            'total_co2_saved': wallet.total_co2_saved,
+            'total_distance_km': wallet.total_distance_km,
+            'total_donations': wallet.total_donations,
             'rank': rank,
+            'organization_rank': organization_rank,
             'level': f"{level_name} (Level {level_num})",
         }
         
@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Ride, RideTracking, SOSAlert, ChatMessage, Feedback, Complaint
+from .models import (
+    Ride, RideParticipant, RideTracking, SOSAlert, ChatMessage, ChatReadReceipt, Tombstone, RetentionCheckpoint,
+    Feedback, Complaint
+)
 
 
 @admin.register(Ride)
@@ -9,6 +12,13 @@ class RideAdmin(admin.ModelAdmin):
     list_filter = ['status', 'created_at']
 
 
+@admin.register(RideParticipant)
+class RideParticipantAdmin(admin.ModelAdmin):
+    list_display = ['ride', 'user', 'role', 'created_at']
+    search_fields = ['user__username']
+    list_filter = ['role']
+
+
 @admin.register(RideTracking)
 class RideTrackingAdmin(admin.ModelAdmin):
     list_display = ['ride', 'timestamp', 'latitude', 'longitude']
@@ -30,6 +40,23 @@ class ChatMessageAdmin(admin.ModelAdmin):
     list_filter = ['timestamp']
 
 
+@admin.register(ChatReadReceipt)
+class ChatReadReceiptAdmin(admin.ModelAdmin):
+    list_display = ['ride', 'user', 'last_read_message_id', 'updated_at']
+    search_fields = ['user__username']
+
+
+@admin.register(Tombstone)
+class TombstoneAdmin(admin.ModelAdmin):
+    list_display = ['model', 'object_id', 'ride_id', 'user', 'deleted_at']
+    list_filter = ['model', 'deleted_at']
+
+
+@admin.register(RetentionCheckpoint)
+class RetentionCheckpointAdmin(admin.ModelAdmin):
+    list_display = ['policy', 'last_id', 'pass_started_at', 'last_run_at', 'last_run_rows', 'rows_deleted']
+
+
 @admin.register(Feedback)
 class FeedbackAdmin(admin.ModelAdmin):
     list_display = ['ride', 'from_user', 'to_user', 'rating', 'created_at']
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class RidesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ecopool_apps.rides'
+
+    def ready(self):
+        from . import membership, sync  # noqa: F401 (signal receivers)
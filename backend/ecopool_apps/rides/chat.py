@@ -0,0 +1,175 @@
+"""
+Ride chat delivery and persistence
+
+Messages sent over the live ride socket are delivered to the ride's chat
+group immediately and queued in chat_buffer; a background thread writes
+them with bulk_create every CHAT_PERSIST_FLUSH_SECONDS (sooner once
+CHAT_PERSIST_BATCH_SIZE messages are waiting). Each queued message has a
+future resolved with its id, which the sender's connection announces as
+{client_id: id} so clients can refer to it.
+
+Reading is tracked per participant as a high-water mark (ChatReadReceipt)
+rather than by flagging individual messages, and a reconnecting client
+asks for the messages after the last id it has seen.
+"""
+import atexit
+import logging
+import threading
+import uuid
+from concurrent.futures import Future
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import ChatMessage, ChatReadReceipt
+
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_LIFETIME = timedelta(hours=24)
+
+
+def chat_group_name(ride_id):
+    return f'ride_{ride_id}_chat'
+
+
+def message_payload(message, client_id=None):
+    """Wire format of a chat message; id is None until it is persisted"""
+    return {
+        'id': message.id,
+        'client_id': client_id,
+        'ride': message.ride_id,
+        'sender': message.sender_id,
+        'message': message.message,
+        'timestamp': message.timestamp.isoformat(),
+    }
+
+
+def publish_chat_event(ride_id, event):
+    """Send an event to a ride's chat group from synchronous code"""
+    channel_layer = get_channel_layer()
+    if channel_layer is not None:
+        async_to_sync(channel_layer.group_send)(chat_group_name(ride_id), event)
+
+
+class ChatPersistenceBuffer:
+    """Per-process queue of unsaved chat messages, written in micro-batches from a background thread"""
+
+    def __init__(self, batch_size=50, flush_interval=0.5):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._messages = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._writer = None
+
+    def add(self, ride_id, sender_id, text, client_id=None):
+        """
+        Queue a message without touching the database
+        Returns (message, client_id, future); the message has no id yet and
+        the future resolves to it once the message is written
+        """
+        now = timezone.now()
+        message = ChatMessage(
+            ride_id=ride_id, sender_id=sender_id, message=text,
+            # Set explicitly: bulk_create skips auto_now_add and save()
+            timestamp=now, expires_at=now + MESSAGE_LIFETIME
+        )
+        client_id = client_id or uuid.uuid4().hex
+        future = Future()
+        with self._lock:
+            self._messages.append((message, client_id, future))
+            full = len(self._messages) >= self.batch_size
+        self._ensure_writer()
+        if full:
+            self._wakeup.set()
+        return message, client_id, future
+
+    def pending_for(self, ride_id):
+        """Queued (message, client_id) pairs of one ride"""
+        with self._lock:
+            return [(message, client_id) for message, client_id, _ in self._messages if message.ride_id == ride_id]
+
+    def flush(self):
+        """Write all queued messages with one bulk_create and resolve their futures"""
+        with self._flush_lock:
+            with self._lock:
+                entries, self._messages = self._messages, []
+            if not entries:
+                return 0
+            try:
+                ChatMessage.objects.bulk_create([message for message, _, _ in entries], batch_size=self.batch_size)
+            except Exception as exc:
+                for _, _, future in entries:
+                    future.set_exception(exc)
+                raise
+            for message, _, future in entries:
+                future.set_result(message.id)
+            return len(entries)
+
+    def _ensure_writer(self):
+        if self._writer is not None and self._writer.is_alive():
+            return
+        with self._lock:
+            if self._writer is not None and self._writer.is_alive():
+                return
+            self._writer = threading.Thread(target=self._run_writer, name='ride-chat-writer', daemon=True)
+            self._writer.start()
+
+    def _run_writer(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Failed to write buffered chat messages')
+            finally:
+                close_old_connections()
+
+
+chat_buffer = ChatPersistenceBuffer(
+    batch_size=getattr(settings, 'CHAT_PERSIST_BATCH_SIZE', 50),
+    flush_interval=getattr(settings, 'CHAT_PERSIST_FLUSH_SECONDS', 0.5),
+)
+atexit.register(chat_buffer.flush)
+
+
+def messages_after(ride_id, after_id, limit=None):
+    """Persisted messages of a ride with id > after_id, oldest first"""
+    queryset = ChatMessage.objects.filter(
+        ride_id=ride_id, id__gt=after_id, expires_at__gt=timezone.now()
+    ).order_by('id')
+    return list(queryset[:limit] if limit else queryset)
+
+
+def mark_read(ride_id, user_id, last_read_message_id):
+    """
+    Move a participant's read mark forward (never backwards), at most to
+    the ride's newest message so a made-up id cannot hide later messages
+    Returns the stored mark
+    """
+    newest = ChatMessage.objects.filter(ride_id=ride_id).aggregate(newest=Max('id'))['newest'] or 0
+    last_read_message_id = min(last_read_message_id, newest)
+    receipt, created = ChatReadReceipt.objects.get_or_create(
+        ride_id=ride_id, user_id=user_id,
+        defaults={'last_read_message_id': last_read_message_id}
+    )
+    if created or receipt.last_read_message_id >= last_read_message_id:
+        return receipt.last_read_message_id
+    # Conditional so a concurrent, further mark is never moved back
+    ChatReadReceipt.objects.filter(
+        id=receipt.id, last_read_message_id__lt=last_read_message_id
+    ).update(last_read_message_id=last_read_message_id, updated_at=timezone.now())
+    return last_read_message_id
+
+
+def read_marks(ride_id):
+    """user_id -> last read message id for a ride"""
+    return dict(ChatReadReceipt.objects.filter(ride_id=ride_id).values_list('user_id', 'last_read_message_id'))
@@ -0,0 +1,271 @@
+"""
+Live ride channel
+
+One WebSocket per ride at ws/rides/<ride_id>/?token=<access token>. The
+driver pushes location fixes ({"type": "location", "latitude", "longitude"}
+or {"type": "location", "points": [...]}); passengers and organization
+admins receive {"type": "location", ...} messages with the newest position.
+Fixes are only accepted while the ride is in progress (or in emergency);
+everyone gets {"type": "status", "status"} when that changes.
+
+Delivery is latest-value-wins: each connection keeps only the newest
+position it has not sent yet, so a slow subscriber skips stale positions
+instead of working through a backlog. Fixes are persisted afterwards by
+live_location_writer, off the delivery path.
+
+The driver and passengers also share the ride's chat (see chat.py):
+{"type": "chat.message", "message", "client_id"} is delivered at once as
+a chat.message with id null, followed by chat.saved {client_id: id} when
+it has been written; {"type": "chat.read", "last_read_id"} moves the
+sender's read mark and is relayed as chat.read. On connect participants
+get a chat.backlog with the messages after ?since_id= (default: their
+read mark; the same cursor as the chat REST delta sync) and everyone's
+read marks.
+"""
+import asyncio
+from urllib.parse import parse_qs
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.utils import timezone
+
+from .chat import chat_buffer, chat_group_name, mark_read, message_payload, messages_after, read_marks
+from .membership import ride_role
+from .models import Ride
+from .serializers import LocationUpdateSerializer
+from .tracking import TRACKED_STATUSES, live_location_writer
+
+
+CHAT_MESSAGE_MAX_LENGTH = 2000
+
+
+def ride_group_name(ride_id):
+    return f'ride_{ride_id}'
+
+
+def location_message(ride_id, fix):
+    """Group event carrying one position; the fix is a dict with latitude, longitude and timestamp"""
+    return {
+        'type': 'ride.location',
+        'location': {
+            'ride': ride_id,
+            'latitude': str(fix['latitude']),
+            'longitude': str(fix['longitude']),
+            'timestamp': (fix.get('timestamp') or timezone.now()).isoformat(),
+        },
+    }
+
+
+def publish_location(ride_id, fix):
+    """Send a position to a ride's subscribers from synchronous code (e.g. the REST endpoint)"""
+    channel_layer = get_channel_layer()
+    if channel_layer is not None:
+        async_to_sync(channel_layer.group_send)(ride_group_name(ride_id), location_message(ride_id, fix))
+
+
+def publish_ride_status(ride_id, status):
+    """Tell connected clients a ride was started, completed or moved to emergency"""
+    channel_layer = get_channel_layer()
+    if channel_layer is not None:
+        async_to_sync(channel_layer.group_send)(ride_group_name(ride_id), {'type': 'ride.status', 'status': status})
+
+
+class RideConsumer(AsyncJsonWebsocketConsumer):
+    """Driver publishes, passengers and organization admins subscribe"""
+
+    async def connect(self):
+        self.ride_id = int(self.scope['url_route']['kwargs']['ride_id'])
+        self.group_name = ride_group_name(self.ride_id)
+        self._latest = None
+        self._latest_timestamp = None
+        self._sender = None
+
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.close(code=4401)
+            return
+        ride = await self._get_ride(user)
+        if ride is None:
+            await self.close(code=4403)
+            return
+
+        self.user = user
+        self.is_driver = ride.driver_id == user.id
+        self.status = ride.status
+        self.is_participant = self.is_driver or ride.is_passenger
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        if self.is_participant:
+            await self.channel_layer.group_add(chat_group_name(self.ride_id), self.channel_name)
+        await self.accept()
+        if ride.current_latitude is not None:
+            await self.send_json({
+                'type': 'location',
+                'ride': ride.id,
+                'latitude': str(ride.current_latitude),
+                'longitude': str(ride.current_longitude),
+                'timestamp': ride.last_fix_at.isoformat() if ride.last_fix_at else None,
+            })
+        if self.is_participant:
+            await self.send_json(await self._chat_backlog())
+
+    async def disconnect(self, code):
+        if getattr(self, 'group_name', None):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+            await self.channel_layer.group_discard(chat_group_name(self.ride_id), self.channel_name)
+        if self._sender is not None:
+            self._sender.cancel()
+
+    async def receive_json(self, content, **kwargs):
+        handlers = {
+            'location': self._receive_location,
+            'chat.message': self._receive_chat_message,
+            'chat.read': self._receive_chat_read,
+        }
+        handler = handlers.get(content.get('type'))
+        if handler is None:
+            await self.send_json({'type': 'error', 'error': 'Unknown message type'})
+            return
+        await handler(content)
+
+    async def _receive_location(self, content):
+        if not self.is_driver:
+            await self.send_json({'type': 'error', 'error': 'Only the driver can update location'})
+            return
+        if self.status not in TRACKED_STATUSES:
+            await self.send_json({'type': 'error', 'error': 'Ride is not in progress'})
+            return
+
+        serializer = LocationUpdateSerializer(data=content)
+        if not serializer.is_valid():
+            await self.send_json({'type': 'error', 'error': 'Latitude and longitude required', 'details': serializer.errors})
+            return
+
+        now = timezone.now()
+        points = [{**fix, 'timestamp': fix.get('timestamp') or now} for fix in serializer.validated_data['points']]
+        newest = max(points, key=lambda fix: fix['timestamp'])
+        await self.channel_layer.group_send(self.group_name, location_message(self.ride_id, newest))
+        live_location_writer.submit(self.ride_id, points)
+
+    async def ride_location(self, event):
+        """Group event: keep the newest position and make sure it gets sent"""
+        location = event['location']
+        # Timestamps are UTC ISO strings, so they compare in time order
+        if self._latest_timestamp and location['timestamp'] < self._latest_timestamp:
+            return
+        self._latest = location
+        self._latest_timestamp = location['timestamp']
+        if self._sender is None or self._sender.done():
+            self._sender = asyncio.ensure_future(self._send_latest())
+
+    async def ride_status(self, event):
+        """Group event: the ride's status changed (start, completion or SOS)"""
+        self.status = event['status']
+        await self.send_json({'type': 'status', 'ride': self.ride_id, 'status': event['status']})
+
+    async def _send_latest(self):
+        # Positions arriving while a send is in flight overwrite _latest,
+        # so only the newest one goes out next
+        while self._latest is not None:
+            location, self._latest = self._latest, None
+            await self.send_json({'type': 'location', **location})
+
+    async def _receive_chat_message(self, content):
+        if not self.is_participant:
+            await self.send_json({'type': 'error', 'error': 'You are not part of this ride'})
+            return
+        text = str(content.get('message') or '').strip()
+        if not text or len(text) > CHAT_MESSAGE_MAX_LENGTH:
+            await self.send_json({
+                'type': 'error', 'error': f'Message must be 1 to {CHAT_MESSAGE_MAX_LENGTH} characters'
+            })
+            return
+
+        client_id = str(content['client_id'])[:64] if content.get('client_id') else None
+        message, client_id, saved = chat_buffer.add(self.ride_id, self.user.id, text, client_id)
+        await self.channel_layer.group_send(
+            chat_group_name(self.ride_id),
+            {'type': 'chat.message', 'message': message_payload(message, client_id)}
+        )
+        asyncio.ensure_future(self._announce_saved(client_id, saved))
+
+    async def _announce_saved(self, client_id, saved):
+        """Tell the chat the id of a message once the writer thread has stored it"""
+        try:
+            message_id = await asyncio.wrap_future(saved)
+        except Exception:
+            await self.send_json({'type': 'error', 'error': 'Message could not be saved', 'client_id': client_id})
+            return
+        await self.channel_layer.group_send(
+            chat_group_name(self.ride_id), {'type': 'chat.saved', 'ids': {client_id: message_id}}
+        )
+
+    async def _receive_chat_read(self, content):
+        if not self.is_participant:
+            await self.send_json({'type': 'error', 'error': 'You are not part of this ride'})
+            return
+        try:
+            last_read_id = int(content.get('last_read_id'))
+        except (TypeError, ValueError):
+            await self.send_json({'type': 'error', 'error': 'last_read_id must be an integer'})
+            return
+        last_read_id = await database_sync_to_async(mark_read)(self.ride_id, self.user.id, last_read_id)
+        await self.channel_layer.group_send(
+            chat_group_name(self.ride_id),
+            {'type': 'chat.read', 'user': self.user.id, 'last_read_id': last_read_id}
+        )
+
+    async def chat_message(self, event):
+        await self.send_json({'type': 'chat.message', **event['message']})
+
+    async def chat_saved(self, event):
+        await self.send_json({'type': 'chat.saved', 'ids': event['ids']})
+
+    async def chat_read(self, event):
+        await self.send_json({'type': 'chat.read', 'user': event['user'], 'last_read_id': event['last_read_id']})
+
+    @database_sync_to_async
+    def _chat_backlog(self):
+        """Messages after ?since_id= (or the user's read mark), plus everyone's read marks"""
+        marks = read_marks(self.ride_id)
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        try:
+            since_id = int(query['since_id'][0])
+        except (KeyError, ValueError):
+            since_id = marks.get(self.user.id, 0)
+
+        limit = getattr(settings, 'CHAT_BACKLOG_LIMIT', 200)
+        # Taken before the query so a message written in between is not missed
+        pending = chat_buffer.pending_for(self.ride_id)
+        messages = messages_after(self.ride_id, since_id, limit + 1)
+        has_more = len(messages) > limit
+        payloads = [message_payload(message) for message in messages[:limit]]
+        if not has_more:
+            # Messages still waiting for the writer thread
+            fetched = {message.id for message in messages}
+            payloads += [
+                message_payload(message, client_id)
+                for message, client_id in pending
+                if message.id is None or message.id not in fetched
+            ]
+        return {
+            'type': 'chat.backlog',
+            'messages': payloads,
+            'has_more': has_more,
+            'read_receipts': {str(user_id): mark for user_id, mark in marks.items()},
+        }
+
+    @database_sync_to_async
+    def _get_ride(self, user):
+        """The ride if the user may follow it: its driver, a passenger or an admin of the driver's organization"""
+        ride = Ride.objects.select_related('driver').filter(id=self.ride_id).first()
+        if ride is None:
+            return None
+        ride.is_passenger = ride_role(ride.id, user.id) == 'passenger'
+        if ride.driver_id == user.id or ride.is_passenger:
+            return ride
+        if user.role == 'admin' and user.organization_id == ride.driver.organization_id:
+            return ride
+        return None
@@ -0,0 +1,112 @@
+"""
+Management command to compute tracked distances for rides recorded before
+the streaming path-length accumulator existed
+Run once after deploying: python manage.py backfill_ride_distances
+"""
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ecopool_apps.rides.models import Ride, RideTracking
+from ecopool_apps.trips.spatial_utils import decode_polyline, haversine_km
+
+
+class Command(BaseCommand):
+    help = 'Backfill tracked_distance_km for rides without accumulator data'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of rides processed per vectorized pass'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        min_step_km = getattr(settings, 'RIDE_PATH_MIN_STEP_METERS', 10.0) / 1000
+        max_speed_kmh = getattr(settings, 'RIDE_PATH_MAX_SPEED_KMH', 180.0)
+
+        ride_ids = list(
+            Ride.objects.filter(last_fix_at__isnull=True).order_by('id').values_list('id', flat=True)
+        )
+        updated = 0
+
+        for offset in range(0, len(ride_ids), batch_size):
+            batch_ids = ride_ids[offset:offset + batch_size]
+            rides = {ride.id: ride for ride in Ride.objects.filter(id__in=batch_ids)}
+
+            # Raw points for the whole batch in one query, ordered per ride
+            rows = list(
+                RideTracking.objects.filter(ride_id__in=batch_ids)
+                .order_by('ride_id', 'timestamp', 'id')
+                .values_list('ride_id', 'latitude', 'longitude', 'timestamp')
+            )
+            # Compressed rides contribute their stored polyline first (no
+            # timestamps, so no speed filter), followed by any late raw points
+            polyline_paths = [
+                (ride.id, np.array(decode_polyline(ride.track_polyline), dtype=float).reshape(-1, 2))
+                for ride in rides.values() if ride.track_polyline
+            ]
+            ride_index = np.concatenate(
+                [np.full(len(path), ride_id, dtype=np.int64) for ride_id, path in polyline_paths]
+                + [np.array([row[0] for row in rows], dtype=np.int64)]
+            )
+            coords = np.concatenate(
+                [path for _, path in polyline_paths]
+                + [np.array([(row[1], row[2]) for row in rows], dtype=float).reshape(-1, 2)]
+            )
+            seconds = np.concatenate(
+                [np.full(len(path), np.nan) for _, path in polyline_paths]
+                + [np.array([row[3].timestamp() for row in rows], dtype=float)]
+            )
+
+            order = np.argsort(ride_index, kind='stable')
+            ride_index, coords, seconds = ride_index[order], coords[order], seconds[order]
+
+            totals = {}
+            if len(ride_index) > 1:
+                distances = haversine_km(coords[:-1, 0], coords[:-1, 1], coords[1:, 0], coords[1:, 1])
+                hours = (seconds[1:] - seconds[:-1]) / 3600
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    speeds = distances / hours
+                valid = (
+                    (ride_index[1:] == ride_index[:-1])
+                    & (distances >= min_step_km)
+                    & ~(speeds > max_speed_kmh)
+                )
+                unique_ids, segment_owner = np.unique(ride_index[1:][valid], return_inverse=True)
+                sums = np.bincount(segment_owner, weights=distances[valid], minlength=len(unique_ids))
+                totals = dict(zip(unique_ids.tolist(), sums.tolist()))
+
+            # Anchor the accumulator on each ride's last raw fix; rides with
+            # only a polyline are anchored on its last point and end time so
+            # later runs skip them
+            last_fixes = {row[0]: row for row in rows}
+            for ride_id, path in polyline_paths:
+                if ride_id not in last_fixes and len(path):
+                    ride = rides[ride_id]
+                    last_fixes[ride_id] = (
+                        ride_id, Decimal(str(round(path[-1][0], 7))), Decimal(str(round(path[-1][1], 7))),
+                        ride.end_time or ride.updated_at
+                    )
+
+            changed = []
+            for ride_id, ride in rides.items():
+                if ride_id not in last_fixes:
+                    continue
+                ride.tracked_distance_km = Decimal(str(round(totals.get(ride_id, 0.0), 3)))
+                _, ride.last_fix_latitude, ride.last_fix_longitude, ride.last_fix_at = last_fixes[ride_id]
+                changed.append(ride)
+
+            Ride.objects.bulk_update(
+                changed,
+                ['tracked_distance_km', 'last_fix_latitude', 'last_fix_longitude', 'last_fix_at']
+            )
+            updated += len(changed)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ Backfilled tracked distance for {updated} rides')
+        )
@@ -0,0 +1,28 @@
+"""
+Management command to rebuild the ride membership index (RideParticipant)
+from Ride.driver and Ride.passengers, e.g. after writes that bypassed
+model signals
+Usage: python manage.py backfill_ride_participants [--ride 12 --ride 13]
+"""
+from django.core.management.base import BaseCommand
+
+from ecopool_apps.rides.membership import rebuild_participants
+
+
+class Command(BaseCommand):
+    help = 'Rebuild ride participant rows from ride drivers and passengers'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ride',
+            type=int,
+            action='append',
+            dest='ride_ids',
+            help='Only rebuild this ride (repeatable); all rides by default'
+        )
+
+    def handle(self, *args, **options):
+        written = rebuild_participants(options['ride_ids'])
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ Wrote {written} ride participant rows')
+        )
@@ -1,22 +1,22 @@
 """
 Management command to clean up expired chat messages (older than 24 hours)
+Deleted messages leave tombstones for delta sync clients; tombstones older
+than SYNC_TOMBSTONE_RETENTION_DAYS are removed. Both run as batched,
+resumable retention policies (see purge_expired_data for all of them).
 Run this as a cron job: python manage.py cleanup_expired_chats
 """
 from django.core.management.base import BaseCommand
-from django.utils import timezone
-from ecopool_apps.rides.models import ChatMessage
+from ecopool_apps.rides.retention import RETENTION_POLICIES, run_policy
 
 
 class Command(BaseCommand):
     help = 'Delete chat messages older than 24 hours'
 
     def handle(self, *args, **options):
-        now = timezone.now()
-        expired_messages = ChatMessage.objects.filter(expires_at__lt=now)
-        count = expired_messages.count()
+        count = run_policy(RETENTION_POLICIES['chat_messages'])['deleted']
+        run_policy(RETENTION_POLICIES['sync_tombstones'])
         
         if count > 0:
-            expired_messages.delete()
             self.stdout.write(
                 self.style.SUCCESS(f'✅ Deleted {count} expired chat messages')
             )
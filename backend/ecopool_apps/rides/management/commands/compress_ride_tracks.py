@@ -0,0 +1,34 @@
+"""
+Management command to compress the raw GPS tracks of finished rides
+Run this as a cron job: python manage.py compress_ride_tracks
+"""
+from django.core.management.base import BaseCommand
+from ecopool_apps.rides.models import Ride, RideTracking
+from ecopool_apps.rides.tracking import compress_ride_track
+
+
+class Command(BaseCommand):
+    help = 'Simplify completed/cancelled ride tracks into encoded polylines and prune raw points'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=None,
+            help='Simplification tolerance in meters (defaults to RIDE_TRACK_TOLERANCE_METERS)'
+        )
+
+    def handle(self, *args, **options):
+        ride_ids = RideTracking.objects.filter(
+            ride__status__in=['completed', 'cancelled']
+        ).values_list('ride_id', flat=True).distinct()
+
+        rides = Ride.objects.filter(id__in=list(ride_ids))
+        compressed = 0
+        for ride in rides.iterator():
+            compress_ride_track(ride, options['tolerance'])
+            compressed += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ Compressed tracks for {compressed} rides')
+        )
@@ -0,0 +1,72 @@
+"""
+Management command to purge expired data in small primary-key batches
+(chat messages, sync tombstones, old GPS points, expired redemptions and
+refresh tokens; see ecopool_apps/rides/retention.py)
+Progress is checkpointed per policy, so a run stopped by --max-seconds or
+interrupted continues where it left off the next time.
+Usage: python manage.py purge_expired_data [--policy ride_tracking] [--max-seconds 300]
+"""
+from django.core.management.base import BaseCommand
+
+from ecopool_apps.rides.retention import RETENTION_POLICIES, restart_policy, run_policy
+
+
+class Command(BaseCommand):
+    help = 'Delete expired rows of every retention policy in throttled, resumable batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--policy',
+            action='append',
+            dest='policies',
+            choices=list(RETENTION_POLICIES),
+            help='Only run this policy (repeatable); all policies by default'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Rows deleted per transaction (defaults to RETENTION_BATCH_SIZE)'
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=None,
+            help='Seconds to pause between batches (defaults to RETENTION_BATCH_SLEEP_SECONDS)'
+        )
+        parser.add_argument(
+            '--max-seconds',
+            type=float,
+            default=None,
+            help='Time budget per policy; unfinished passes resume on the next run'
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Discard saved progress and start each policy from the first row'
+        )
+
+    def handle(self, *args, **options):
+        names = options['policies'] or list(RETENTION_POLICIES)
+        total = 0
+        for name in names:
+            policy = RETENTION_POLICIES[name]
+            if options['restart']:
+                restart_policy(policy)
+            metrics = run_policy(
+                policy,
+                batch_size=options['batch_size'],
+                sleep_seconds=options['sleep'],
+                max_seconds=options['max_seconds'],
+            )
+            total += metrics['deleted']
+            state = 'done' if metrics['finished'] else 'paused, resumes next run'
+            self.stdout.write(
+                f"{name}: {metrics['deleted']} rows in {metrics['batches']} batches, "
+                f"{metrics['seconds']}s ({metrics['rows_per_second']} rows/s), "
+                f"lock wait {metrics['lock_wait_seconds']}s (max {metrics['max_lock_wait_seconds']}s), {state}"
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ Purged {total} expired rows')
+        )
@@ -0,0 +1,178 @@
+"""
+Ride membership index
+
+RideParticipant holds one row per (ride, user) with the user's role, so
+"is this user part of the ride" is a single lookup on the unique
+(ride, user) index and "rides of this user" a lookup on (user, ride)
+without OR-ing the driver and passengers joins. The rows follow
+Ride.driver (post_save) and Ride.passengers (m2m_changed); writes that
+bypass signals can be repaired with rebuild_participants().
+
+ride_role() answers from a small per-process cache whose entries live
+RIDE_MEMBERSHIP_CACHE_SECONDS. Only members are cached, so someone added
+to a ride in another process is let in at once; changes made in this
+process drop the ride's entries at once, and other processes see a
+removal within the TTL.
+"""
+import threading
+import time
+from collections import OrderedDict
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_save
+from django.dispatch import receiver
+
+from .models import Ride, RideParticipant
+
+
+# Rows per INSERT when rebuilding the index
+REBUILD_BATCH_SIZE = 1000
+
+
+class MembershipCache:
+    """Thread-safe TTL cache of (ride_id, user_id) -> role"""
+
+    def __init__(self, ttl=30.0, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, ride_id, user_id):
+        """Returns (hit, role)"""
+        key = (ride_id, user_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            role, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return False, None
+            return True, role
+
+    def set(self, ride_id, user_id, role):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[(ride_id, user_id)] = (role, time.monotonic() + self.ttl)
+            self._entries.move_to_end((ride_id, user_id))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_ride(self, ride_id):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == ride_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+membership_cache = MembershipCache(ttl=getattr(settings, 'RIDE_MEMBERSHIP_CACHE_SECONDS', 30.0))
+
+
+def ride_role(ride_id, user_id):
+    """'driver', 'passenger' or None"""
+    hit, role = membership_cache.get(ride_id, user_id)
+    if hit:
+        return role
+    role = RideParticipant.objects.filter(ride_id=ride_id, user_id=user_id).values_list('role', flat=True).first()
+    if role is not None:
+        membership_cache.set(ride_id, user_id, role)
+    return role
+
+
+def is_participant(ride_id, user_id):
+    return ride_role(ride_id, user_id) is not None
+
+
+def participant_ride_ids(user):
+    """Subquery of the ids of the rides a user drives or rides in"""
+    return RideParticipant.objects.filter(user=user).values('ride_id')
+
+
+def rebuild_participants(ride_ids=None):
+    """
+    Recreate the index from Ride.driver and Ride.passengers
+    Returns the number of rows written
+    """
+    rides = Ride.objects.all()
+    if ride_ids is not None:
+        rides = rides.filter(id__in=ride_ids)
+    # Subqueries rather than id lists, which outgrow SQLite's parameter limit
+    ride_subquery = rides.values('id')
+    drivers = (
+        RideParticipant(ride_id=ride_id, user_id=user_id, role='driver')
+        for ride_id, user_id in rides.values_list('id', 'driver_id').iterator()
+    )
+    passengers = (
+        RideParticipant(ride_id=ride_id, user_id=user_id, role='passenger')
+        for ride_id, user_id in Ride.passengers.through.objects
+        .filter(ride_id__in=ride_subquery)
+        .exclude(user_id=F('ride__driver_id'))
+        .values_list('ride_id', 'user_id').iterator()
+    )
+    with transaction.atomic():
+        RideParticipant.objects.filter(ride_id__in=ride_subquery).delete()
+        written = _create_in_batches(drivers) + _create_in_batches(passengers)
+    membership_cache.clear()
+    return written
+
+
+def _create_in_batches(rows):
+    written = 0
+    while True:
+        batch = list(islice(rows, REBUILD_BATCH_SIZE))
+        if not batch:
+            return written
+        RideParticipant.objects.bulk_create(batch)
+        written += len(batch)
+
+
+@receiver(post_save, sender=Ride)
+def index_ride_driver(sender, instance, created, **kwargs):
+    """Add the driver on create and move the driver row if the driver changes"""
+    loaded_driver_id = getattr(instance, '_loaded_driver_id', None)
+    if not created and loaded_driver_id == instance.driver_id:
+        return
+    if not created:
+        RideParticipant.objects.filter(ride=instance, role='driver').delete()
+    RideParticipant.objects.update_or_create(
+        ride=instance, user_id=instance.driver_id, defaults={'role': 'driver'}
+    )
+    instance._loaded_driver_id = instance.driver_id
+    membership_cache.invalidate_ride(instance.id)
+
+
+@receiver(m2m_changed, sender=Ride.passengers.through)
+def index_ride_passengers(sender, instance, action, pk_set, reverse, **kwargs):
+    """Mirror passenger adds and removals"""
+    if action == 'pre_clear':
+        # clear() reports no pk_set, so remove the rows before the links go
+        if reverse:
+            removed = RideParticipant.objects.filter(user=instance, role='passenger')
+        else:
+            removed = RideParticipant.objects.filter(ride=instance, role='passenger')
+        ride_ids = set(removed.values_list('ride_id', flat=True))
+        removed.delete()
+    elif action in ('post_add', 'post_remove') and pk_set:
+        pairs = [(ride_id, instance.id) for ride_id in pk_set] if reverse else [(instance.id, user_id) for user_id in pk_set]
+        ride_ids = {ride_id for ride_id, _ in pairs}
+        if action == 'post_add':
+            # A driver listed as a passenger keeps the driver row
+            RideParticipant.objects.bulk_create([
+                RideParticipant(ride_id=ride_id, user_id=user_id, role='passenger') for ride_id, user_id in pairs
+            ], ignore_conflicts=True)
+        elif reverse:
+            RideParticipant.objects.filter(user=instance, ride_id__in=pk_set, role='passenger').delete()
+        else:
+            RideParticipant.objects.filter(ride=instance, user_id__in=pk_set, role='passenger').delete()
+    else:
+        return
+    for ride_id in ride_ids:
+        membership_cache.invalidate_ride(ride_id)
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rides', '0002_chatmessage_expires_at_feedback_behavior_rating_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['ride', 'timestamp'], name='chatmessage_ride_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['ride', 'expires_at'], name='chatmessage_ride_expiry_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['expires_at'], name='chatmessage_expiry_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ridetracking',
+            index=models.Index(fields=['ride', '-timestamp'], name='ridetracking_ride_ts_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rides', '0004_ridetracking_device_timestamp'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ride',
+            name='track_point_count',
+            field=models.IntegerField(default=0, help_text='Raw GPS fixes before simplification'),
+        ),
+        migrations.AddField(
+            model_name='ride',
+            name='track_polyline',
+            field=models.TextField(blank=True, default=''),
+        ),
+    ]
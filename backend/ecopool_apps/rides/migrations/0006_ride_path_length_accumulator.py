@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rides', '0005_ride_track_polyline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ride',
+            name='last_fix_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ride',
+            name='last_fix_latitude',
+            field=models.DecimalField(blank=True, decimal_places=7, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='ride',
+            name='last_fix_longitude',
+            field=models.DecimalField(blank=True, decimal_places=7, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='ride',
+            name='tracked_distance_km',
+            field=models.DecimalField(decimal_places=3, default=0, max_digits=9),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.4 on 2026-10-18 08:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_participants(apps, schema_editor):
+    """Index the drivers and passengers of existing rides"""
+    Ride = apps.get_model('rides', 'Ride')
+    RideParticipant = apps.get_model('rides', 'RideParticipant')
+    Passengers = Ride.passengers.through
+
+    RideParticipant.objects.bulk_create([
+        RideParticipant(ride_id=ride_id, user_id=driver_id, role='driver')
+        for ride_id, driver_id in Ride.objects.values_list('id', 'driver_id').iterator()
+    ], batch_size=1000, ignore_conflicts=True)
+    RideParticipant.objects.bulk_create([
+        RideParticipant(ride_id=ride_id, user_id=user_id, role='passenger')
+        for ride_id, user_id in Passengers.objects.values_list('ride_id', 'user_id').iterator()
+    ], batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rides', '0008_tombstone'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RideParticipant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('driver', 'Driver'), ('passenger', 'Passenger')], max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('ride', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='participants', to='rides.ride')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ride_participations', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'ride'], name='rideparticipant_user_ride_idx')],
+                'constraints': [models.UniqueConstraint(fields=('ride', 'user'), name='rideparticipant_ride_user_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill_participants, migrations.RunPython.noop),
+    ]
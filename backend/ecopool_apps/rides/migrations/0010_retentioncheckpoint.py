@@ -0,0 +1,27 @@
+# Generated by Django 5.1.4 on 2026-10-18 08:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rides', '0009_rideparticipant'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RetentionCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('policy', models.CharField(max_length=50, unique=True)),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('pass_started_at', models.DateTimeField(blank=True, null=True)),
+                ('rows_deleted', models.BigIntegerField(default=0, help_text='All-time total')),
+                ('last_run_at', models.DateTimeField(blank=True, null=True)),
+                ('last_run_rows', models.IntegerField(default=0)),
+                ('last_run_seconds', models.FloatField(default=0)),
+                ('last_run_lock_wait_seconds', models.FloatField(default=0)),
+            ],
+        ),
+    ]
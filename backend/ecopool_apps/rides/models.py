@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from ecopool_apps.authentication.models import User
 from ecopool_apps.trips.models import Trip
 
@@ -23,22 +24,79 @@ class Ride(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='started')
     distance_covered = models.DecimalField(max_digits=8, decimal_places=2, default=0)  # in km
     co2_saved = models.DecimalField(max_digits=8, decimal_places=2, default=0)  # in kg
+    # Simplified path of a completed ride (Google encoded polyline); replaces
+    # the raw RideTracking rows once the ride is compressed
+    track_polyline = models.TextField(blank=True, default='')
+    track_point_count = models.IntegerField(default=0, help_text="Raw GPS fixes before simplification")
+    # Running path length accumulated as fixes are ingested, and the last
+    # accepted fix it is anchored to
+    tracked_distance_km = models.DecimalField(max_digits=9, decimal_places=3, default=0)
+    last_fix_latitude = models.DecimalField(max_digits=10, decimal_places=7, null=True, blank=True)
+    last_fix_longitude = models.DecimalField(max_digits=10, decimal_places=7, null=True, blank=True)
+    last_fix_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Delta sync watermark
+            models.Index(fields=['updated_at'], name='ride_updated_idx'),
+        ]
+
     def __str__(self):
         return f"Ride {self.id} - {self.trip}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Lets the membership index notice a driver change on save
+        instance = super().from_db(db, field_names, values)
+        if 'driver_id' in field_names:
+            instance._loaded_driver_id = instance.driver_id
+        return instance
+
+
+class RideParticipant(models.Model):
+    """
+    Denormalized membership of a ride (its driver and passengers), kept in
+    sync with Ride.driver and Ride.passengers by rides/membership.py
+    """
+    ROLE_CHOICES = [
+        ('driver', 'Driver'),
+        ('passenger', 'Passenger'),
+    ]
+
+    ride = models.ForeignKey(Ride, on_delete=models.CASCADE, related_name='participants')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ride_participations')
+    role = models.CharField(max_length=10, choices=ROLE_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # Also serves as the (ride, user) index
+            models.UniqueConstraint(fields=['ride', 'user'], name='rideparticipant_ride_user_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'ride'], name='rideparticipant_user_ride_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} ({self.role}) in Ride {self.ride_id}"
+
 
 class RideTracking(models.Model):
     """Real-time location tracking for rides"""
     ride = models.ForeignKey(Ride, on_delete=models.CASCADE, related_name='tracking_points')
     latitude = models.DecimalField(max_digits=10, decimal_places=7)
     longitude = models.DecimalField(max_digits=10, decimal_places=7)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Time the fix was recorded on the device; buffered and offline uploads
+    # are written after the fact
+    timestamp = models.DateTimeField(default=timezone.now)
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['ride', '-timestamp'], name='ridetracking_ride_ts_idx'),
+        ]
 
     def __str__(self):
         return f"Tracking {self.ride.id} at {self.timestamp}"
@@ -77,6 +135,11 @@ class ChatMessage(models.Model):
 
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            models.Index(fields=['ride', 'timestamp'], name='chatmessage_ride_ts_idx'),
+            models.Index(fields=['ride', 'expires_at'], name='chatmessage_ride_expiry_idx'),
+            models.Index(fields=['expires_at'], name='chatmessage_expiry_idx'),
+        ]
 
     def __str__(self):
         return f"Message from {self.sender.username} in Ride {self.ride.id}"
@@ -95,6 +158,69 @@ class ChatMessage(models.Model):
         super().save(*args, **kwargs)
 
 
+class ChatReadReceipt(models.Model):
+    """How far a participant has read a ride's chat (high-water mark of message ids)"""
+    ride = models.ForeignKey(Ride, on_delete=models.CASCADE, related_name='read_receipts')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chat_read_receipts')
+    last_read_message_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['ride', 'user'], name='chatreadreceipt_ride_user_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} read Ride {self.ride_id} up to {self.last_read_message_id}"
+
+
+class Tombstone(models.Model):
+    """
+    Record of a deleted row for delta sync clients
+    Scoped either to a user or to everyone in a ride (ride_id is a plain
+    integer so the tombstone outlives the ride)
+    """
+    MODEL_CHOICES = [
+        ('chat_message', 'Chat message'),
+        ('trip_request', 'Trip request'),
+        ('ride', 'Ride'),
+    ]
+
+    model = models.CharField(max_length=20, choices=MODEL_CHOICES)
+    object_id = models.BigIntegerField()
+    ride_id = models.BigIntegerField(null=True, blank=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='tombstones')
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['model', 'user', 'id'], name='tombstone_model_user_idx'),
+            models.Index(fields=['model', 'ride_id', 'id'], name='tombstone_model_ride_idx'),
+        ]
+
+    def __str__(self):
+        return f"Deleted {self.model} {self.object_id}"
+
+
+class RetentionCheckpoint(models.Model):
+    """
+    Progress and last-run metrics of one retention policy (rides/retention.py)
+    last_id and pass_started_at are set while a pass is unfinished so the
+    next run resumes after the last deleted batch
+    """
+    policy = models.CharField(max_length=50, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    pass_started_at = models.DateTimeField(null=True, blank=True)
+    rows_deleted = models.BigIntegerField(default=0, help_text="All-time total")
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    last_run_rows = models.IntegerField(default=0)
+    last_run_seconds = models.FloatField(default=0)
+    last_run_lock_wait_seconds = models.FloatField(default=0)
+
+    def __str__(self):
+        return f"Retention {self.policy} at id {self.last_id}"
+
+
 class Feedback(models.Model):
     """Post-ride feedback and ratings with detailed criteria"""
     ride = models.ForeignKey(Ride, on_delete=models.CASCADE, related_name='feedbacks')
@@ -0,0 +1,223 @@
+"""
+Retention purges
+
+Each policy names a model and the queryset of its expired rows. run_policy
+deletes them in primary-key order, RETENTION_BATCH_SIZE ids per
+transaction, sleeping RETENTION_BATCH_SLEEP_SECONDS between batches so a
+purge never holds the write lock for long or loads a whole table into
+memory. After every batch the last deleted id is stored in the policy's
+RetentionCheckpoint in the same transaction; a run that is interrupted or
+stopped by its time budget resumes from there with the cutoff time of the
+pass it belongs to. A finished pass resets the checkpoint so rows that
+expire later are found by the next one.
+
+Lock wait is the time from asking for a batch's transaction until its rows
+are selected (SELECT ... FOR UPDATE where supported; on SQLite the write
+lock is taken when the transaction begins).
+
+Add a policy by subclassing RetentionPolicy and decorating it with
+@register_policy.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from ecopool_apps.rewards.models import Redemption
+
+from .models import ChatMessage, RetentionCheckpoint, RideTracking, Tombstone
+from .sync import record_tombstones, tombstones_batched
+
+
+logger = logging.getLogger(__name__)
+
+RETENTION_POLICIES = {}
+
+
+def register_policy(policy_class):
+    """Class decorator adding a policy to RETENTION_POLICIES, run in registration order"""
+    RETENTION_POLICIES[policy_class.name] = policy_class()
+    return policy_class
+
+
+class RetentionPolicy:
+    """
+    name: checkpoint key and --policy value
+    model: model the expired rows are deleted from
+    batch_fields: extra columns selected with each batch for before_delete
+    """
+    name = None
+    model = None
+    batch_fields = ()
+
+    def expired(self, now):
+        """Queryset of the rows to delete as of now"""
+        raise NotImplementedError
+
+    def before_delete(self, rows):
+        """Called inside the batch transaction with the dicts of the rows about to go"""
+
+    def delete_batch(self, ids):
+        """Delete one batch of expired rows"""
+        self.model.objects.filter(id__in=ids).delete()
+
+
+@register_policy
+class ChatMessagePolicy(RetentionPolicy):
+    """
+    Chat messages past expires_at (24 hours), leaving tombstones for delta
+    sync clients with one bulk insert per batch (the per-message pre_delete
+    receiver in sync.py stands aside)
+    """
+    name = 'chat_messages'
+    model = ChatMessage
+    batch_fields = ('ride_id',)
+
+    def expired(self, now):
+        return ChatMessage.objects.filter(expires_at__lt=now)
+
+    def before_delete(self, rows):
+        record_tombstones('chat_message', [{'object_id': row['id'], 'ride_id': row['ride_id']} for row in rows])
+
+    def delete_batch(self, ids):
+        with tombstones_batched():
+            ChatMessage.objects.filter(id__in=ids).only('id', 'ride_id').delete()
+
+
+@register_policy
+class SyncTombstonePolicy(RetentionPolicy):
+    """Tombstones older than SYNC_TOMBSTONE_RETENTION_DAYS"""
+    name = 'sync_tombstones'
+    model = Tombstone
+
+    def expired(self, now):
+        retention = timedelta(days=getattr(settings, 'SYNC_TOMBSTONE_RETENTION_DAYS', 7))
+        return Tombstone.objects.filter(deleted_at__lt=now - retention)
+
+
+@register_policy
+class RideTrackingPolicy(RetentionPolicy):
+    """
+    Raw GPS points of finished rides older than RETENTION_RIDE_TRACKING_DAYS
+    (compress_ride_tracks normally replaces them with a polyline much sooner)
+    """
+    name = 'ride_tracking'
+    model = RideTracking
+
+    def expired(self, now):
+        retention = timedelta(days=getattr(settings, 'RETENTION_RIDE_TRACKING_DAYS', 30))
+        return RideTracking.objects.filter(
+            timestamp__lt=now - retention, ride__status__in=['completed', 'cancelled']
+        )
+
+
+@register_policy
+class RedemptionPolicy(RetentionPolicy):
+    """Redemptions whose voucher expired more than RETENTION_REDEMPTION_DAYS ago"""
+    name = 'redemptions'
+    model = Redemption
+
+    def expired(self, now):
+        retention = timedelta(days=getattr(settings, 'RETENTION_REDEMPTION_DAYS', 365))
+        return Redemption.objects.filter(expires_at__lt=now - retention)
+
+
+if apps.is_installed('rest_framework_simplejwt.token_blacklist'):
+    from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+    @register_policy
+    class ExpiredTokenPolicy(RetentionPolicy):
+        """
+        Expired refresh tokens; their blacklist entries go with them (the
+        batched equivalent of simplejwt's flushexpiredtokens)
+        """
+        name = 'jwt_tokens'
+        model = OutstandingToken
+
+        def expired(self, now):
+            return OutstandingToken.objects.filter(expires_at__lt=now)
+
+
+def run_policy(policy, batch_size=None, sleep_seconds=None, max_seconds=None):
+    """
+    Delete a policy's expired rows in id batches, resuming from its checkpoint
+    Returns the run's metrics: deleted, batches, seconds, rows_per_second,
+    lock_wait_seconds, max_lock_wait_seconds and finished (False when
+    max_seconds ran out before the pass was done)
+    """
+    if batch_size is None:
+        batch_size = getattr(settings, 'RETENTION_BATCH_SIZE', 1000)
+    if sleep_seconds is None:
+        sleep_seconds = getattr(settings, 'RETENTION_BATCH_SLEEP_SECONDS', 0.05)
+
+    checkpoint, _ = RetentionCheckpoint.objects.get_or_create(policy=policy.name)
+    if checkpoint.pass_started_at is None:
+        checkpoint.pass_started_at = timezone.now()
+        checkpoint.last_id = 0
+        checkpoint.save(update_fields=['pass_started_at', 'last_id'])
+    # A resumed pass keeps its cutoff so it deletes the rows it set out to
+    expired = policy.expired(checkpoint.pass_started_at)
+
+    deleted = batches = 0
+    lock_wait = max_lock_wait = 0.0
+    finished = False
+    started = time.monotonic()
+    while True:
+        if max_seconds is not None and time.monotonic() - started >= max_seconds:
+            break
+        requested = time.monotonic()
+        with transaction.atomic():
+            rows = list(
+                expired.filter(id__gt=checkpoint.last_id).order_by('id')
+                .select_for_update(of=('self',))
+                .values('id', *policy.batch_fields)[:batch_size]
+            )
+            waited = time.monotonic() - requested
+            lock_wait += waited
+            max_lock_wait = max(max_lock_wait, waited)
+            if not rows:
+                finished = True
+                break
+            ids = [row['id'] for row in rows]
+            policy.before_delete(rows)
+            policy.delete_batch(ids)
+            checkpoint.last_id = ids[-1]
+            checkpoint.rows_deleted += len(ids)
+            checkpoint.save(update_fields=['last_id', 'rows_deleted'])
+        deleted += len(ids)
+        batches += 1
+        if sleep_seconds:
+            time.sleep(sleep_seconds)
+
+    seconds = time.monotonic() - started
+    if finished:
+        checkpoint.last_id = 0
+        checkpoint.pass_started_at = None
+    checkpoint.last_run_at = timezone.now()
+    checkpoint.last_run_rows = deleted
+    checkpoint.last_run_seconds = seconds
+    checkpoint.last_run_lock_wait_seconds = lock_wait
+    checkpoint.save()
+
+    metrics = {
+        'policy': policy.name,
+        'deleted': deleted,
+        'batches': batches,
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(deleted / seconds, 1) if seconds > 0 else 0.0,
+        'lock_wait_seconds': round(lock_wait, 3),
+        'max_lock_wait_seconds': round(max_lock_wait, 3),
+        'finished': finished,
+    }
+    logger.info('Retention %(policy)s: %(deleted)s rows in %(batches)s batches, '
+                '%(rows_per_second)s rows/s, lock wait %(lock_wait_seconds)ss', metrics)
+    return metrics
+
+
+def restart_policy(policy):
+    """Drop a policy's checkpoint so the next run starts a fresh pass"""
+    RetentionCheckpoint.objects.filter(policy=policy.name).update(last_id=0, pass_started_at=None)
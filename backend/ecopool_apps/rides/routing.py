@@ -0,0 +1,11 @@
+"""
+WebSocket URL routing for rides
+"""
+from django.urls import re_path
+
+from . import consumers
+
+
+websocket_urlpatterns = [
+    re_path(r'^ws/rides/(?P<ride_id>\d+)/$', consumers.RideConsumer.as_asgi()),
+]
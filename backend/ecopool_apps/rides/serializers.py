@@ -1,5 +1,7 @@
+from django.utils import timezone
 from rest_framework import serializers
 from .models import Ride, RideTracking, SOSAlert, ChatMessage, Feedback, Complaint
+from .tracking import latest_plausible_fix_time
 from ecopool_apps.authentication.serializers import UserSerializer
 
 
@@ -12,9 +14,10 @@ class RideSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'trip', 'driver', 'driver_details', 'passengers', 'passenger_details',
             'start_time', 'end_time', 'current_latitude', 'current_longitude',
-            'status', 'distance_covered', 'co2_saved', 'created_at', 'updated_at'
+            'status', 'distance_covered', 'tracked_distance_km', 'co2_saved',
+            'track_point_count', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'driver', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'driver', 'tracked_distance_km', 'track_point_count', 'created_at', 'updated_at']
 
 
 class RideTrackingSerializer(serializers.ModelSerializer):
@@ -24,6 +27,54 @@ class RideTrackingSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'timestamp']
 
 
+class FixTimestampField(serializers.DateTimeField):
+    """
+    Device time of a GPS fix; a time further ahead of the server than
+    RIDE_FIX_MAX_CLOCK_SKEW_SECONDS (a wrong device clock) becomes now
+    """
+
+    def to_internal_value(self, value):
+        timestamp = super().to_internal_value(value)
+        now = timezone.now()
+        if timestamp > latest_plausible_fix_time(now):
+            return now
+        return timestamp
+
+
+class LocationFixSerializer(serializers.Serializer):
+    """A single GPS fix reported by the driver's device"""
+    latitude = serializers.DecimalField(max_digits=10, decimal_places=7, min_value=-90, max_value=90)
+    longitude = serializers.DecimalField(max_digits=10, decimal_places=7, min_value=-180, max_value=180)
+    timestamp = FixTimestampField(required=False)
+
+
+class LocationUpdateSerializer(serializers.Serializer):
+    """
+    Location update payload: either a single latitude/longitude or a batch
+    of points collected while the device was offline
+    """
+    MAX_POINTS = 1000
+
+    latitude = serializers.DecimalField(max_digits=10, decimal_places=7, min_value=-90, max_value=90, required=False)
+    longitude = serializers.DecimalField(max_digits=10, decimal_places=7, min_value=-180, max_value=180, required=False)
+    timestamp = FixTimestampField(required=False)
+    points = LocationFixSerializer(many=True, required=False)
+
+    def validate(self, data):
+        points = data.get('points') or []
+        if data.get('latitude') is not None and data.get('longitude') is not None:
+            points.append({
+                'latitude': data['latitude'],
+                'longitude': data['longitude'],
+                'timestamp': data.get('timestamp'),
+            })
+        if not points:
+            raise serializers.ValidationError('Latitude and longitude required')
+        if len(points) > self.MAX_POINTS:
+            raise serializers.ValidationError(f'At most {self.MAX_POINTS} points per request')
+        return {'points': points}
+
+
 class SOSAlertSerializer(serializers.ModelSerializer):
     triggered_by_details = UserSerializer(source='triggered_by', read_only=True)
     resolved_by_details = UserSerializer(source='resolved_by', read_only=True)
@@ -50,6 +101,12 @@ class ChatMessageSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'sender', 'timestamp']
 
 
+class ChatReadSerializer(serializers.Serializer):
+    """Read mark update: the newest message id the user has seen in a ride's chat"""
+    ride = serializers.IntegerField()
+    last_read_id = serializers.IntegerField(min_value=0)
+
+
 class FeedbackSerializer(serializers.ModelSerializer):
     from_user_details = UserSerializer(source='from_user', read_only=True)
     to_user_details = UserSerializer(source='to_user', read_only=True)
@@ -0,0 +1,149 @@
+"""
+Services for ride lifecycle operations
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Case, When, Value, IntegerField, DecimalField
+from django.utils import timezone
+
+from ecopool_apps.authentication.models import User
+from ecopool_apps.trips.models import Trip
+from ecopool_apps.trips.search_cache import search_cache, trip_cells
+from ecopool_apps.payments.models import RewardTransaction
+from ecopool_apps.sustainability.carbon_utils import (
+    calculate_co2_saved, calculate_reward_points, get_emission_factors
+)
+from .models import Ride
+
+
+def _case_by_id(values, output_field, default):
+    """Build CASE id WHEN ... THEN value expression from a {id: value} dict"""
+    return Case(
+        *[When(id=object_id, then=Value(value)) for object_id, value in values.items()],
+        default=Value(default),
+        output_field=output_field
+    )
+
+
+class RideSettlementService:
+    """Settle completed rides: ride/trip status, CO2 and reward points"""
+
+    @staticmethod
+    def settle_ride(ride, distance_km):
+        """
+        Complete a single ride and award its participants
+        Returns dict with co2_saved, reward_points and distance_km
+        """
+        return RideSettlementService.settle_rides({ride.id: distance_km}).get(ride.id)
+
+    @staticmethod
+    def settle_rides(distances_by_ride):
+        """
+        Complete many rides at once in a constant number of queries
+
+        Args:
+            distances_by_ride: dict of ride_id -> distance in km
+
+        Returns:
+            dict: ride_id -> {'co2_saved', 'reward_points', 'distance_km'} for
+            every ride that was settled. Rides already completed or cancelled
+            are skipped.
+        """
+        now = timezone.now()
+
+        with transaction.atomic():
+            rides = list(
+                Ride.objects.select_for_update(of=('self',))
+                .filter(id__in=distances_by_ride.keys())
+                .exclude(status__in=['completed', 'cancelled'])
+                .select_related('trip__vehicle')
+            )
+            if not rides:
+                return {}
+
+            passengers_by_ride = defaultdict(list)
+            memberships = Ride.passengers.through.objects.filter(
+                ride_id__in=[ride.id for ride in rides]
+            ).values_list('ride_id', 'user_id')
+            for ride_id, user_id in memberships:
+                passengers_by_ride[ride_id].append(user_id)
+
+            emission_factors = get_emission_factors()
+
+            results = {}
+            ride_distances = {}
+            ride_co2 = {}
+            user_points = defaultdict(int)
+            user_co2 = defaultdict(Decimal)
+            user_rides = defaultdict(int)
+            reward_transactions = []
+
+            for ride in rides:
+                distance = Decimal(str(distances_by_ride[ride.id]))
+                passenger_ids = passengers_by_ride[ride.id]
+                num_passengers = len(passenger_ids)
+                vehicle = ride.trip.vehicle
+                fuel_type = vehicle.fuel_type if vehicle else 'petrol'
+
+                co2_saved = calculate_co2_saved(
+                    distance, fuel_type, num_passengers, emission_factors=emission_factors
+                )
+                reward_points = calculate_reward_points(co2_saved)
+                points_per_person = reward_points // (num_passengers + 1)
+
+                ride_distances[ride.id] = distance
+                ride_co2[ride.id] = co2_saved
+
+                participants = [(ride.driver_id, f'Earned from completing ride #{ride.id}')]
+                participants += [(user_id, f'Earned from ride #{ride.id}') for user_id in passenger_ids]
+                for user_id, description in participants:
+                    user_points[user_id] += points_per_person
+                    user_co2[user_id] += co2_saved
+                    user_rides[user_id] += 1
+                    reward_transactions.append(RewardTransaction(
+                        user_id=user_id,
+                        ride_id=ride.id,
+                        transaction_type='earned',
+                        points=points_per_person,
+                        co2_saved=co2_saved,
+                        description=description
+                    ))
+
+                results[ride.id] = {
+                    'co2_saved': co2_saved,
+                    'reward_points': points_per_person,
+                    'distance_km': distances_by_ride[ride.id],
+                }
+
+            ride_decimal = DecimalField(max_digits=8, decimal_places=2)
+            Ride.objects.filter(id__in=ride_distances.keys()).update(
+                status='completed',
+                end_time=now,
+                distance_covered=_case_by_id(ride_distances, ride_decimal, Decimal('0')),
+                co2_saved=_case_by_id(ride_co2, ride_decimal, Decimal('0')),
+                updated_at=now
+            )
+
+            Trip.objects.filter(id__in=[ride.trip_id for ride in rides]).update(
+                status='completed',
+                updated_at=now
+            )
+            # Bulk updates bypass post_save, so invalidate cached searches here
+            completed_cells = set()
+            for ride in rides:
+                completed_cells |= trip_cells(ride.trip)
+            transaction.on_commit(lambda: search_cache.invalidate_cells(completed_cells))
+
+            user_decimal = DecimalField(max_digits=10, decimal_places=2)
+            User.objects.filter(id__in=user_points.keys()).update(
+                reward_points=F('reward_points') + _case_by_id(user_points, IntegerField(), 0),
+                total_co2_saved=F('total_co2_saved') + _case_by_id(user_co2, user_decimal, Decimal('0')),
+                total_rides=F('total_rides') + _case_by_id(user_rides, IntegerField(), 0),
+                updated_at=now
+            )
+
+            RewardTransaction.objects.bulk_create(reward_transactions)
+
+        return results
@@ -0,0 +1,249 @@
+"""
+Delta sync for mobile clients
+
+List endpoints using DeltaSyncMixin return only what changed since a
+cursor the client got from its previous response:
+
+    ?since_id=N                      append-only rows (chat messages)
+    ?updated_since=<ISO>&since_id=N  mutable rows, ordered by (updated_at, id)
+    &deleted_since_id=N              tombstones of deleted rows
+
+Pass 0 to start from scratch. The response is
+{"results", "deleted", "has_more", "cursor"}; the cursor holds the
+parameters for the next call. Rows updated within the last
+SYNC_WATERMARK_LAG_SECONDS are sent again on the next call so rows
+committed late by slower transactions are not skipped.
+
+Every list response carries an ETag; a request whose If-None-Match
+matches gets an empty 304.
+
+Tombstones are recorded by pre_delete receivers, so rows removed by a
+cascade (a deleted trip's requests, a deleted ride's chat) are reported
+as well as API deletes. Bulk deletes that write their own tombstones in
+one go (the chat purge) run inside tombstones_batched().
+"""
+import hashlib
+import json
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Max, Q
+from django.db.models.signals import m2m_changed, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from .membership import participant_ride_ids
+from ecopool_apps.trips.models import Trip, TripRequest
+
+from .models import ChatMessage, Ride, Tombstone
+
+
+def sync_max_results():
+    return getattr(settings, 'SYNC_MAX_RESULTS', 500)
+
+
+_batched = threading.local()
+
+
+@contextmanager
+def tombstones_batched():
+    """Chat message deletes in this block leave their tombstones to the caller"""
+    _batched.active = True
+    try:
+        yield
+    finally:
+        _batched.active = False
+
+
+def record_tombstones(model, entries):
+    """
+    Remember deleted rows
+    entries: iterable of dicts with object_id and ride_id and/or user_id
+    """
+    Tombstone.objects.bulk_create([
+        Tombstone(model=model, object_id=entry['object_id'],
+                  ride_id=entry.get('ride_id'), user_id=entry.get('user_id'))
+        for entry in entries
+    ], batch_size=1000)
+
+
+def visible_tombstones(user, model, after_id):
+    """
+    Ids of deleted rows the user should drop, after tombstone id after_id
+    Returns (object_ids, next_after_id)
+    """
+    if after_id is None:
+        # No cursor yet: start from now
+        latest = Tombstone.objects.aggregate(latest=Max('id'))['latest'] or 0
+        return [], latest
+    user_rides = participant_ride_ids(user)
+    tombstones = list(
+        Tombstone.objects.filter(model=model, id__gt=after_id)
+        .filter(Q(user=user) | Q(ride_id__in=user_rides))
+        .order_by('id').values_list('id', 'object_id')
+    )
+    if not tombstones:
+        return [], after_id
+    return sorted({object_id for _, object_id in tombstones}), tombstones[-1][0]
+
+
+def parse_watermark(value):
+    """updated_since value: '0' means from the beginning"""
+    if value in ('0', ''):
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError('Invalid updated_since')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def etag_response(request, data):
+    """Response with an ETag of the payload, or 304 if the client already has it"""
+    body = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True)
+    etag = quote_etag(hashlib.md5(body.encode()).hexdigest())
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        tags = parse_etags(if_none_match)
+        if '*' in tags or etag in tags or f'W/{etag}' in tags:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+    return Response(data, headers={'ETag': etag, 'Vary': 'Authorization'})
+
+
+class DeltaSyncMixin:
+    """
+    Delta sync and ETags for a viewset's list action
+    sync_model is the Tombstone.model of the listed rows; sync_field is
+    'id' for append-only rows or 'updated_at' for rows that change
+    """
+    sync_model = None
+    sync_field = 'updated_at'
+
+    def list(self, request, *args, **kwargs):
+        params = request.query_params
+        trigger = 'since_id' if self.sync_field == 'id' else 'updated_since'
+        if trigger not in params:
+            response = super().list(request, *args, **kwargs)
+            return etag_response(request, response.data)
+
+        try:
+            since_id = int(params.get('since_id') or 0)
+            deleted_since_id = int(params['deleted_since_id']) if params.get('deleted_since_id') else None
+            since = parse_watermark(params['updated_since']) if self.sync_field == 'updated_at' else None
+        except ValueError:
+            return Response(
+                {'error': 'Invalid sync cursor'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.sync_field == 'id':
+            rows, has_more, cursor = self._rows_since_id(queryset, since_id)
+        else:
+            rows, has_more, cursor = self._rows_updated_since(queryset, since, since_id)
+        deleted, cursor['deleted_since_id'] = visible_tombstones(request.user, self.sync_model, deleted_since_id)
+
+        return etag_response(request, {
+            'results': self.get_serializer(rows, many=True).data,
+            'deleted': deleted,
+            'has_more': has_more,
+            'cursor': cursor,
+        })
+
+    @staticmethod
+    def _rows_since_id(queryset, since_id):
+        limit = sync_max_results()
+        rows = list(queryset.filter(id__gt=since_id).order_by('id')[:limit + 1])
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        return rows, has_more, {'since_id': rows[-1].id if rows else since_id}
+
+    @staticmethod
+    def _rows_updated_since(queryset, since, since_id):
+        limit = sync_max_results()
+        started = timezone.now()
+        if since is not None:
+            queryset = queryset.filter(Q(updated_at__gt=since) | Q(updated_at=since, id__gt=since_id))
+        rows = list(queryset.order_by('updated_at', 'id')[:limit + 1])
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        next_cursor = (since, since_id)
+        if rows:
+            last = (rows[-1].updated_at, rows[-1].id)
+            if not has_more:
+                # Hold the watermark back so late commits are picked up next time
+                safe = (started - timedelta(seconds=getattr(settings, 'SYNC_WATERMARK_LAG_SECONDS', 5)), 0)
+                last = min(last, safe)
+            if since is None or last > next_cursor:
+                next_cursor = last
+        updated_since, next_id = next_cursor
+        return rows, has_more, {
+            # 'Z' rather than '+00:00' so the value survives unencoded in a query string
+            'updated_since': updated_since.isoformat().replace('+00:00', 'Z') if updated_since else '0',
+            'since_id': next_id,
+        }
+
+
+@receiver(m2m_changed, sender=Ride.passengers.through)
+def sync_ride_passengers(sender, instance, action, pk_set, reverse, **kwargs):
+    """Joining passengers see the ride as updated; removed ones get a tombstone"""
+    if action == 'pre_clear' and not reverse:
+        # clear() reports no pk_set afterwards, so capture the passengers now
+        action, pk_set = 'post_remove', set(instance.passengers.values_list('id', flat=True))
+    if action not in ('post_add', 'post_remove') or not pk_set:
+        return
+    if reverse:
+        ride_ids, user_ids = pk_set, [instance.id]
+    else:
+        ride_ids, user_ids = [instance.id], pk_set
+    Ride.objects.filter(id__in=ride_ids).update(updated_at=timezone.now())
+    if action == 'post_remove':
+        record_tombstones('ride', [
+            {'object_id': ride_id, 'user_id': user_id} for ride_id in ride_ids for user_id in user_ids
+        ])
+
+
+def _deleted_with(origin, model):
+    """Whether a delete started from a model instance or queryset of model"""
+    return isinstance(origin, model) or getattr(origin, 'model', None) is model
+
+
+@receiver(pre_delete, sender=Ride)
+def tombstone_ride(sender, instance, **kwargs):
+    """The ride and its chat messages, for the driver and every passenger"""
+    user_ids = list(instance.participants.values_list('user_id', flat=True))
+    message_ids = list(ChatMessage.objects.filter(ride=instance).values_list('id', flat=True))
+    # The participants are gone once the ride is, so ride-scoped chat
+    # tombstones would reach nobody: scope them to each user instead
+    record_tombstones('ride', [{'object_id': instance.id, 'user_id': user_id} for user_id in user_ids])
+    record_tombstones('chat_message', [
+        {'object_id': message_id, 'user_id': user_id} for message_id in message_ids for user_id in user_ids
+    ])
+
+
+@receiver(pre_delete, sender=ChatMessage)
+def tombstone_chat_message(sender, instance, origin=None, **kwargs):
+    if _deleted_with(origin, Ride):
+        return  # recorded per user by tombstone_ride
+    if getattr(_batched, 'active', False):
+        return  # recorded for the whole batch by the caller
+    record_tombstones('chat_message', [{'object_id': instance.id, 'ride_id': instance.ride_id}])
+
+
+@receiver(pre_delete, sender=TripRequest)
+def tombstone_trip_request(sender, instance, **kwargs):
+    """For the passenger and the trip's driver"""
+    driver_id = Trip.objects.filter(id=instance.trip_id).values_list('driver_id', flat=True).first()
+    record_tombstones('trip_request', [
+        {'object_id': instance.id, 'user_id': user_id}
+        for user_id in {instance.passenger_id, driver_id} if user_id is not None
+    ])
@@ -0,0 +1,64 @@
+"""Rebuilding the ride membership index"""
+import sqlite3
+import unittest
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+
+from ecopool_apps.rides import membership
+from ecopool_apps.rides.membership import rebuild_participants
+from ecopool_apps.rides.models import Ride, RideParticipant
+from ecopool_apps.trips.models import Trip
+from ecopool_apps.trips.tests.factories import TripFactory, UserFactory
+
+
+class RebuildParticipantsTests(TestCase):
+    RIDES = 150
+
+    def setUp(self):
+        trip = TripFactory()
+        self.driver = trip.driver
+        self.rider = UserFactory(organization=self.driver.organization)
+        # bulk_create skips the signals that maintain the index
+        Trip.objects.bulk_create([
+            Trip(**{field: getattr(trip, field) for field in (
+                'driver_id', 'vehicle_id', 'start_location', 'start_latitude', 'start_longitude',
+                'end_location', 'end_latitude', 'end_longitude', 'departure_time',
+                'available_seats', 'price_per_seat',
+            )})
+            for _ in range(self.RIDES - 1)
+        ])
+        Ride.objects.bulk_create([
+            Ride(trip_id=trip_id, driver=self.driver) for trip_id in Trip.objects.values_list('id', flat=True)
+        ])
+        Through = Ride.passengers.through
+        ride_ids = list(Ride.objects.values_list('id', flat=True))
+        Through.objects.bulk_create(
+            [Through(ride_id=ride_id, user_id=self.rider.id) for ride_id in ride_ids]
+            # A driver listed as a passenger keeps only the driver row
+            + [Through(ride_id=ride_ids[0], user_id=self.driver.id)]
+        )
+
+    def test_rebuild_indexes_drivers_and_passengers(self):
+        self.assertEqual(rebuild_participants(), 2 * self.RIDES)
+        self.assertEqual(RideParticipant.objects.filter(user=self.driver, role='driver').count(), self.RIDES)
+        self.assertEqual(RideParticipant.objects.filter(user=self.rider, role='passenger').count(), self.RIDES)
+
+    def test_rebuild_replaces_only_the_given_rides(self):
+        rebuild_participants()
+        ride = Ride.objects.order_by('id').first()
+        RideParticipant.objects.filter(ride=ride, role='passenger').delete()
+
+        self.assertEqual(rebuild_participants([ride.id]), 2)
+        self.assertEqual(RideParticipant.objects.count(), 2 * self.RIDES)
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'SQLite parameter limit')
+    def test_rebuild_all_rides_beyond_the_sqlite_parameter_limit(self):
+        connection.ensure_connection()
+        sqlite_connection = connection.connection
+        previous = sqlite_connection.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, self.RIDES - 50)
+        self.addCleanup(sqlite_connection.setlimit, sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, previous)
+
+        with mock.patch.object(membership, 'REBUILD_BATCH_SIZE', 10):
+            self.assertEqual(rebuild_participants(), 2 * self.RIDES)
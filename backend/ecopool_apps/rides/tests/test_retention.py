@@ -0,0 +1,41 @@
+"""Chat purge tombstones"""
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from ecopool_apps.rides.models import ChatMessage, Ride, Tombstone
+from ecopool_apps.rides.retention import RETENTION_POLICIES, run_policy
+from ecopool_apps.trips.tests.factories import TripFactory
+
+
+class ChatPurgeTests(TestCase):
+
+    def setUp(self):
+        trip = TripFactory()
+        self.driver = trip.driver
+        self.ride = Ride.objects.create(trip=trip, driver=trip.driver, status='completed')
+
+    def purge(self, count):
+        expired = timezone.now() - timedelta(hours=1)
+        ChatMessage.objects.bulk_create([
+            ChatMessage(ride=self.ride, sender=self.driver, message=f'message {index}', expires_at=expired)
+            for index in range(count)
+        ])
+        with CaptureQueriesContext(connection) as queries:
+            metrics = run_policy(RETENTION_POLICIES['chat_messages'], batch_size=1000, sleep_seconds=0)
+        self.assertEqual(metrics['deleted'], count)
+        return len(queries)
+
+    def test_batch_costs_the_same_queries_whatever_its_size(self):
+        self.purge(1)    # creates the policy's checkpoint
+        self.assertEqual(self.purge(10), self.purge(40))
+
+    def test_every_purged_message_gets_one_ride_scoped_tombstone(self):
+        self.purge(25)
+        tombstones = Tombstone.objects.filter(model='chat_message')
+        self.assertEqual(tombstones.count(), 25)
+        self.assertEqual(set(tombstones.values_list('ride_id', flat=True)), {self.ride.id})
+        self.assertFalse(ChatMessage.objects.exists())
@@ -0,0 +1,74 @@
+"""Location ingestion with device clocks running ahead and fixes arriving out of order"""
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ecopool_apps.rides.models import Ride
+from ecopool_apps.rides.tracking import location_buffer
+from ecopool_apps.trips.tests.factories import TripFactory
+
+# ~0.55 km north per step; 20 s apart is about 100 km/h
+STEP_DEGREES = 0.005
+STEP_SECONDS = 20
+
+
+class LocationClockTests(TestCase):
+
+    def setUp(self):
+        trip = TripFactory()
+        self.ride = Ride.objects.create(trip=trip, driver=trip.driver, status='in_progress')
+        self.client = APIClient()
+        self.client.force_authenticate(trip.driver)
+        self.now = timezone.now()
+
+    def tearDown(self):
+        # Write buffered points inside the test transaction
+        location_buffer.flush()
+
+    def fix(self, step, seconds=None):
+        seconds = step * STEP_SECONDS if seconds is None else seconds
+        return {
+            'latitude': f'{19.0 + step * STEP_DEGREES:.7f}', 'longitude': '72.8000000',
+            'timestamp': (self.now + timedelta(seconds=seconds)).isoformat(),
+        }
+
+    def upload(self, *fixes):
+        response = self.client.post(
+            f'/api/rides/{self.ride.id}/update_location/', {'points': list(fixes)}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.ride.refresh_from_db()
+
+    def test_fix_from_a_clock_running_ahead_does_not_freeze_the_ride(self):
+        self.upload(self.fix(0, seconds=2 * 3600))
+        for step in range(1, 6):
+            self.upload(self.fix(step))
+
+        self.assertEqual(str(self.ride.current_latitude), self.fix(5)['latitude'])
+        self.assertAlmostEqual(float(self.ride.tracked_distance_km), 5 * 0.556, delta=0.05)
+        self.assertLessEqual(self.ride.last_fix_at, timezone.now() + timedelta(minutes=5))
+
+    def test_stored_future_anchor_is_dropped(self):
+        Ride.objects.filter(pk=self.ride.pk).update(last_fix_at=self.now + timedelta(hours=2))
+        for step in range(0, 4):
+            self.upload(self.fix(step))
+
+        self.assertEqual(str(self.ride.current_latitude), self.fix(3)['latitude'])
+        self.assertAlmostEqual(float(self.ride.tracked_distance_km), 3 * 0.556, delta=0.05)
+
+    def test_out_of_order_batch_is_measured_in_time_order(self):
+        self.upload(self.fix(3), self.fix(0), self.fix(4), self.fix(1), self.fix(2))
+
+        self.assertEqual(str(self.ride.current_latitude), self.fix(4)['latitude'])
+        self.assertAlmostEqual(float(self.ride.tracked_distance_km), 4 * 0.556, delta=0.05)
+
+    def test_late_older_fix_changes_neither_position_nor_distance(self):
+        self.upload(self.fix(0), self.fix(1), self.fix(3))
+        distance = self.ride.tracked_distance_km
+
+        self.upload(self.fix(2))
+
+        self.assertEqual(str(self.ride.current_latitude), self.fix(3)['latitude'])
+        self.assertEqual(self.ride.tracked_distance_km, distance)
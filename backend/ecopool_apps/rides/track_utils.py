@@ -0,0 +1,77 @@
+"""
+GPS track compression utilities: Douglas-Peucker simplification and
+downsampling (the encoded polyline codec lives in trips/spatial_utils.py)
+"""
+import math
+
+import numpy as np
+
+
+METERS_PER_DEGREE_LAT = 111320.0
+
+
+def _to_local_meters(points):
+    """Project (lat, lon) degrees onto a local equirectangular plane in meters"""
+    points = np.asarray(points, dtype=float)
+    ref_lat = math.radians(points[:, 0].mean())
+    x = points[:, 1] * METERS_PER_DEGREE_LAT * math.cos(ref_lat)
+    y = points[:, 0] * METERS_PER_DEGREE_LAT
+    return np.column_stack((x, y))
+
+
+def douglas_peucker(points, tolerance_m):
+    """
+    Simplify a track with the Douglas-Peucker algorithm
+
+    Args:
+        points: sequence of (lat, lon) pairs in travel order
+        tolerance_m: maximum distance in meters between the original track
+            and the simplified one
+
+    Returns:
+        list: indices of the points to keep (always includes both ends)
+    """
+    count = len(points)
+    if count <= 2:
+        return list(range(count))
+
+    xy = _to_local_meters(points)
+    keep = np.zeros(count, dtype=bool)
+    keep[0] = keep[-1] = True
+
+    # Iterative to avoid recursion limits on long rides
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+
+        start = xy[first]
+        segment = xy[last] - start
+        inner = xy[first + 1:last] - start
+        length = np.hypot(segment[0], segment[1])
+        if length == 0:
+            distances = np.hypot(inner[:, 0], inner[:, 1])
+        else:
+            distances = np.abs(segment[0] * inner[:, 1] - segment[1] * inner[:, 0]) / length
+
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance_m:
+            index = first + 1 + farthest
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+
+    return np.flatnonzero(keep).tolist()
+
+
+def downsample(points, max_points):
+    """Pick at most max_points evenly spaced points, keeping both ends"""
+    count = len(points)
+    if max_points is None or count <= max_points:
+        return list(points)
+    if max_points <= 1:
+        return [points[-1]] if max_points == 1 else []
+
+    indices = np.unique(np.linspace(0, count - 1, max_points).round().astype(int))
+    return [points[index] for index in indices]
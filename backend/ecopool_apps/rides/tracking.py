@@ -0,0 +1,336 @@
+"""
+Location ingestion pipeline for ride tracking
+
+Incoming GPS fixes update the ride's current position immediately (a
+two-column UPDATE) while the RideTracking history rows are buffered in
+process memory and written with bulk_create once the buffer reaches
+RIDE_TRACKING_BATCH_SIZE points or RIDE_TRACKING_FLUSH_SECONDS elapse.
+Each ingested fix also advances the ride's running path length, so the
+distance travelled is known without scanning the track. Completed rides are
+compressed into a simplified encoded polyline.
+
+Fixes pushed over the live ride socket are broadcast first and handed to
+live_location_writer, which runs ingest_location_fixes from a background
+thread every RIDE_LIVE_WRITE_SECONDS, so database writes never delay
+delivery to subscribers.
+
+Both buffers live in process memory, so this assumes a single worker
+process: complete() and the tracking endpoint flush and merge only the
+current process's pending points (see the ride tracking settings).
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from ecopool_apps.trips.spatial_utils import decode_polyline, encode_polyline, haversine_km
+from .models import Ride, RideTracking
+from .track_utils import douglas_peucker
+
+
+logger = logging.getLogger(__name__)
+
+# Rides that accept location fixes (an SOS moves a ride to 'emergency'
+# and it must keep being tracked)
+TRACKED_STATUSES = ('in_progress', 'emergency')
+# Ids per DELETE when pruning compressed points (stays under SQLite's parameter limit)
+TRACK_DELETE_CHUNK = 500
+
+
+class LocationIngestionBuffer:
+    """Thread-safe, per-process buffer of unsaved RideTracking rows"""
+
+    def __init__(self, batch_size=100, flush_interval=5.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._points = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._flusher = None
+
+    def add(self, points):
+        """Queue tracking points, flushing synchronously when the batch is full"""
+        with self._lock:
+            self._points.extend(points)
+            should_flush = (
+                len(self._points) >= self.batch_size
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            )
+        self._ensure_flusher()
+        if should_flush:
+            self.flush()
+
+    def pending_for(self, ride_id):
+        """Buffered points of one ride that are not yet in the database"""
+        with self._lock:
+            return [point for point in self._points if point.ride_id == ride_id]
+
+    def flush(self):
+        """Write all buffered points with a single bulk_create"""
+        with self._flush_lock:
+            with self._lock:
+                points, self._points = self._points, []
+                self._last_flush = time.monotonic()
+            if points:
+                RideTracking.objects.bulk_create(points, batch_size=self.batch_size)
+            return len(points)
+
+    def _ensure_flusher(self):
+        """Start the background thread that flushes on the time interval"""
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._lock:
+            if self._flusher is not None and self._flusher.is_alive():
+                return
+            self._flusher = threading.Thread(
+                target=self._run_flusher, name='ride-tracking-flusher', daemon=True
+            )
+            self._flusher.start()
+
+    def _run_flusher(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Failed to flush buffered ride tracking points')
+            finally:
+                close_old_connections()
+
+
+location_buffer = LocationIngestionBuffer(
+    batch_size=getattr(settings, 'RIDE_TRACKING_BATCH_SIZE', 100),
+    flush_interval=getattr(settings, 'RIDE_TRACKING_FLUSH_SECONDS', 5.0),
+)
+atexit.register(location_buffer.flush)
+
+
+class LiveLocationWriter:
+    """Per-process queue of socket fixes, ingested per ride from a background thread"""
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self._fixes = defaultdict(list)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._writer = None
+
+    def submit(self, ride_id, fixes):
+        """Queue fixes of a ride; returns immediately"""
+        with self._lock:
+            self._fixes[ride_id].extend(fixes)
+        self._ensure_writer()
+
+    def flush(self, ride_ids=None):
+        """
+        Ingest what is queued (for ride_ids only if given), one
+        ingest_location_fixes call per ride; fixes of rides that are no
+        longer being tracked are dropped
+        """
+        with self._flush_lock:
+            with self._lock:
+                if ride_ids is None:
+                    fixes_by_ride, self._fixes = self._fixes, defaultdict(list)
+                else:
+                    fixes_by_ride = {ride_id: self._fixes.pop(ride_id) for ride_id in ride_ids if ride_id in self._fixes}
+            rides = Ride.objects.filter(status__in=TRACKED_STATUSES).in_bulk(list(fixes_by_ride))
+            ingested = 0
+            for ride_id, fixes in fixes_by_ride.items():
+                if ride_id in rides:
+                    ingest_location_fixes(rides[ride_id], fixes)
+                    ingested += len(fixes)
+            return ingested
+
+    def _ensure_writer(self):
+        if self._writer is not None and self._writer.is_alive():
+            return
+        with self._lock:
+            if self._writer is not None and self._writer.is_alive():
+                return
+            self._writer = threading.Thread(
+                target=self._run_writer, name='ride-live-location-writer', daemon=True
+            )
+            self._writer.start()
+
+    def _run_writer(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Failed to write live ride locations')
+            finally:
+                close_old_connections()
+
+
+def is_valid_step(distance_km, hours):
+    """
+    Whether a move between two fixes counts towards the path length
+    Rejects GPS jitter (moves shorter than RIDE_PATH_MIN_STEP_METERS) and
+    outliers (implied speed above RIDE_PATH_MAX_SPEED_KMH)
+    """
+    min_step_m = getattr(settings, 'RIDE_PATH_MIN_STEP_METERS', 10.0)
+    max_speed_kmh = getattr(settings, 'RIDE_PATH_MAX_SPEED_KMH', 180.0)
+
+    if distance_km * 1000 < min_step_m:
+        return False
+    if hours <= 0 or distance_km / hours > max_speed_kmh:
+        return False
+    return True
+
+
+def latest_plausible_fix_time(now=None):
+    """Newest fix timestamp accepted as given: server time plus RIDE_FIX_MAX_CLOCK_SKEW_SECONDS"""
+    skew = timedelta(seconds=getattr(settings, 'RIDE_FIX_MAX_CLOCK_SKEW_SECONDS', 120))
+    return (now or timezone.now()) + skew
+
+
+def accumulate_path_length(ride, fixes):
+    """
+    Advance the ride's running distance over chronologically sorted fixes
+    Fixes older than the current anchor are ignored; an anchor implausibly
+    far in the future (a device clock running ahead) is dropped so it
+    cannot swallow every later fix. Updates the ride's tracked_distance_km
+    and last_fix_* fields in memory.
+    """
+    total = float(ride.tracked_distance_km)
+    anchor_lat = ride.last_fix_latitude
+    anchor_lon = ride.last_fix_longitude
+    anchor_at = ride.last_fix_at
+    if anchor_at is not None and anchor_at > latest_plausible_fix_time():
+        anchor_at = None
+
+    for fix in fixes:
+        if anchor_at is not None and fix['timestamp'] <= anchor_at:
+            continue
+
+        if anchor_at is None:
+            anchor_lat, anchor_lon, anchor_at = fix['latitude'], fix['longitude'], fix['timestamp']
+            continue
+
+        distance = float(haversine_km(anchor_lat, anchor_lon, fix['latitude'], fix['longitude']))
+        hours = (fix['timestamp'] - anchor_at).total_seconds() / 3600
+        if not is_valid_step(distance, hours):
+            continue
+
+        total += distance
+        anchor_lat, anchor_lon, anchor_at = fix['latitude'], fix['longitude'], fix['timestamp']
+
+    ride.tracked_distance_km = Decimal(str(round(total, 3)))
+    ride.last_fix_latitude = anchor_lat
+    ride.last_fix_longitude = anchor_lon
+    ride.last_fix_at = anchor_at
+
+
+def ingest_location_fixes(ride, fixes):
+    """
+    Record GPS fixes for a ride
+
+    Args:
+        ride: Ride the fixes belong to
+        fixes: list of dicts with latitude, longitude and optional timestamp
+
+    Advances the running path length, moves the ride's current position to
+    the newest fix (one UPDATE via update_fields) and hands every fix to the
+    tracking buffer. Fixes for a ride that is no longer in TRACKED_STATUSES
+    are dropped.
+    """
+    now = timezone.now()
+    fixes = [
+        {**fix, 'timestamp': fix.get('timestamp') or now}
+        for fix in fixes
+    ]
+    fixes.sort(key=lambda fix: fix['timestamp'])
+    latest = fixes[-1]
+
+    with transaction.atomic():
+        # Lock the ride so concurrent uploads cannot double count a segment
+        state = Ride.objects.select_for_update().filter(pk=ride.pk, status__in=TRACKED_STATUSES).values(
+            'tracked_distance_km', 'last_fix_latitude', 'last_fix_longitude', 'last_fix_at'
+        ).first()
+        if state is None:
+            # Completed or cancelled meanwhile: late fixes must not change a settled distance
+            return
+        for field, value in state.items():
+            setattr(ride, field, value)
+
+        update_fields = ['tracked_distance_km', 'last_fix_latitude', 'last_fix_longitude', 'last_fix_at', 'updated_at']
+        # A stored fix from a device clock running ahead must not hold the position back
+        if (ride.last_fix_at is None or latest['timestamp'] >= ride.last_fix_at
+                or ride.last_fix_at > latest_plausible_fix_time(now)):
+            ride.current_latitude = latest['latitude']
+            ride.current_longitude = latest['longitude']
+            update_fields += ['current_latitude', 'current_longitude']
+
+        accumulate_path_length(ride, fixes)
+        ride.save(update_fields=update_fields)
+
+    location_buffer.add([
+        RideTracking(
+            ride_id=ride.id,
+            latitude=fix['latitude'],
+            longitude=fix['longitude'],
+            timestamp=fix['timestamp']
+        )
+        for fix in fixes
+    ])
+
+
+live_location_writer = LiveLocationWriter(
+    interval=getattr(settings, 'RIDE_LIVE_WRITE_SECONDS', 1.0),
+)
+atexit.register(live_location_writer.flush)
+
+
+def compress_ride_track(ride, tolerance_m=None):
+    """
+    Replace a ride's raw tracking rows with a simplified encoded polyline
+
+    Points are simplified with Douglas-Peucker within tolerance_m meters
+    (RIDE_TRACK_TOLERANCE_METERS by default), stored on the ride and the
+    raw RideTracking rows that were read are deleted, all in one transaction
+    with the ride locked. Returns the number of points kept.
+    """
+    if tolerance_m is None:
+        tolerance_m = getattr(settings, 'RIDE_TRACK_TOLERANCE_METERS', 5.0)
+
+    with transaction.atomic():
+        # Lock the ride and work from its stored polyline, not a stale copy
+        state = Ride.objects.select_for_update().filter(pk=ride.pk).values(
+            'track_polyline', 'track_point_count'
+        ).get()
+        ride.track_polyline, ride.track_point_count = state['track_polyline'], state['track_point_count']
+
+        rows = list(
+            RideTracking.objects.filter(ride_id=ride.id)
+            .order_by('timestamp', 'id').values_list('id', 'latitude', 'longitude')
+        )
+        if not rows:
+            return 0
+        # Only the rows read here are deleted; points other buffers write
+        # meanwhile stay for the next run
+        read_ids = [row[0] for row in rows]
+        points = [(float(latitude), float(longitude)) for _, latitude, longitude in rows]
+
+        raw_count = len(points)
+        if ride.track_polyline:
+            # Late points for an already compressed ride extend the stored path
+            points = decode_polyline(ride.track_polyline) + points
+            raw_count += ride.track_point_count
+
+        kept = [points[index] for index in douglas_peucker(points, tolerance_m)]
+        ride.track_polyline = encode_polyline(kept)
+        ride.track_point_count = raw_count
+        ride.save(update_fields=['track_polyline', 'track_point_count', 'updated_at'])
+        for offset in range(0, len(read_ids), TRACK_DELETE_CHUNK):
+            RideTracking.objects.filter(id__in=read_ids[offset:offset + TRACK_DELETE_CHUNK]).delete()
+    return len(kept)
@@ -4,27 +4,38 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.utils import timezone
 from django.db.models import Q
-from .models import Ride, RideTracking, SOSAlert, ChatMessage, Feedback, Complaint
+from ecopool_apps.trips.spatial_utils import decode_polyline
+from .models import Ride, SOSAlert, ChatMessage, Feedback, Complaint
 from .serializers import (
     RideSerializer, RideTrackingSerializer, SOSAlertSerializer,
-    ChatMessageSerializer, FeedbackSerializer, ComplaintSerializer
+    ChatMessageSerializer, FeedbackSerializer, ComplaintSerializer,
+    LocationUpdateSerializer, ChatReadSerializer
 )
-from ecopool_apps.sustainability.carbon_utils import calculate_co2_saved, calculate_reward_points
-from ecopool_apps.payments.models import RewardTransaction
+from .chat import mark_read, message_payload, publish_chat_event
+from .consumers import publish_location, publish_ride_status
+from .membership import is_participant, participant_ride_ids
+from .services import RideSettlementService
+from .sync import DeltaSyncMixin
+from .tracking import (
+    TRACKED_STATUSES, ingest_location_fixes, live_location_writer, location_buffer, compress_ride_track
+)
+from .track_utils import downsample
 
 
-class RideViewSet(viewsets.ModelViewSet):
+class RideViewSet(DeltaSyncMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing active rides
+    The list supports delta sync (?updated_since=) and ETags
     """
     permission_classes = [IsAuthenticated]
     serializer_class = RideSerializer
+    sync_model = 'ride'
     
     def get_queryset(self):
         user = self.request.user
         return Ride.objects.filter(
-            Q(driver=user) | Q(passengers=user)
-        ).distinct().select_related('trip', 'driver').prefetch_related('passengers')
+            participants__user=user
+        ).select_related('trip', 'driver').prefetch_related('passengers')
     
     @action(detail=True, methods=['post'])
     def start(self, request, pk=None):
@@ -46,6 +57,7 @@ class RideViewSet(viewsets.ModelViewSet):
         ride.status = 'in_progress'
         ride.start_time = timezone.now()
         ride.save()
+        publish_ride_status(ride.id, ride.status)
         
         return Response({'message': 'Ride started successfully'})
     
@@ -60,28 +72,30 @@ class RideViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        latitude = request.data.get('latitude')
-        longitude = request.data.get('longitude')
-        
-        if not latitude or not longitude:
+        if ride.status not in TRACKED_STATUSES:
             return Response(
-                {'error': 'Latitude and longitude required'},
+                {'error': 'Ride is not in progress'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Update ride current location
-        ride.current_latitude = latitude
-        ride.current_longitude = longitude
-        ride.save()
+        serializer = LocationUpdateSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                {'error': 'Latitude and longitude required', 'details': serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        # Create tracking point
-        RideTracking.objects.create(
-            ride=ride,
-            latitude=latitude,
-            longitude=longitude
-        )
+        # Update current location now; tracking points are written in batches
+        points = serializer.validated_data['points']
+        ingest_location_fixes(ride, points)
+        # Fixes without a timestamp were taken just now
+        now = timezone.now()
+        publish_location(ride.id, max(points, key=lambda fix: fix.get('timestamp') or now))
         
-        return Response({'message': 'Location updated successfully'})
+        return Response({
+            'message': 'Location updated successfully',
+            'points_received': len(points)
+        })
     
     @action(detail=True, methods=['post'])
     def complete(self, request, pk=None):
@@ -100,76 +114,74 @@ class RideViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        distance = request.data.get('distance_km')
-        if not distance:
+        # Persist fixes still queued from the live socket and the tracking
+        # buffer, then read the distance they accumulated
+        live_location_writer.flush([ride.id])
+        location_buffer.flush()
+        ride.refresh_from_db(fields=['tracked_distance_km', 'last_fix_latitude', 'last_fix_longitude', 'last_fix_at'])
+        
+        # Prefer the distance accumulated from ingested GPS fixes; rides
+        # without tracked fixes, or whose fixes were all filtered as jitter,
+        # fall back to the client value
+        if ride.last_fix_at is not None and ride.tracked_distance_km > 0:
+            distance = ride.tracked_distance_km
+            distance_source = 'tracked'
+        else:
+            distance = request.data.get('distance_km')
+            distance_source = 'client'
+            if not distance:
+                return Response(
+                    {'error': 'Distance is required'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        
+        # Settle ride, trip and all participants' rewards in one transaction
+        settlement = RideSettlementService.settle_ride(ride, distance)
+        if settlement is None:
             return Response(
-                {'error': 'Distance is required'},
+                {'error': 'Ride is not in progress'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Calculate CO2 saved
-        num_passengers = ride.passengers.count()
-        fuel_type = ride.trip.vehicle.fuel_type
-        co2_saved = calculate_co2_saved(float(distance), fuel_type, num_passengers)
-        
-        # Update ride
-        ride.status = 'completed'
-        ride.end_time = timezone.now()
-        ride.distance_covered = distance
-        ride.co2_saved = co2_saved
-        ride.save()
+        publish_ride_status(ride.id, 'completed')
         
-        # Update trip status
-        ride.trip.status = 'completed'
-        ride.trip.save()
-        
-        # Award reward points to all participants
-        reward_points = calculate_reward_points(co2_saved)
-        points_per_person = reward_points // (num_passengers + 1)
-        
-        # Driver rewards
-        ride.driver.reward_points += points_per_person
-        ride.driver.total_co2_saved += float(co2_saved)
-        ride.driver.total_rides += 1
-        ride.driver.save()
-        
-        RewardTransaction.objects.create(
-            user=ride.driver,
-            ride=ride,
-            transaction_type='earned',
-            points=points_per_person,
-            co2_saved=co2_saved,
-            description=f'Earned from completing ride #{ride.id}'
-        )
-        
-        # Passenger rewards
-        for passenger in ride.passengers.all():
-            passenger.reward_points += points_per_person
-            passenger.total_co2_saved += float(co2_saved)
-            passenger.total_rides += 1
-            passenger.save()
-            
-            RewardTransaction.objects.create(
-                user=passenger,
-                ride=ride,
-                transaction_type='earned',
-                points=points_per_person,
-                co2_saved=co2_saved,
-                description=f'Earned from ride #{ride.id}'
-            )
+        # Store the simplified path and drop the raw tracking rows
+        compress_ride_track(ride)
         
         return Response({
             'message': 'Ride completed successfully',
-            'co2_saved': str(co2_saved),
-            'reward_points': points_per_person,
-            'distance_km': distance
+            'co2_saved': str(settlement['co2_saved']),
+            'reward_points': settlement['reward_points'],
+            'distance_km': str(distance),
+            'distance_source': distance_source
         })
     
     @action(detail=True, methods=['get'])
     def tracking(self, request, pk=None):
-        """Get ride tracking history"""
+        """
+        Get ride tracking history
+        Compressed (completed) rides return the simplified path in travel
+        order; pass ?points=N to downsample it to at most N points
+        """
         ride = self.get_object()
-        tracking_points = ride.tracking_points.all()[:50]  # Last 50 points
+        
+        if ride.track_polyline:
+            try:
+                max_points = int(request.query_params.get('points', 0)) or None
+            except ValueError:
+                return Response(
+                    {'error': 'points must be an integer'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            path = downsample(decode_polyline(ride.track_polyline), max_points)
+            return Response([
+                {'latitude': f'{latitude:.5f}', 'longitude': f'{longitude:.5f}'}
+                for latitude, longitude in path
+            ])
+        
+        # Include points still waiting in this process's ingestion buffer
+        pending = sorted(location_buffer.pending_for(ride.id), key=lambda point: point.timestamp, reverse=True)
+        tracking_points = pending[:50] + list(ride.tracking_points.all()[:max(50 - len(pending), 0)])  # Last 50 points
         serializer = RideTrackingSerializer(tracking_points, many=True)
         return Response(serializer.data)
 
@@ -192,9 +204,8 @@ class SOSAlertViewSet(viewsets.ModelViewSet):
             # Users see alerts related to their rides
             return SOSAlert.objects.filter(
                 Q(triggered_by=user) |
-                Q(ride__driver=user) |
-                Q(ride__passengers=user)
-            ).distinct()
+                Q(ride_id__in=participant_ride_ids(user))
+            )
     
     def create(self, request):
         """Trigger SOS alert"""
@@ -209,7 +220,7 @@ class SOSAlertViewSet(viewsets.ModelViewSet):
             )
         
         # Verify user is part of the ride
-        if request.user not in [ride.driver] + list(ride.passengers.all()):
+        if not is_participant(ride.id, request.user.id):
             return Response(
                 {'error': 'You are not part of this ride'},
                 status=status.HTTP_403_FORBIDDEN
@@ -227,6 +238,7 @@ class SOSAlertViewSet(viewsets.ModelViewSet):
         # Update ride status
         ride.status = 'emergency'
         ride.save()
+        publish_ride_status(ride.id, ride.status)
         
         # TODO: Send notifications to organization admins
         # TODO: Send SMS/WhatsApp alerts
@@ -253,25 +265,30 @@ class SOSAlertViewSet(viewsets.ModelViewSet):
         return Response({'message': 'SOS alert resolved'})
 
 
-class ChatMessageViewSet(viewsets.ModelViewSet):
+class ChatMessageViewSet(DeltaSyncMixin, viewsets.ModelViewSet):
     """
     ViewSet for in-app chat messages
+    The list supports delta sync (?since_id=) and ETags
     """
     permission_classes = [IsAuthenticated]
     serializer_class = ChatMessageSerializer
+    sync_model = 'chat_message'
+    sync_field = 'id'
     
     def get_queryset(self):
+        """
+        Messages of the user's rides; ?ride= narrows to one ride
+        Newer messages than the last one seen come from ?since_id=
+        """
         user = self.request.user
         ride_id = self.request.query_params.get('ride')
         
-        queryset = ChatMessage.objects.filter(
-            Q(ride__driver=user) | Q(ride__passengers=user)
-        )
+        queryset = ChatMessage.objects.filter(ride__participants__user=user)
         
         if ride_id:
             queryset = queryset.filter(ride_id=ride_id)
         
-        return queryset.select_related('sender', 'ride').order_by('timestamp')
+        return queryset.select_related('sender', 'ride').order_by('timestamp', 'id')
     
     def create(self, request):
         """Send a chat message"""
@@ -279,27 +296,54 @@ class ChatMessageViewSet(viewsets.ModelViewSet):
         
         try:
             ride = Ride.objects.get(id=ride_id)
-        except Ride.DoesNotExist:
+        except (Ride.DoesNotExist, ValueError, TypeError):
             return Response(
                 {'error': 'Ride not found'},
                 status=status.HTTP_404_NOT_FOUND
             )
         
         # Verify user is part of the ride
-        if request.user not in [ride.driver] + list(ride.passengers.all()):
+        if not is_participant(ride.id, request.user.id):
             return Response(
                 {'error': 'You are not part of this ride'},
                 status=status.HTTP_403_FORBIDDEN
             )
         
+        text = (request.data.get('message') or '').strip()
+        if not text:
+            return Response(
+                {'error': 'Message is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
         message = ChatMessage.objects.create(
             ride=ride,
             sender=request.user,
-            message=request.data.get('message')
+            message=text
         )
         
+        # Deliver to participants connected to the live ride channel
+        publish_chat_event(ride.id, {'type': 'chat.message', 'message': message_payload(message)})
+        
         serializer = ChatMessageSerializer(message)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
+    
+    @action(detail=False, methods=['post'])
+    def read(self, request):
+        """Mark a ride's chat as read up to a message id"""
+        serializer = ChatReadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ride_id = serializer.validated_data['ride']
+        
+        if not is_participant(ride_id, request.user.id):
+            return Response(
+                {'error': 'You are not part of this ride'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        last_read_id = mark_read(ride_id, request.user.id, serializer.validated_data['last_read_id'])
+        publish_chat_event(ride_id, {'type': 'chat.read', 'user': request.user.id, 'last_read_id': last_read_id})
+        return Response({'ride': ride_id, 'last_read_id': last_read_id})
 
 
 class FeedbackViewSet(viewsets.ModelViewSet):
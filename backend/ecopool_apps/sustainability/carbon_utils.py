@@ -5,7 +5,27 @@ from decimal import Decimal
 from ecopool_apps.sustainability.models import CarbonEmissionFactor
 
 
-def calculate_co2_saved(distance_km, fuel_type, num_passengers=1):
+DEFAULT_EMISSION_FACTORS = {
+    'petrol': Decimal('0.21'),
+    'diesel': Decimal('0.24'),
+    'electric': Decimal('0.05'),
+    'hybrid': Decimal('0.12'),
+}
+
+
+def get_emission_factors():
+    """
+    Load all emission factors in one query
+    Returns dict: fuel_type -> kg CO2 per km, falling back to defaults
+    """
+    factors = dict(DEFAULT_EMISSION_FACTORS)
+    factors.update(
+        CarbonEmissionFactor.objects.values_list('fuel_type', 'emission_factor')
+    )
+    return factors
+
+
+def calculate_co2_saved(distance_km, fuel_type, num_passengers=1, emission_factors=None):
     """
     Calculate CO2 saved by carpooling
     
@@ -13,22 +33,21 @@ def calculate_co2_saved(distance_km, fuel_type, num_passengers=1):
         distance_km: Distance traveled in kilometers
         fuel_type: Type of fuel used by vehicle
         num_passengers: Number of passengers sharing the ride
+        emission_factors: Optional preloaded result of get_emission_factors(),
+            avoids a query per call when settling many rides
     
     Returns:
         Decimal: CO2 saved in kilograms
     """
-    try:
-        emission_factor = CarbonEmissionFactor.objects.get(fuel_type=fuel_type)
-        emission_per_km = emission_factor.emission_factor
-    except CarbonEmissionFactor.DoesNotExist:
-        # Default emission factors if not in database
-        default_factors = {
-            'petrol': Decimal('0.21'),
-            'diesel': Decimal('0.24'),
-            'electric': Decimal('0.05'),
-            'hybrid': Decimal('0.12'),
-        }
-        emission_per_km = default_factors.get(fuel_type, Decimal('0.21'))
+    if emission_factors is not None:
+        emission_per_km = emission_factors.get(fuel_type, DEFAULT_EMISSION_FACTORS['petrol'])
+    else:
+        try:
+            emission_factor = CarbonEmissionFactor.objects.get(fuel_type=fuel_type)
+            emission_per_km = emission_factor.emission_factor
+        except CarbonEmissionFactor.DoesNotExist:
+            # Default emission factors if not in database
+            emission_per_km = DEFAULT_EMISSION_FACTORS.get(fuel_type, Decimal('0.21'))
     
     # Calculate total emissions if everyone drove alone
     total_emissions_alone = emission_per_km * Decimal(str(distance_km)) * (num_passengers + 1)
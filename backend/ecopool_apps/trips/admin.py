@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Trip, TripRequest
+from .models import Trip, TripRequest, AssignmentProposal, RideGroup, SeatHold, RecurringTrip
 
 
 @admin.register(Trip)
@@ -15,3 +15,32 @@ class TripRequestAdmin(admin.ModelAdmin):
     list_display = ['trip', 'passenger', 'status', 'created_at']
     search_fields = ['trip__origin_name', 'passenger__username']
     list_filter = ['status', 'created_at']
+
+
+@admin.register(AssignmentProposal)
+class AssignmentProposalAdmin(admin.ModelAdmin):
+    list_display = ['trip', 'passenger', 'seats', 'cost', 'status', 'created_at']
+    search_fields = ['passenger__username', 'run_id']
+    list_filter = ['status', 'created_at']
+
+
+@admin.register(RideGroup)
+class RideGroupAdmin(admin.ModelAdmin):
+    list_display = ['id', 'organization', 'transport_mode', 'member_count', 'capacity', 'departure_time', 'status']
+    list_filter = ['status', 'transport_mode', 'departure_time']
+    readonly_fields = ['created_at', 'updated_at']
+
+
+@admin.register(SeatHold)
+class SeatHoldAdmin(admin.ModelAdmin):
+    list_display = ['trip', 'trip_request', 'seats', 'status', 'expires_at']
+    list_filter = ['status', 'expires_at']
+    readonly_fields = ['created_at', 'updated_at']
+
+
+@admin.register(RecurringTrip)
+class RecurringTripAdmin(admin.ModelAdmin):
+    list_display = ['driver', 'start_location', 'end_location', 'departure_time_of_day', 'start_date', 'end_date', 'is_active']
+    search_fields = ['driver__username', 'start_location', 'end_location']
+    list_filter = ['is_active', 'trip_type']
+    readonly_fields = ['created_at', 'updated_at']
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class TripsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ecopool_apps.trips'
+
+    def ready(self):
+        import ecopool_apps.trips.search_cache  # Import signals
+        import ecopool_apps.trips.grouping  # noqa: F401
+        import ecopool_apps.trips.recurrence  # noqa: F401
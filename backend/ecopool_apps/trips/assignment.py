@@ -0,0 +1,255 @@
+"""
+Batch assignment of riders to offered trips
+
+For one organization and departure window, every pending TripRequest and
+every open 'seeking' trip is a rider needing seats, and every open
+'offering' trip supplies its available seats. Candidate edges are
+generated through a geohash grid over offer origins and the departure-time
+window, costed from detour, time deviation and driver trust score, and
+solved with SeatAssignmentSolver. A multi-seat request that would only get
+some of its seats is left out and the rest solved again. The result is
+stored as AssignmentProposal rows for drivers to confirm or reject in bulk.
+"""
+import time
+import uuid
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from .assignment_utils import SeatAssignmentSolver
+from .inventory import SeatInventoryService
+from .models import Trip, TripRequest, AssignmentProposal
+from .spatial_utils import encode_geohash, geohash_cells_around, haversine_km
+
+
+OFFER_CELL_PRECISION = 5
+# Integer cost units per unit of the weighted cost
+COST_SCALE = 100
+MAX_TRUST_SCORE = 5.0
+
+
+def _gender_allows(preference, gender):
+    return preference == 'any' or (gender or '').lower() == preference.lower()
+
+
+class BatchAssignmentService:
+    """Build, confirm and reject batch assignment proposals"""
+
+    @staticmethod
+    def run(organization, window_start, window_end):
+        """
+        Solve the assignment for one organization and departure window
+        Pending proposals from earlier runs for the same offers are
+        superseded. Returns a summary dict.
+        """
+        started = time.perf_counter()
+        max_detour_km = getattr(settings, 'TRIP_ASSIGNMENT_MAX_DETOUR_KM', 5.0)
+        max_minutes = getattr(settings, 'TRIP_ASSIGNMENT_MAX_TIME_DEVIATION_MINUTES', 30)
+        max_candidates = getattr(settings, 'TRIP_ASSIGNMENT_MAX_CANDIDATES', 10)
+        detour_weight = getattr(settings, 'TRIP_ASSIGNMENT_DETOUR_WEIGHT', 1.0)
+        time_weight = getattr(settings, 'TRIP_ASSIGNMENT_TIME_WEIGHT', 0.1)
+        trust_weight = getattr(settings, 'TRIP_ASSIGNMENT_TRUST_WEIGHT', 1.0)
+
+        SeatInventoryService.expire_holds()
+        open_trips = Trip.objects.filter(
+            driver__organization=organization,
+            status='scheduled',
+            departure_time__range=(window_start, window_end),
+        )
+        offers = list(open_trips.filter(trip_type='offering', available_seats__gt=0).values(
+            'id', 'driver_id', 'start_latitude', 'start_longitude', 'end_latitude', 'end_longitude',
+            'departure_time', 'available_seats', 'gender_preference', 'driver__gender', 'driver__trust_score'
+        ))
+        offers_by_id = {offer['id']: offer for offer in offers}
+        requests = list(TripRequest.objects.filter(
+            trip_id__in=offers_by_id.keys(), status='pending'
+        ).order_by('created_at', 'id').values('id', 'trip_id', 'passenger_id', 'seats_requested'))
+        seekers = list(open_trips.filter(trip_type='seeking').exclude(
+            seeker_proposals__status='confirmed'
+        ).order_by('created_at', 'id').values(
+            'id', 'driver_id', 'start_latitude', 'start_longitude', 'end_latitude', 'end_longitude',
+            'departure_time', 'gender_preference', 'driver__gender'
+        ))
+
+        def trust_cost(offer):
+            return trust_weight * (MAX_TRUST_SCORE - float(offer['driver__trust_score']))
+
+        # Seats held by the pending requests below are theirs to place again
+        held = SeatInventoryService.held_seats(offers_by_id.keys())
+        capacities = {offer['id']: offer['available_seats'] + held[offer['id']] for offer in offers}
+        riders = {}    # rider key -> list of (offer id, cost)
+        details = {}   # rider key -> (detour_km, minutes) per offer
+
+        # Pending requests: one unit rider per requested seat, bound to the requested trip
+        for request in requests:
+            offer = offers_by_id[request['trip_id']]
+            cost = int(round(trust_cost(offer) * COST_SCALE))
+            for seat in range(request['seats_requested']):
+                riders[('request', request['id'], seat)] = [(offer['id'], cost)]
+
+        # Seeking trips: candidate offers from the grid cells around the seeker's origin
+        offers_by_cell = defaultdict(list)
+        for offer in offers:
+            offers_by_cell[encode_geohash(offer['start_latitude'], offer['start_longitude'], OFFER_CELL_PRECISION)].append(offer)
+
+        for seeker in seekers:
+            nearby = [
+                offer
+                for cell in geohash_cells_around(seeker['start_latitude'], seeker['start_longitude'], max_detour_km, OFFER_CELL_PRECISION)
+                for offer in offers_by_cell.get(cell, ())
+                if offer['driver_id'] != seeker['driver_id']
+                and abs((offer['departure_time'] - seeker['departure_time']).total_seconds()) <= max_minutes * 60
+                and _gender_allows(offer['gender_preference'], seeker['driver__gender'])
+                and _gender_allows(seeker['gender_preference'], offer['driver__gender'])
+            ]
+            if not nearby:
+                continue
+
+            coords = np.array(
+                [(o['start_latitude'], o['start_longitude'], o['end_latitude'], o['end_longitude']) for o in nearby],
+                dtype=float
+            )
+            pickup = haversine_km(coords[:, 0], coords[:, 1], float(seeker['start_latitude']), float(seeker['start_longitude']))
+            dropoff = haversine_km(coords[:, 2], coords[:, 3], float(seeker['end_latitude']), float(seeker['end_longitude']))
+            minutes = np.array(
+                [abs((o['departure_time'] - seeker['departure_time']).total_seconds()) / 60 for o in nearby]
+            )
+            trust = np.array([trust_cost(o) for o in nearby])
+            costs = detour_weight * (pickup + dropoff) + time_weight * minutes + trust
+            valid = np.flatnonzero((pickup <= max_detour_km) & (dropoff <= max_detour_km))
+            best = valid[np.argsort(costs[valid], kind='stable')[:max_candidates]]
+
+            rider = ('seeker', seeker['id'], 0)
+            riders[rider] = [(nearby[index]['id'], int(round(costs[index] * COST_SCALE))) for index in best]
+            details[rider] = {
+                nearby[index]['id']: (float(pickup[index] + dropoff[index]), float(minutes[index]))
+                for index in best
+            }
+
+        requests_by_id = {request['id']: request for request in requests}
+        solver, assignment, seats_placed = BatchAssignmentService._solve(capacities, riders, requests_by_id)
+        seekers_by_id = {seeker['id']: seeker for seeker in seekers}
+
+        run_id = uuid.uuid4()
+        proposals = []
+        for request_id, placed in seats_placed.items():
+            request = requests_by_id[request_id]
+            proposals.append(AssignmentProposal(
+                run_id=run_id, organization=organization, trip_id=request['trip_id'],
+                passenger_id=request['passenger_id'], trip_request_id=request_id,
+                seats=placed, cost=solver.cost[(('request', request_id, 0), request['trip_id'])] / COST_SCALE
+            ))
+        for rider, offer_id in assignment.items():
+            kind, seeker_id, _ = rider
+            if kind != 'seeker':
+                continue
+            detour_km, minutes = details[rider][offer_id]
+            proposals.append(AssignmentProposal(
+                run_id=run_id, organization=organization, trip_id=offer_id,
+                passenger_id=seekers_by_id[seeker_id]['driver_id'], seeking_trip_id=seeker_id,
+                seats=1, cost=solver.cost[(rider, offer_id)] / COST_SCALE,
+                detour_km=detour_km, time_deviation_minutes=minutes
+            ))
+
+        with transaction.atomic():
+            AssignmentProposal.objects.filter(
+                organization=organization, status='pending', trip_id__in=offers_by_id.keys()
+            ).update(status='superseded')
+            AssignmentProposal.objects.bulk_create(proposals, batch_size=1000)
+
+        return {
+            'run_id': str(run_id),
+            'offers': len(offers),
+            'riders': len(requests) + len(seekers),
+            'proposals': len(proposals),
+            'total_cost': round(sum(proposal.cost for proposal in proposals), 2),
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+        }
+
+    @staticmethod
+    def _solve(capacities, riders, requests_by_id):
+        """
+        Solve with multi-seat requests placed all or nothing
+        A request that only got some of its seats is dropped and the rest
+        is solved again, so the seats it took go to riders that can use
+        them. Returns (solver, assignment, seats placed per request id).
+        """
+        dropped = set()
+        while True:
+            solver = SeatAssignmentSolver(capacities)
+            for rider, candidates in riders.items():
+                kind, object_id, _ = rider
+                if not (kind == 'request' and object_id in dropped):
+                    solver.add_rider(rider, candidates)
+            assignment = solver.solve()
+
+            seats_placed = defaultdict(int)
+            for kind, object_id, _ in assignment:
+                if kind == 'request':
+                    seats_placed[object_id] += 1
+            partial = {
+                request_id for request_id, placed in seats_placed.items()
+                if placed != requests_by_id[request_id]['seats_requested']
+            }
+            if not partial:
+                return solver, assignment, seats_placed
+            dropped |= partial
+
+    @staticmethod
+    def confirm(proposal_ids, driver):
+        """
+        Confirm a driver's pending proposals in one transaction
+        Seats go through SeatInventoryService, so a proposal that no longer
+        fits is skipped instead of overbooking.
+        Returns dict with confirmed and skipped proposal ids.
+        """
+        with transaction.atomic():
+            proposals = list(
+                AssignmentProposal.objects.select_for_update()
+                .filter(id__in=proposal_ids, trip__driver=driver, status='pending')
+                .order_by('cost', 'id')
+            )
+
+            # Pending requests are accepted like any other (consuming their hold)
+            request_proposals = [proposal for proposal in proposals if proposal.trip_request_id]
+            accepted_requests = set(SeatInventoryService.accept(
+                [proposal.trip_request_id for proposal in request_proposals], driver
+            )['accepted']) if request_proposals else set()
+            confirmed = [proposal for proposal in request_proposals if proposal.trip_request_id in accepted_requests]
+
+            seekers_by_trip = defaultdict(list)
+            for proposal in proposals:
+                if proposal.seeking_trip_id:
+                    seekers_by_trip[proposal.trip_id].append((proposal, proposal.seats))
+            for trip_id, entries in seekers_by_trip.items():
+                confirmed.extend(SeatInventoryService.reserve_batch(trip_id, entries))
+
+            TripRequest.objects.bulk_create([
+                TripRequest(
+                    trip_id=proposal.trip_id,
+                    passenger_id=proposal.passenger_id,
+                    seats_requested=proposal.seats,
+                    status='accepted',
+                    message='Assigned by batch matching'
+                )
+                for proposal in confirmed if proposal.seeking_trip_id
+            ])
+            confirmed_ids = {proposal.id for proposal in confirmed}
+            AssignmentProposal.objects.filter(id__in=confirmed_ids).update(status='confirmed')
+            AssignmentProposal.objects.filter(
+                id__in=[proposal.id for proposal in proposals if proposal.id not in confirmed_ids]
+            ).update(status='rejected')
+
+        return {
+            'confirmed': sorted(confirmed_ids),
+            'skipped': sorted(set(proposal_ids) - confirmed_ids),
+        }
+
+    @staticmethod
+    def reject(proposal_ids, driver):
+        """Reject a driver's pending proposals; returns the number rejected"""
+        return AssignmentProposal.objects.filter(
+            id__in=proposal_ids, trip__driver=driver, status='pending'
+        ).update(status='rejected')
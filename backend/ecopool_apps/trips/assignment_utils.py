@@ -0,0 +1,248 @@
+"""
+Seat-constrained assignment solver used by batch trip assignment
+
+Riders need one seat each and may be placed on any of their candidate
+trips (sparse edges with integer costs); each trip has a seat capacity.
+The solver runs successive shortest augmenting paths (the sparse Hungarian
+method) from the scarcer side. When seats are plentiful there is one
+search per rider, in the order riders were added, each a Dijkstra over
+reduced costs that stops at the first free seat, so it only explores the
+neighbourhood it can actually displace assignments in. When a rider's
+search finds no free seat, everything it reached is saturated and can only
+lead to other saturated nodes; those seats are marked dead and skipped by
+later searches. When riders outnumber seats, each search starts from every
+trip with a free seat at once (trips are pulled in as the search distance
+reaches them), augments along all node-disjoint shortest paths it found,
+and the solver stops when a search finds no free rider. Node potentials
+are updated only on the nodes a search touched.
+
+Guarantees: the number of riders placed is maximum (a node with no
+augmenting path can never gain one later). When riders outnumber seats,
+the total cost is minimum among all such assignments. When seats are
+plentiful, riders are admitted in the order they were added (a rider is
+left out only if placing it would unseat an earlier one) and the total
+cost is minimum for the riders admitted.
+"""
+import heapq
+from operator import itemgetter
+
+
+INF = float('inf')
+
+
+class SeatAssignmentSolver:
+    """Min-cost assignment of unit-demand riders to capacitated trips"""
+
+    def __init__(self, capacities):
+        """
+        Args:
+            capacities: dict of trip key -> free seats
+        """
+        self.capacities = {trip: seats for trip, seats in capacities.items() if seats > 0}
+        self.edges = {}            # rider -> list of (trip, cost)
+        self.cost = {}             # (rider, trip) -> cost
+        self.assigned = {}         # rider -> trip
+
+    def add_rider(self, rider, candidates):
+        """
+        Register a rider with candidate trips
+        Args:
+            candidates: iterable of (trip, cost) with non-negative integer costs
+        """
+        edges = [(trip, cost) for trip, cost in candidates if trip in self.capacities]
+        self.edges[rider] = edges
+        for trip, cost in edges:
+            self.cost[(rider, trip)] = cost
+
+    def solve(self):
+        """Place every rider that can be placed; returns rider -> trip"""
+        rider_partners = {rider: set() for rider in self.edges}
+        trip_partners = {trip: set() for trip in self.capacities}
+        rider_capacity = dict.fromkeys(self.edges, 1)
+
+        if len(self.edges) <= sum(self.capacities.values()):
+            self._run(
+                list(self.edges), self.edges, rider_partners, rider_capacity,
+                trip_partners, self.capacities, lambda rider, trip: self.cost[(rider, trip)]
+            )
+        else:
+            trip_edges = {trip: [] for trip in self.capacities}
+            for rider, edges in self.edges.items():
+                for trip, cost in edges:
+                    trip_edges[trip].append((rider, cost))
+            # Searches start from every trip with a free seat at once, so no
+            # seat is filled in a worse order than another
+            self._run(
+                list(self.capacities), trip_edges, trip_partners, self.capacities,
+                rider_partners, rider_capacity, lambda trip, rider: self.cost[(rider, trip)],
+                together=True
+            )
+
+        self.assigned = {
+            rider: next(iter(trips)) for rider, trips in rider_partners.items() if trips
+        }
+        return dict(self.assigned)
+
+    def total_cost(self):
+        return sum(self.cost[(rider, trip)] for rider, trip in self.assigned.items())
+
+    @staticmethod
+    def _run(sources, out_edges, source_partners, source_capacity,
+             target_partners, target_capacity, cost_of, together=False):
+        """
+        Successive shortest paths from source units to free targets
+        out_edges: source node -> list of (target node, cost)
+        Each search starts from the next unit in sources or, with together,
+        from every unsaturated source node at once (a virtual start node
+        joined to each of them at cost 0), so each augmentation is the
+        cheapest one available anywhere. Unsaturated nodes wait in a heap
+        keyed by potential and are pulled into a search only as its
+        distance reaches them, and one search augments along every path of
+        the shortest length that shares no node with an earlier one (after
+        the potential update all of them have reduced cost 0, so each stays
+        a shortest path after the others are applied).
+        A node's edges are walked lazily in cost order: target potentials
+        only decrease, so dist + potential + cost is a lower bound of the
+        reduced distance an edge gives and edges past the first free target
+        are never relaxed.
+        """
+        out_edges = {node: sorted(edges, key=itemgetter(1)) for node, edges in out_edges.items()}
+        source_pot = {}
+        target_pot = {}
+        start_pot = 0          # potential of the virtual start node
+        dead_targets = set()
+        pending = iter([None] if together else sources)
+        # Unsaturated source nodes as (-potential, node); stale entries are skipped
+        free = [(0, node) for node in dict.fromkeys(sources)] if together else []
+
+        while True:
+            source_dist = {}
+            target_dist = {}
+            target_parent = {}     # target -> source node it was reached from
+            source_parent = {}     # source node -> saturated target it was reached through
+            done_sources = set()
+            done_targets = set()
+            pulled = []
+            # (distance, kind, node, edge index); kind 0 source, 1 target,
+            # 2 next edge of a source, 3 next unsaturated source
+            heap = []
+            if together:
+                if not free:
+                    break
+                heap.append((start_pot + free[0][0], 3, 0, 0))
+            else:
+                source = next(pending, None)
+                if source is None:
+                    break
+                if len(source_partners[source]) >= source_capacity[source]:
+                    continue
+                source_dist[source] = 0
+                heap.append((0, 0, source, 0))
+            found = []
+            limit = INF
+
+            while heap and heap[0][0] <= limit:
+                dist, kind, node, index = heapq.heappop(heap)
+                if kind == 3:
+                    while free:
+                        key, node = heapq.heappop(free)
+                        if key != -source_pot.get(node, 0) or len(source_partners[node]) >= source_capacity[node]:
+                            continue
+                        pulled.append(node)
+                        dist = start_pot + key
+                        if dist < source_dist.get(node, INF):
+                            source_dist[node] = dist
+                            source_parent.pop(node, None)
+                            heapq.heappush(heap, (dist, 0, node, 0))
+                        break
+                    if free:
+                        heapq.heappush(heap, (start_pot + free[0][0], 3, 0, 0))
+                elif kind == 2:
+                    edges = out_edges[node]
+                    target, cost = edges[index]
+                    if index + 1 < len(edges):
+                        heapq.heappush(heap, (dist - cost + edges[index + 1][1], 2, node, index + 1))
+                    if target in source_partners[node] or target in dead_targets:
+                        continue
+                    candidate = dist - target_pot.get(target, 0)
+                    if candidate < target_dist.get(target, INF):
+                        target_dist[target] = candidate
+                        target_parent[target] = node
+                        heapq.heappush(heap, (candidate, 1, target, 0))
+                elif kind == 1:
+                    if node in done_targets or dist > target_dist[node]:
+                        continue
+                    done_targets.add(node)
+                    if len(target_partners[node]) < target_capacity[node]:
+                        found.append(node)
+                        limit = dist
+                        if not together:
+                            break
+                        continue
+                    # Saturated target: its current partners can be moved
+                    base = dist + target_pot.get(node, 0)
+                    for partner in target_partners[node]:
+                        candidate = base - cost_of(partner, node) - source_pot.get(partner, 0)
+                        if candidate < source_dist.get(partner, INF):
+                            source_dist[partner] = candidate
+                            source_parent[partner] = node
+                            heapq.heappush(heap, (candidate, 0, partner, 0))
+                else:
+                    if node in done_sources or dist > source_dist[node]:
+                        continue
+                    done_sources.add(node)
+                    if out_edges[node]:
+                        heapq.heappush(heap, (dist + source_pot.get(node, 0) + out_edges[node][0][1], 2, node, 0))
+
+            if not found:
+                if together:
+                    # No augmenting path from any free source: the flow is maximum
+                    break
+                dead_targets |= done_targets
+                continue
+
+            # Potentials: pi += min(dist, D) - D, only non-zero on touched nodes
+            if together:
+                start_pot -= limit
+            for node, dist in source_dist.items():
+                if dist < limit:
+                    source_pot[node] = source_pot.get(node, 0) + dist - limit
+            for node, dist in target_dist.items():
+                if dist < limit:
+                    target_pot[node] = target_pot.get(node, 0) + dist - limit
+
+            # Walk each path back: each node takes the next target and
+            # releases the saturated target it was reached through, up to
+            # the node the search started from
+            moved_sources = set()
+            moved_targets = set()
+            for target in found:
+                # (node, target it takes) from the free target back to the start
+                chain = []
+                node = target_parent[target]
+                while True:
+                    chain.append((node, target))
+                    if node not in source_parent:
+                        break
+                    target = source_parent[node]
+                    node = target_parent[target]
+                if (moved_targets.intersection(target for _, target in chain)
+                        or moved_sources.intersection(node for node, _ in chain[:-1])
+                        or len(source_partners[node]) >= source_capacity[node]):
+                    continue
+                for node, target in chain:
+                    if node in source_parent:
+                        moved_sources.add(node)
+                        released = source_parent[node]
+                        source_partners[node].discard(released)
+                        target_partners[released].discard(node)
+                    moved_targets.add(target)
+                    source_partners[node].add(target)
+                    target_partners[target].add(node)
+
+            if together:
+                # Pulled nodes and nodes whose potential moved go back in
+                # with their current key
+                for node in set(pulled).union(node for node, dist in source_dist.items() if dist < limit):
+                    if len(source_partners[node]) < source_capacity[node]:
+                        heapq.heappush(free, (-source_pot.get(node, 0), node))
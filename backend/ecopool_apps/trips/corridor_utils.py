@@ -0,0 +1,169 @@
+"""
+Route-corridor matching utilities
+
+Each trip's route polyline is rasterized into geohash cells (TripRouteCell
+rows, indexed on the cell) together with how far along the route each cell
+is reached. A search looks up trips whose routes pass through the cells
+around both the rider's pickup and drop-off, then scores the shortlist by
+projecting those points onto the route polyline.
+"""
+import math
+
+import numpy as np
+from django.db.models import Exists, OuterRef, Q
+
+from .spatial_utils import (
+    decode_polyline, encode_geohash, encode_polyline, geohash_cells_around, haversine_km, trip_field,
+    KM_PER_DEGREE_LAT
+)
+
+
+# ~4.9km x 4.9km cells
+CORRIDOR_CELL_PRECISION = 5
+# Distance between samples when rasterizing a route segment into cells
+SAMPLE_STEP_KM = 0.5
+
+
+def synthesize_route_polyline(start, end, waypoints=None):
+    """Build an encoded polyline from start, optional waypoints and end (lat, lon) pairs"""
+    points = [start] + list(waypoints or []) + [end]
+    return encode_polyline(points)
+
+
+def trip_route_points(trip):
+    """Route of a trip as (lat, lon) floats; a straight line if no polyline is stored"""
+    route_polyline = trip_field(trip, 'route_polyline')
+    if route_polyline:
+        points = decode_polyline(route_polyline)
+        if points:
+            return points
+    return [
+        (float(trip_field(trip, 'start_latitude')), float(trip_field(trip, 'start_longitude'))),
+        (float(trip_field(trip, 'end_latitude')), float(trip_field(trip, 'end_longitude'))),
+    ]
+
+
+def compute_route_cells(points):
+    """
+    Rasterize a route into corridor cells
+    Returns dict: cell -> (first_offset_km, last_offset_km), the distance
+    along the route at which the cell is first and last visited
+    """
+    cells = {}
+
+    def visit(lat, lon, offset):
+        cell = encode_geohash(lat, lon, CORRIDOR_CELL_PRECISION)
+        first, last = cells.get(cell, (offset, offset))
+        cells[cell] = (min(first, offset), max(last, offset))
+
+    offset = 0.0
+    visit(points[0][0], points[0][1], offset)
+    for (lat1, lon1), (lat2, lon2) in zip(points, points[1:]):
+        length = float(haversine_km(lat1, lon1, lat2, lon2))
+        steps = max(int(math.ceil(length / SAMPLE_STEP_KM)), 1)
+        for step in range(1, steps + 1):
+            fraction = step / steps
+            visit(
+                lat1 + (lat2 - lat1) * fraction,
+                lon1 + (lon2 - lon1) * fraction,
+                offset + length * fraction
+            )
+        offset += length
+
+    return cells
+
+
+def rebuild_route_cells(trip):
+    """Replace the stored corridor cells of a trip"""
+    from .models import TripRouteCell
+
+    TripRouteCell.objects.filter(trip_id=trip.id).delete()
+    TripRouteCell.objects.bulk_create([
+        TripRouteCell(trip_id=trip.id, cell=cell, first_offset_km=first, last_offset_km=last)
+        for cell, (first, last) in compute_route_cells(trip_route_points(trip)).items()
+    ])
+
+
+def corridor_q(search_params):
+    """
+    Q object keeping trips whose route passes through the cells covering
+    the search radius around both the rider's start and end points, with a
+    start cell reached before an end cell is last left (a trip going the
+    other way is rejected in the database)
+    """
+    from .models import TripRouteCell
+
+    radius_km = float(search_params.get('max_distance_km', 5.0))
+    start_cells = geohash_cells_around(
+        search_params.get('start_latitude'), search_params.get('start_longitude'),
+        radius_km, CORRIDOR_CELL_PRECISION
+    )
+    end_cells = geohash_cells_around(
+        search_params.get('end_latitude'), search_params.get('end_longitude'),
+        radius_km, CORRIDOR_CELL_PRECISION
+    )
+    end_after_start = TripRouteCell.objects.filter(
+        trip_id=OuterRef('trip_id'), cell__in=end_cells, last_offset_km__gt=OuterRef('first_offset_km')
+    )
+    return Q(id__in=TripRouteCell.objects.filter(cell__in=start_cells).filter(Exists(end_after_start)).values('trip_id'))
+
+
+def project_onto_route(points, latitude, longitude):
+    """
+    Closest point of a route polyline to a coordinate
+    Returns tuple: (distance_km, offset_km along the route)
+    """
+    route = np.asarray(points, dtype=float)
+    cos_lat = math.cos(math.radians(latitude))
+    # Local equirectangular projection centred on the query point, in km
+    xy = np.column_stack((
+        (route[:, 1] - longitude) * KM_PER_DEGREE_LAT * cos_lat,
+        (route[:, 0] - latitude) * KM_PER_DEGREE_LAT,
+    ))
+    if len(xy) == 1:
+        return float(np.hypot(xy[0, 0], xy[0, 1])), 0.0
+
+    starts = xy[:-1]
+    vectors = xy[1:] - starts
+    lengths_sq = (vectors ** 2).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.where(lengths_sq > 0, -(starts * vectors).sum(axis=1) / lengths_sq, 0.0)
+    t = np.clip(t, 0.0, 1.0)
+    closest = starts + vectors * t[:, None]
+    distances = np.hypot(closest[:, 0], closest[:, 1])
+
+    segment = int(np.argmin(distances))
+    lengths = np.sqrt(lengths_sq)
+    offset = lengths[:segment].sum() + lengths[segment] * t[segment]
+    return float(distances[segment]), float(offset)
+
+
+def score_corridor_batch(search_start, search_end, trips, max_deviation_km=5):
+    """
+    Score trips whose route passes within max_deviation_km of both the
+    rider's start and end, with pickup before drop-off along the route
+    Returns list of (trip, overlap_percentage), highest first
+    """
+    start_lat, start_lon = float(search_start['lat']), float(search_start['lon'])
+    end_lat, end_lon = float(search_end['lat']), float(search_end['lon'])
+    total_route_distance = float(haversine_km(start_lat, start_lon, end_lat, end_lon))
+
+    scored = []
+    for trip in trips:
+        points = trip_route_points(trip)
+        pickup_distance, pickup_offset = project_onto_route(points, start_lat, start_lon)
+        if pickup_distance > max_deviation_km:
+            continue
+        dropoff_distance, dropoff_offset = project_onto_route(points, end_lat, end_lon)
+        if dropoff_distance > max_deviation_km or dropoff_offset <= pickup_offset:
+            continue
+
+        deviation = pickup_distance + dropoff_distance
+        if total_route_distance > 0:
+            overlap = max(0, 100 - (deviation / total_route_distance * 100))
+        else:
+            overlap = 100
+        scored.append((trip, overlap))
+
+    scored.sort(key=lambda item: item[1], reverse=True)
+    return scored
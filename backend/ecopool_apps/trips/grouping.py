@@ -0,0 +1,233 @@
+"""
+Ride-mate grouping for 'seeking' trips
+
+Seekers travelling by auto rickshaw, public transport or bike are grouped
+with others whose origin, destination and departure time are close, up to
+the mode's group size. Grouping is incremental: a new seeking trip looks up
+the forming groups in the geohash cells around its origin within the
+departure tolerance (an indexed query whose size does not depend on the
+organization's total), joins the best compatible one or starts a new group.
+Cancelled or deleted trips leave their group, which is re-centred on its
+remaining members. A grouped trip whose endpoints or departure time are
+edited re-centres its group, and is regrouped if it no longer fits it.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Trip, RideGroup
+from .spatial_utils import encode_geohash, geohash_cells_around, haversine_km
+
+
+GROUP_CELL_PRECISION = 6
+# Riders per group, by the seekers' transport mode
+GROUP_CAPACITY = {
+    'auto': 3,
+    'public': 4,
+    'any': 4,
+    'bike': 2,
+}
+
+
+def _group_settings():
+    return (
+        getattr(settings, 'TRIP_GROUP_RADIUS_KM', 1.0),
+        getattr(settings, 'TRIP_GROUP_TIME_TOLERANCE_MINUTES', 15),
+        getattr(settings, 'TRIP_GROUP_KM_PER_MINUTE', 0.1),
+    )
+
+
+def is_groupable(trip):
+    return trip.trip_type == 'seeking' and trip.transport_mode in GROUP_CAPACITY
+
+
+def _gender_compatible(group, trip):
+    driver_gender = (trip.driver.gender or '').lower()
+    if group.gender_preference != 'any' and driver_gender != group.gender_preference:
+        return False
+    if trip.gender_preference != 'any' and group.gender != trip.gender_preference:
+        return False
+    return True
+
+
+def _offsets(group, trip):
+    """Origin and destination distance in km and departure offset in minutes"""
+    start_km = float(haversine_km(group.start_latitude, group.start_longitude, trip.start_latitude, trip.start_longitude))
+    end_km = float(haversine_km(group.end_latitude, group.end_longitude, trip.end_latitude, trip.end_longitude))
+    minutes = abs((group.departure_time - trip.departure_time).total_seconds()) / 60
+    return start_km, end_km, minutes
+
+
+def _grouping_changed(trip):
+    """Whether the save changed the trip's endpoints or departure time"""
+    if getattr(trip, '_route_signature', None) != trip._get_route_signature():
+        return True
+    return getattr(trip, '_saved_departure_time', None) != trip.departure_time
+
+
+class RideGroupService:
+    """Incremental formation of ride-mate groups"""
+
+    @staticmethod
+    def candidates(trip, exclude_group_id=None):
+        """
+        Forming groups the trip could join, best first
+        Returns list of (score, group); score is the origin plus destination
+        distance in km with the time offset converted at TRIP_GROUP_KM_PER_MINUTE
+        """
+        radius_km, tolerance_minutes, km_per_minute = _group_settings()
+        tolerance = timedelta(minutes=tolerance_minutes)
+        groups = RideGroup.objects.filter(
+            status='forming',
+            start_geohash__in=geohash_cells_around(
+                trip.start_latitude, trip.start_longitude, radius_km, GROUP_CELL_PRECISION
+            ),
+            departure_time__range=(trip.departure_time - tolerance, trip.departure_time + tolerance),
+            organization_id=trip.driver.organization_id,
+            transport_mode=trip.transport_mode,
+        ).exclude(members__driver_id=trip.driver_id)
+        if exclude_group_id:
+            groups = groups.exclude(id=exclude_group_id)
+
+        ranked = []
+        for group in groups:
+            start_km, end_km, minutes = _offsets(group, trip)
+            if start_km > radius_km or end_km > radius_km or not _gender_compatible(group, trip):
+                continue
+            ranked.append((start_km + end_km + minutes * km_per_minute, group))
+        ranked.sort(key=lambda item: (item[0], item[1].id))
+        return ranked
+
+    @staticmethod
+    def assign(trip):
+        """Put a new seeking trip into the best forming group, or start one"""
+        with transaction.atomic():
+            for score, group in RideGroupService.candidates(trip):
+                if RideGroupService._join(trip, group):
+                    return group
+            group = RideGroup.objects.create(
+                organization_id=trip.driver.organization_id,
+                transport_mode=trip.transport_mode,
+                capacity=GROUP_CAPACITY[trip.transport_mode],
+                member_count=1,
+                start_latitude=float(trip.start_latitude),
+                start_longitude=float(trip.start_longitude),
+                end_latitude=float(trip.end_latitude),
+                end_longitude=float(trip.end_longitude),
+                start_geohash=encode_geohash(trip.start_latitude, trip.start_longitude, GROUP_CELL_PRECISION),
+                departure_time=trip.departure_time,
+                gender_preference=trip.gender_preference,
+                gender=(trip.driver.gender or '').lower(),
+            )
+            Trip.objects.filter(id=trip.id).update(ride_group=group)
+            trip.ride_group = group
+            return group
+
+    @staticmethod
+    def move(trip, group):
+        """Switch a trip to another group; returns False if it cannot join it"""
+        with transaction.atomic():
+            if not any(candidate.id == group.id for _, candidate in RideGroupService.candidates(trip, trip.ride_group_id)):
+                return False
+            previous_id = trip.ride_group_id
+            if not RideGroupService._join(trip, group):
+                return False
+            if previous_id:
+                RideGroupService.refresh(previous_id)
+            return True
+
+    @staticmethod
+    def regroup(trip):
+        """Re-centre an edited trip's group, and regroup the trip if it no longer fits"""
+        radius_km, tolerance_minutes, _ = _group_settings()
+        with transaction.atomic():
+            group = RideGroupService.refresh(trip.ride_group_id)
+            if group is None:
+                return RideGroupService.assign(trip)
+            start_km, end_km, minutes = _offsets(group, trip)
+            if start_km <= radius_km and end_km <= radius_km and minutes <= tolerance_minutes:
+                return group
+            RideGroupService.leave(trip)
+            return RideGroupService.assign(trip)
+
+    @staticmethod
+    def leave(trip):
+        """Remove a trip from its group"""
+        group_id = trip.ride_group_id
+        if not group_id:
+            return
+        with transaction.atomic():
+            Trip.objects.filter(id=trip.id).update(ride_group=None)
+            trip.ride_group = None
+            RideGroupService.refresh(group_id)
+
+    @staticmethod
+    def refresh(group_id):
+        """Recompute a group's centroid, preferences and status from its members"""
+        group = RideGroup.objects.select_for_update().filter(id=group_id).first()
+        if group is None:
+            return None
+        members = list(Trip.objects.filter(ride_group_id=group_id).values(
+            'start_latitude', 'start_longitude', 'end_latitude', 'end_longitude',
+            'departure_time', 'gender_preference', 'driver__gender'
+        ))
+        group.member_count = len(members)
+        if not members:
+            group.status = 'dissolved'
+            group.save()
+            return group
+
+        count = len(members)
+        group.start_latitude = sum(float(m['start_latitude']) for m in members) / count
+        group.start_longitude = sum(float(m['start_longitude']) for m in members) / count
+        group.end_latitude = sum(float(m['end_latitude']) for m in members) / count
+        group.end_longitude = sum(float(m['end_longitude']) for m in members) / count
+        group.start_geohash = encode_geohash(group.start_latitude, group.start_longitude, GROUP_CELL_PRECISION)
+        base = members[0]['departure_time']
+        group.departure_time = base + sum((m['departure_time'] - base for m in members), timedelta()) / count
+
+        preferences = {m['gender_preference'] for m in members} - {'any'}
+        group.gender_preference = preferences.pop() if len(preferences) == 1 else 'any'
+        genders = {(m['driver__gender'] or '').lower() for m in members}
+        group.gender = genders.pop() if len(genders) == 1 else ''
+        group.status = 'full' if count >= group.capacity else 'forming'
+        group.save()
+        return group
+
+    @staticmethod
+    def _join(trip, group):
+        # Reserve the slot first so concurrent joins cannot overfill the group
+        reserved = RideGroup.objects.filter(
+            id=group.id, status='forming', member_count__lt=F('capacity')
+        ).update(member_count=F('member_count') + 1)
+        if not reserved:
+            return False
+        Trip.objects.filter(id=trip.id).update(ride_group=group)
+        trip.ride_group = group
+        RideGroupService.refresh(group.id)
+        return True
+
+
+@receiver(post_save, sender=Trip)
+def group_seeking_trip(sender, instance, created, raw=False, **kwargs):
+    """Group new seeking trips, regroup edited ones and drop cancelled ones from their group"""
+    if raw or not is_groupable(instance):
+        return
+    if instance.status == 'scheduled':
+        if created and instance.ride_group_id is None:
+            RideGroupService.assign(instance)
+        elif not created and instance.ride_group_id and _grouping_changed(instance):
+            RideGroupService.regroup(instance)
+    elif instance.status == 'cancelled' and instance.ride_group_id:
+        RideGroupService.leave(instance)
+
+
+@receiver(post_delete, sender=Trip)
+def ungroup_deleted_trip(sender, instance, **kwargs):
+    if instance.ride_group_id:
+        with transaction.atomic():
+            RideGroupService.refresh(instance.ride_group_id)
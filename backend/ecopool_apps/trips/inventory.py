@@ -0,0 +1,201 @@
+"""
+Seat inventory for offered trips
+
+Seats are only ever taken with a conditional UPDATE
+(available_seats = available_seats - n WHERE available_seats >= n) and
+returned with available_seats + n, so concurrent accepts never lose updates
+or overbook and no trip row is locked while a request is processed.
+
+A new trip request holds its seats for TRIP_SEAT_HOLD_MINUTES; accepting it
+consumes the hold, rejecting it or letting it expire gives the seats back.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Trip, TripRequest, SeatHold
+from .search_cache import search_cache
+
+
+def _invalidate_on_commit(trip_ids):
+    """Seat counts change through .update(), which skips post_save"""
+    trip_ids = set(trip_ids)
+    if trip_ids:
+        transaction.on_commit(
+            lambda: search_cache.invalidate_trips(Trip.objects.filter(id__in=trip_ids))
+        )
+
+
+class SeatInventoryService:
+    """Reserve, hold and release trip seats"""
+
+    @staticmethod
+    def reserve(trip_id, seats):
+        """Take seats if enough are free; returns True on success"""
+        taken = Trip.objects.filter(id=trip_id, available_seats__gte=seats).update(
+            available_seats=F('available_seats') - seats
+        )
+        if taken:
+            _invalidate_on_commit([trip_id])
+        return bool(taken)
+
+    @staticmethod
+    def reserve_batch(trip_id, entries):
+        """
+        Reserve seats for several entries on one trip
+        Tries all of them with a single UPDATE, then falls back to one at a
+        time in the given order.
+        Args:
+            entries: list of (item, seats)
+        Returns list of the items that got their seats
+        """
+        if not entries:
+            return []
+        if SeatInventoryService.reserve(trip_id, sum(seats for _, seats in entries)):
+            return [item for item, _ in entries]
+        return [item for item, seats in entries if SeatInventoryService.reserve(trip_id, seats)]
+
+    @staticmethod
+    def release(trip_id, seats):
+        """Give seats back to a trip"""
+        if seats > 0:
+            Trip.objects.filter(id=trip_id).update(available_seats=F('available_seats') + seats)
+            _invalidate_on_commit([trip_id])
+
+    @staticmethod
+    def hold(trip_request):
+        """
+        Hold seats for a new pending request
+        Returns False if the trip does not have enough free seats. With
+        TRIP_SEAT_HOLD_MINUTES = 0 nothing is held and only availability is checked.
+        """
+        minutes = getattr(settings, 'TRIP_SEAT_HOLD_MINUTES', 15)
+        if minutes <= 0:
+            return Trip.objects.filter(
+                id=trip_request.trip_id, available_seats__gte=trip_request.seats_requested
+            ).exists()
+
+        # Only this trip's lapsed holds; the rest are swept by expire_seat_holds
+        SeatInventoryService.expire_holds([trip_request.trip_id])
+        with transaction.atomic():
+            if not SeatInventoryService.reserve(trip_request.trip_id, trip_request.seats_requested):
+                return False
+            SeatHold.objects.create(
+                trip_id=trip_request.trip_id,
+                trip_request=trip_request,
+                seats=trip_request.seats_requested,
+                expires_at=timezone.now() + timedelta(minutes=minutes)
+            )
+        return True
+
+    @staticmethod
+    def held_seats(trip_ids):
+        """Seats currently held by pending requests, by trip id"""
+        held = defaultdict(int)
+        for hold in SeatHold.objects.filter(
+            trip_id__in=trip_ids, status='active', expires_at__gt=timezone.now()
+        ).values('trip_id', 'seats'):
+            held[hold['trip_id']] += hold['seats']
+        return held
+
+    @staticmethod
+    def accept(request_ids, driver):
+        """
+        Accept pending requests for the driver's trips in one transaction
+        Held requests consume their hold; the rest reserve seats, oldest
+        request first when a trip cannot take them all.
+        Returns dict with accepted and skipped request ids.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            requests = list(
+                TripRequest.objects.select_for_update()
+                .filter(id__in=request_ids, trip__driver=driver, status='pending')
+                .order_by('created_at', 'id')
+            )
+            # Expired holds that were not swept yet still have their seats taken
+            SeatInventoryService._release_holds(
+                SeatHold.objects.filter(trip_request__in=requests, status='active', expires_at__lte=now),
+                'expired'
+            )
+            holds = {
+                hold.trip_request_id: hold
+                for hold in SeatHold.objects.select_for_update().filter(
+                    trip_request__in=requests, status='active'
+                )
+            }
+
+            accepted = [request for request in requests if request.id in holds]
+            by_trip = defaultdict(list)
+            for request in requests:
+                if request.id not in holds:
+                    by_trip[request.trip_id].append((request, request.seats_requested))
+            for trip_id, entries in by_trip.items():
+                accepted.extend(SeatInventoryService.reserve_batch(trip_id, entries))
+
+            SeatHold.objects.filter(id__in=[hold.id for hold in holds.values()]).update(status='consumed')
+            TripRequest.objects.filter(id__in=[request.id for request in accepted]).update(
+                status='accepted', updated_at=now
+            )
+
+        accepted_ids = {request.id for request in accepted}
+        return {
+            'accepted': sorted(accepted_ids),
+            'skipped': sorted(set(request_ids) - accepted_ids),
+        }
+
+    @staticmethod
+    def reject(request_ids, driver):
+        """
+        Reject pending or accepted requests for the driver's trips
+        Held seats of pending requests and the seats of accepted requests
+        are returned to their trips. Returns the number of requests rejected.
+        """
+        with transaction.atomic():
+            requests = list(
+                TripRequest.objects.select_for_update()
+                .filter(id__in=request_ids, trip__driver=driver, status__in=['pending', 'accepted'])
+            )
+            SeatInventoryService._release_holds(
+                SeatHold.objects.filter(trip_request__in=requests, status='active'), 'released'
+            )
+            returned = defaultdict(int)
+            for request in requests:
+                if request.status == 'accepted':
+                    returned[request.trip_id] += request.seats_requested
+            for trip_id, seats in returned.items():
+                SeatInventoryService.release(trip_id, seats)
+            TripRequest.objects.filter(id__in=[request.id for request in requests]).update(
+                status='rejected', updated_at=timezone.now()
+            )
+        return len(requests)
+
+    @staticmethod
+    def expire_holds(trip_ids=None):
+        """
+        Give back the seats of holds past their expiry, of all trips or only
+        trip_ids; returns the number expired
+        """
+        holds = SeatHold.objects.filter(status='active', expires_at__lte=timezone.now())
+        if trip_ids is not None:
+            holds = holds.filter(trip_id__in=trip_ids)
+        with transaction.atomic():
+            return SeatInventoryService._release_holds(holds, 'expired')
+
+    @staticmethod
+    def _release_holds(holds, new_status):
+        """Close active holds and give their seats back; holds are locked first so none is released twice"""
+        holds = list(holds.select_for_update().values('id', 'trip_id', 'seats'))
+        if not holds:
+            return 0
+        SeatHold.objects.filter(id__in=[hold['id'] for hold in holds]).update(status=new_status)
+        returned = defaultdict(int)
+        for hold in holds:
+            returned[hold['trip_id']] += hold['seats']
+        for trip_id, seats in returned.items():
+            SeatInventoryService.release(trip_id, seats)
+        return len(holds)
@@ -0,0 +1,254 @@
+"""
+Management command benchmarking matching and ride endpoints on synthetic
+city workloads of increasing size
+For each size a commute workload (trips/workload.py) is generated inside a
+transaction that is rolled back afterwards, then trip search (matching
+pipeline and API), request accept, ride completion and the sustainability
+and diamond dashboards are timed. Reports p50/p95/p99 latency, queries per
+call and peak Python memory per operation, optionally as JSON.
+Usage: python manage.py benchmark_matching --sizes 1000,10000,50000 --iterations 50 --output bench.json
+"""
+import json
+import platform
+import random
+import time
+import tracemalloc
+from decimal import Decimal
+
+import django
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ecopool_apps.authentication.models import User
+from ecopool_apps.rides.models import Ride
+from ecopool_apps.trips.matching_utils import DISTANCE_MODE_FAST, match_trips
+from ecopool_apps.trips.models import Trip, TripRequest
+from ecopool_apps.trips.search_cache import search_cache
+from ecopool_apps.trips.serializers import TripSearchResultSerializer
+from ecopool_apps.trips.workload import generate_workload, sample_commute_searches
+
+
+# Calls per operation that are repeated with query capture and tracemalloc
+PROFILED_CALLS = 3
+USERS_PER_ORG = 200
+TRIPS_PER_ORG = 2500
+
+
+class Command(BaseCommand):
+    help = 'Benchmark search, accept, complete and dashboards on generated workloads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000', help='Comma separated trip counts')
+        parser.add_argument('--iterations', type=int, default=30, help='Timed calls per operation')
+        parser.add_argument('--city', default='mumbai', help='Comma separated cities')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed')
+        parser.add_argument('--output', help='Write results as JSON to this file')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+        except ValueError:
+            raise CommandError('--sizes must be comma separated integers')
+        iterations = options['iterations']
+        if not sizes or min(sizes) < 1 or iterations < 1:
+            raise CommandError('--sizes and --iterations must be positive')
+        cities = [city.strip().lower() for city in options['city'].split(',') if city.strip()]
+
+        report = {
+            'generated_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'seed': options['seed'],
+            'iterations': iterations,
+            'runs': [],
+        }
+        # Measure the matching work itself, not cache hits
+        cache_enabled = search_cache.enabled
+        search_cache.enabled = False
+        try:
+            for size in sizes:
+                report['runs'].append(self._run_size(size, iterations, cities, options['seed']))
+        finally:
+            search_cache.enabled = cache_enabled
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+        self.stdout.write(self.style.SUCCESS('✅ Benchmark complete (workloads rolled back)'))
+
+    def _run_size(self, size, iterations, cities, seed):
+        calls = iterations + PROFILED_CALLS
+        with transaction.atomic():
+            started = time.perf_counter()
+            workload = generate_workload(
+                organizations=max(1, size // TRIPS_PER_ORG),
+                users_per_org=USERS_PER_ORG,
+                trips=size,
+                cities=cities,
+                seed=seed,
+            )
+            generation_seconds = time.perf_counter() - started
+            organization_ids = workload.pop('organization_ids')
+            rng = random.Random(seed)
+
+            searches = sample_commute_searches(organization_ids, calls, seed=seed)
+            offers = list(
+                Trip.objects.filter(
+                    driver__organization_id__in=organization_ids,
+                    trip_type='offering',
+                    available_seats__gte=1,
+                ).select_related('driver')
+            )
+            if len(offers) < calls * 2:
+                raise CommandError(f'{size} trips is too small for {iterations} iterations')
+            offers = rng.sample(offers, calls * 2)
+            accept_offers, complete_offers = offers[:calls], offers[calls:]
+            passengers = list(User.objects.filter(organization_id__in=organization_ids, role='passenger'))
+            users = rng.sample(
+                list(User.objects.filter(organization_id__in=organization_ids)),
+                min(calls, workload['users'])
+            )
+
+            operations = {
+                'match_trips': self._match_operation(searches),
+                'search_api': self._search_operation(searches),
+                'accept_request': self._accept_operation(accept_offers, passengers, rng),
+                'complete_ride': self._complete_operation(complete_offers, passengers, rng),
+                'sustainability_dashboard': self._get_operation(users, '/api/sustainability-metrics/dashboard/'),
+                'diamond_dashboard': self._get_operation(users, '/api/rewards/wallet/dashboard/'),
+            }
+            results = {}
+            for name, (prepare, call) in operations.items():
+                results[name] = self._measure(prepare, call, iterations)
+                self._print_result(size, name, results[name])
+
+            transaction.set_rollback(True)
+
+        return {
+            'size': size,
+            'workload': workload,
+            'generation_seconds': round(generation_seconds, 2),
+            'operations': results,
+        }
+
+    @staticmethod
+    def _measure(prepare, call, iterations):
+        """Time `iterations` calls, then profile a few more for queries and memory"""
+        timings = []
+        for index in range(iterations):
+            argument = prepare(index)
+            started = time.perf_counter()
+            call(argument)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        queries = []
+        peak = 0
+        for index in range(iterations, iterations + PROFILED_CALLS):
+            argument = prepare(index)
+            tracemalloc.start()
+            try:
+                with CaptureQueriesContext(connection) as captured:
+                    call(argument)
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+            finally:
+                tracemalloc.stop()
+            queries.append(len(captured))
+
+        timings = np.array(timings)
+        p50, p95, p99 = np.percentile(timings, [50, 95, 99])
+        return {
+            'iterations': iterations,
+            'p50_ms': round(float(p50), 2),
+            'p95_ms': round(float(p95), 2),
+            'p99_ms': round(float(p99), 2),
+            'mean_ms': round(float(timings.mean()), 2),
+            'max_ms': round(float(timings.max()), 2),
+            'queries_per_call': round(sum(queries) / len(queries), 1),
+            'peak_memory_kb': round(peak / 1024, 1),
+        }
+
+    def _print_result(self, size, name, result):
+        self.stdout.write(
+            f"[{size} trips] {name}: p50 {result['p50_ms']} ms, p95 {result['p95_ms']} ms, "
+            f"p99 {result['p99_ms']} ms, {result['queries_per_call']} queries, "
+            f"peak {result['peak_memory_kb']} KB"
+        )
+
+    @staticmethod
+    def _match_operation(searches):
+        """The matching pipeline on its own, as the search view runs it"""
+        fields = TripSearchResultSerializer.search_result_fields(())
+
+        def call(search):
+            user, params = search
+            return match_trips(params, Trip.objects.values(*fields), user, DISTANCE_MODE_FAST)
+
+        return searches.__getitem__, call
+
+    @staticmethod
+    def _search_operation(searches):
+        client = APIClient()
+
+        def call(search):
+            user, params = search
+            client.force_authenticate(user)
+            response = client.post('/api/trips/search/', params, format='json')
+            assert response.status_code == 200, response.content
+            return response
+
+        return searches.__getitem__, call
+
+    @staticmethod
+    def _accept_operation(offers, passengers, rng):
+        client = APIClient()
+
+        def prepare(index):
+            trip = offers[index]
+            passenger = rng.choice(passengers)
+            return trip.driver, TripRequest.objects.create(trip=trip, passenger=passenger, seats_requested=1)
+
+        def call(argument):
+            driver, trip_request = argument
+            client.force_authenticate(driver)
+            response = client.post(f'/api/trip-requests/{trip_request.id}/accept/')
+            assert response.status_code == 200, response.content
+            return response
+
+        return prepare, call
+
+    @staticmethod
+    def _complete_operation(offers, passengers, rng):
+        client = APIClient()
+
+        def prepare(index):
+            trip = offers[index]
+            ride = Ride.objects.create(trip=trip, driver=trip.driver, status='in_progress')
+            ride.passengers.add(*rng.sample(passengers, min(2, len(passengers))))
+            return ride
+
+        def call(ride):
+            client.force_authenticate(ride.driver)
+            distance = Decimal(str(round(rng.uniform(3, 25), 2)))
+            response = client.post(f'/api/rides/{ride.id}/complete/', {'distance_km': distance}, format='json')
+            assert response.status_code == 200, response.content
+            return response
+
+        return prepare, call
+
+    @staticmethod
+    def _get_operation(users, path):
+        client = APIClient()
+
+        def call(user):
+            client.force_authenticate(user)
+            response = client.get(path)
+            assert response.status_code == 200, response.content
+            return response
+
+        return (lambda index: users[index % len(users)]), call
@@ -0,0 +1,112 @@
+"""
+Management command comparing the cost of serializing trip search results
+with the full TripSerializer and the .values() based TripSearchResultSerializer
+Sample trips are created inside a transaction that is rolled back.
+Usage: python manage.py benchmark_search_serialization --count 500
+"""
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from ecopool_apps.authentication.models import Organization, User, Vehicle
+from ecopool_apps.trips.models import Trip
+from ecopool_apps.trips.serializers import TripSerializer, TripSearchResultSerializer
+
+
+class Command(BaseCommand):
+    help = 'Benchmark full vs projected serialization of trip search results'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=500, help='Number of search results')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per variant (best is reported)')
+
+    def handle(self, *args, **options):
+        count = options['count']
+        repeat = options['repeat']
+
+        with transaction.atomic():
+            trip_ids = self._create_sample_trips(count)
+
+            def full():
+                trips = list(Trip.objects.filter(id__in=trip_ids).select_related(
+                    'driver__organization', 'vehicle__driver'
+                ))
+                for trip in trips:
+                    trip.match_score = 100.0
+                return TripSerializer(trips, many=True).data
+
+            def projected(expand=()):
+                rows = list(Trip.objects.filter(id__in=trip_ids).values(
+                    *TripSearchResultSerializer.search_result_fields(expand)
+                ))
+                for row in rows:
+                    row['match_score'] = 100.0
+                return TripSearchResultSerializer(rows, many=True, context={'expand': expand}).data
+
+            results = [
+                ('TripSerializer (model instances)', full),
+                ('TripSearchResultSerializer', projected),
+                ('TripSearchResultSerializer ?expand=driver,vehicle',
+                 lambda: projected(('driver', 'vehicle'))),
+            ]
+            baseline = None
+            for name, run in results:
+                best = min(self._time(run) for _ in range(repeat))
+                baseline = baseline or best
+                self.stdout.write(
+                    f'{name}: {best * 1000:.1f} ms for {count} results '
+                    f'({baseline / best:.1f}x vs full)'
+                )
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('✅ Benchmark complete (sample data rolled back)'))
+
+    @staticmethod
+    def _time(run):
+        started = time.perf_counter()
+        run()
+        return time.perf_counter() - started
+
+    @staticmethod
+    def _create_sample_trips(count):
+        organization = Organization.objects.create(
+            name='Benchmark Org', domain='benchmark.invalid', address='Benchmark'
+        )
+        drivers = [
+            User.objects.create(
+                username=f'benchmark_driver_{index}',
+                email=f'driver{index}@benchmark.invalid',
+                organization=organization,
+                role='driver',
+                gender='male'
+            )
+            for index in range(min(count, 50))
+        ]
+        vehicles = [
+            Vehicle.objects.create(
+                driver=driver, vehicle_type='Sedan', model='Benchmark',
+                registration_number=f'BENCH{driver.id}', fuel_type='petrol',
+                capacity=4, color='white', year=2022
+            )
+            for driver in drivers
+        ]
+        departure = timezone.now() + timedelta(hours=2)
+        trips = Trip.objects.bulk_create([
+            Trip(
+                driver=drivers[index % len(drivers)],
+                vehicle=vehicles[index % len(vehicles)],
+                start_location='Start', start_latitude=Decimal('19.0600000'),
+                start_longitude=Decimal('72.8400000'),
+                end_location='End', end_latitude=Decimal('19.0200000'),
+                end_longitude=Decimal('72.8470000'),
+                departure_time=departure + timedelta(minutes=index),
+                available_seats=3, price_per_seat=Decimal('50.00')
+            )
+            for index in range(count)
+        ])
+        return [trip.id for trip in trips]
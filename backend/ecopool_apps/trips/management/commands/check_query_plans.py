@@ -0,0 +1,105 @@
+"""
+Management command to verify that hot queries are served by indexes
+Runs EXPLAIN on each query and fails if any plan contains a sequential scan.
+Run after migrations or in CI: python manage.py check_query_plans
+"""
+import re
+from datetime import timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from ecopool_apps.authentication.models import Organization
+from ecopool_apps.trips.models import Trip, TripRequest
+from ecopool_apps.trips.matching_utils import build_trip_filters
+from ecopool_apps.rides.models import RideTracking, ChatMessage
+from ecopool_apps.rewards.models import DiamondTransaction
+
+
+# SQLite reports full table scans as "SCAN <table>" (index scans add "USING")
+SQLITE_SEQ_SCAN = re.compile(r'\bSCAN (\w+)\b(?!.*\bUSING\b)')
+POSTGRES_SEQ_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+
+def hot_queries():
+    """Representative querysets for the API's hottest read paths"""
+    now = timezone.now()
+    search_user = SimpleNamespace(organization=Organization(pk=1), gender='female')
+    search_params = {
+        'start_latitude': Decimal('12.9716'),
+        'start_longitude': Decimal('77.5946'),
+        'end_latitude': Decimal('12.9352'),
+        'end_longitude': Decimal('77.6245'),
+        'max_distance_km': Decimal('5.0'),
+        'seats_needed': 1,
+    }
+
+    windowed_params = {**search_params, 'departure_time': now + timedelta(hours=2), 'time_tolerance_minutes': 30}
+    corridor_params = {**search_params, 'match_mode': 'corridor'}
+
+    return [
+        ('trip search candidates',
+         Trip.objects.filter(build_trip_filters(search_params, search_user))),
+        ('trip search departure window',
+         Trip.objects.filter(build_trip_filters(windowed_params, search_user))),
+        ('trip corridor search candidates',
+         Trip.objects.filter(build_trip_filters(corridor_params, search_user))),
+        ('trip request duplicate check',
+         TripRequest.objects.filter(trip_id=1, passenger_id=1, status__in=['pending', 'accepted'])),
+        ('ride tracking history',
+         RideTracking.objects.filter(ride_id=1).order_by('-timestamp')[:50]),
+        ('ride chat messages',
+         ChatMessage.objects.filter(ride_id=1, expires_at__gt=now).order_by('timestamp')),
+        ('expired chat cleanup',
+         ChatMessage.objects.filter(expires_at__lt=now)),
+        ('wallet recent transactions',
+         DiamondTransaction.objects.filter(wallet_id=1)[:10]),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN hot queries and fail if any of them performs a sequential scan'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verbose-plans',
+            action='store_true',
+            help='Print the full plan for every query'
+        )
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        if vendor == 'postgresql':
+            pattern = POSTGRES_SEQ_SCAN
+        elif vendor == 'sqlite':
+            pattern = SQLITE_SEQ_SCAN
+        else:
+            raise CommandError(f'Query plan checks are not supported on {vendor}')
+
+        failures = []
+        for name, queryset in hot_queries():
+            with transaction.atomic():
+                if vendor == 'postgresql':
+                    # Small or empty tables make seq scans look cheapest; disable
+                    # them so the plan shows whether a usable index exists at all
+                    with connection.cursor() as cursor:
+                        cursor.execute('SET LOCAL enable_seqscan = off')
+                plan = queryset.explain()
+
+            scanned = sorted(set(pattern.findall(plan)))
+            if scanned:
+                failures.append(name)
+                self.stdout.write(
+                    self.style.ERROR(f'❌ {name}: sequential scan on {", ".join(scanned)}')
+                )
+            else:
+                self.stdout.write(self.style.SUCCESS(f'✅ {name}'))
+
+            if options['verbose_plans'] or scanned:
+                self.stdout.write(plan)
+
+        if failures:
+            raise CommandError(f'{len(failures)} hot queries perform sequential scans')
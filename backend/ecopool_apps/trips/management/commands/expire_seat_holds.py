@@ -0,0 +1,17 @@
+"""
+Management command to return the seats of expired seat holds to their trips
+Holds are also expired lazily when new requests are made; run this
+periodically (e.g. every minute via cron) so idle trips get their seats back.
+Usage: python manage.py expire_seat_holds
+"""
+from django.core.management.base import BaseCommand
+
+from ecopool_apps.trips.inventory import SeatInventoryService
+
+
+class Command(BaseCommand):
+    help = 'Release seats held by trip requests past their hold expiry'
+
+    def handle(self, *args, **options):
+        expired = SeatInventoryService.expire_holds()
+        self.stdout.write(self.style.SUCCESS(f'✅ Expired {expired} seat holds'))
@@ -0,0 +1,59 @@
+"""
+Management command to generate a synthetic city workload
+Creates organizations with employees, drivers' vehicles, diamond wallets and
+commute trips around the given cities (see trips/workload.py). Generated
+organizations use a '.workload.invalid' domain; --clear removes them.
+Usage: python manage.py generate_city_workload --organizations 10 --users 500 --trips 50000 --city mumbai,pune
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ecopool_apps.trips.workload import CITY_PRESETS, clear_workload, generate_workload
+
+
+class Command(BaseCommand):
+    help = 'Generate organizations, users, vehicles and commute trips around city centers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organizations', type=int, default=5, help='Organizations to create')
+        parser.add_argument('--users', type=int, default=200, help='Users per organization')
+        parser.add_argument('--trips', type=int, default=10000, help='Trips to create')
+        parser.add_argument(
+            '--city', default='mumbai',
+            help=f'Comma separated cities ({", ".join(sorted(CITY_PRESETS))})'
+        )
+        parser.add_argument('--days', type=int, default=5, help='Upcoming weekdays to spread trips over')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed')
+        parser.add_argument('--clear', action='store_true', help='Delete previously generated workloads and exit')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            removed = clear_workload()
+            self.stdout.write(self.style.SUCCESS(f'✅ Removed {removed} generated organizations'))
+            return
+
+        cities = [city.strip().lower() for city in options['city'].split(',') if city.strip()]
+        unknown = [city for city in cities if city not in CITY_PRESETS]
+        if unknown or not cities:
+            raise CommandError(f'Unknown city: {", ".join(unknown) or options["city"]}')
+        if options['organizations'] < 1 or options['users'] < 1 or options['days'] < 1:
+            raise CommandError('--organizations, --users and --days must be positive')
+
+        started = time.perf_counter()
+        summary = generate_workload(
+            organizations=options['organizations'],
+            users_per_org=options['users'],
+            trips=options['trips'],
+            cities=cities,
+            days=options['days'],
+            seed=options['seed'],
+        )
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f"{summary['organizations']} organizations, {summary['users']} users "
+            f"({summary['drivers']} drivers), {summary['trips']} trips, "
+            f"{summary['route_cells']} route cells in {elapsed:.1f}s"
+        )
+        self.stdout.write(self.style.SUCCESS('✅ Workload generated'))
@@ -0,0 +1,38 @@
+"""
+Management command to place ungrouped upcoming seeking trips into ride-mate groups
+New seeking trips are grouped on creation; this backfills trips created
+before grouping existed. Trips are processed in arrival order, the same way
+they would have been grouped incrementally.
+Usage: python manage.py group_seeking_trips [--organization 1]
+"""
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ecopool_apps.trips.grouping import GROUP_CAPACITY, RideGroupService
+from ecopool_apps.trips.models import Trip
+
+
+class Command(BaseCommand):
+    help = 'Group upcoming seeking trips that are not in a ride-mate group yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organization', type=int, help='Organization id (default: all)')
+
+    def handle(self, *args, **options):
+        trips = Trip.objects.filter(
+            trip_type='seeking',
+            transport_mode__in=GROUP_CAPACITY,
+            status='scheduled',
+            ride_group__isnull=True,
+            departure_time__gte=timezone.now(),
+        ).select_related('driver').order_by('created_at', 'id')
+        if options['organization']:
+            trips = trips.filter(driver__organization_id=options['organization'])
+
+        group_ids = set()
+        count = 0
+        for trip in trips.iterator():
+            group_ids.add(RideGroupService.assign(trip).id)
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Grouped {count} seeking trips into {len(group_ids)} groups'))
@@ -0,0 +1,19 @@
+"""
+Management command to create the upcoming occurrences of recurring trips
+Only occurrences within RECURRING_TRIP_HORIZON_DAYS become Trip rows; run
+this at least daily (e.g. via cron) so the window keeps moving forward.
+Usage: python manage.py materialize_recurring_trips
+"""
+from django.core.management.base import BaseCommand
+
+from ecopool_apps.trips.recurrence import materialize_horizon, horizon_days
+
+
+class Command(BaseCommand):
+    help = 'Materialize recurring trip occurrences within the search horizon'
+
+    def handle(self, *args, **options):
+        created = materialize_horizon()
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Created {created} trip occurrences for the next {horizon_days()} days'
+        ))
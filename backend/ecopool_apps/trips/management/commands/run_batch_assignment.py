@@ -0,0 +1,49 @@
+"""
+Management command to run batch assignment for organizations
+Places pending trip requests and seeking trips onto offered trips in the
+departure window and stores the result as proposals for drivers to confirm.
+Usage: python manage.py run_batch_assignment --hours 2 [--organization 1]
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from ecopool_apps.authentication.models import Organization
+from ecopool_apps.trips.assignment import BatchAssignmentService
+
+
+class Command(BaseCommand):
+    help = 'Assign riders to offered trips and create proposals for drivers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organization', type=int, help='Organization id (default: all)')
+        parser.add_argument('--start', type=str, help='Window start, ISO 8601 (default: now)')
+        parser.add_argument('--hours', type=int, default=2, help='Window length in hours')
+
+    def handle(self, *args, **options):
+        window_start = timezone.now()
+        if options['start']:
+            window_start = parse_datetime(options['start'])
+            if window_start is None:
+                raise CommandError('Invalid --start datetime')
+            if timezone.is_naive(window_start):
+                window_start = timezone.make_aware(window_start)
+        window_end = window_start + timedelta(hours=options['hours'])
+
+        organizations = Organization.objects.all()
+        if options['organization']:
+            organizations = organizations.filter(id=options['organization'])
+
+        total = 0
+        for organization in organizations:
+            summary = BatchAssignmentService.run(organization, window_start, window_end)
+            total += summary['proposals']
+            self.stdout.write(
+                f"{organization.name}: {summary['proposals']} proposals for "
+                f"{summary['riders']} riders on {summary['offers']} offers "
+                f"(cost {summary['total_cost']}, {summary['elapsed_ms']} ms)"
+            )
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Created {total} assignment proposals'))
@@ -0,0 +1,127 @@
+"""
+Management command to stress test concurrent accepts against one trip
+Creates a trip with a few seats and hundreds of pending requests, accepts
+them all from parallel threads and checks that exactly the available seats
+were handed out. --naive runs the old read-modify-write accept for
+comparison. The sample organization is deleted afterwards.
+Usage: python manage.py stress_seat_reservations --requests 300 --seats 10 --workers 32
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connection
+from django.utils import timezone
+
+from ecopool_apps.authentication.models import Organization, User
+from ecopool_apps.trips.inventory import SeatInventoryService
+from ecopool_apps.trips.models import Trip, TripRequest
+
+
+# SQLite raises "database is locked" under write contention; retry those
+LOCK_RETRIES = 20
+
+
+class Command(BaseCommand):
+    help = 'Fire parallel accepts at one trip and verify no seat is overbooked'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=300, help='Pending requests to accept')
+        parser.add_argument('--seats', type=int, default=10, help='Seats on the trip')
+        parser.add_argument('--workers', type=int, default=32, help='Parallel threads')
+        parser.add_argument('--naive', action='store_true', help='Use read-modify-write accepts instead')
+
+    def handle(self, *args, **options):
+        organization, driver, trip, request_ids = self._create_sample(options['requests'], options['seats'])
+        accept = self._naive_accept if options['naive'] else self._accept
+
+        def worker(request_id):
+            try:
+                for attempt in range(LOCK_RETRIES):
+                    try:
+                        return accept(request_id, driver)
+                    except OperationalError:
+                        time.sleep(0.01 * (attempt + 1))
+                return None
+            finally:
+                connection.close()
+
+        try:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+                outcomes = list(executor.map(worker, request_ids))
+            elapsed = time.perf_counter() - started
+            close_old_connections()
+
+            trip.refresh_from_db()
+            accepted = sum(1 for outcome in outcomes if outcome)
+            errors = sum(1 for outcome in outcomes if outcome is None)
+            accepted_rows = TripRequest.objects.filter(trip=trip, status='accepted').count()
+            expected = min(options['seats'], options['requests'])
+
+            self.stdout.write(
+                f"{len(request_ids)} accepts in {elapsed * 1000:.0f} ms with {options['workers']} workers: "
+                f"{accepted} accepted, {errors} gave up on locks, "
+                f"{accepted_rows} accepted rows, {trip.available_seats} seats left"
+            )
+            problems = []
+            if accepted_rows != options['seats'] - trip.available_seats:
+                problems.append('accepted requests do not match seats taken (lost update)')
+            if trip.available_seats < 0 or accepted_rows > options['seats']:
+                problems.append('trip overbooked')
+            if accepted_rows + errors < expected:
+                problems.append('seats left unsold')
+        finally:
+            organization.delete()
+
+        if problems:
+            raise CommandError('; '.join(problems))
+        self.stdout.write(self.style.SUCCESS('✅ No overbooking or lost updates (sample data deleted)'))
+
+    @staticmethod
+    def _accept(request_id, driver):
+        return bool(SeatInventoryService.accept([request_id], driver)['accepted'])
+
+    @staticmethod
+    def _naive_accept(request_id, driver):
+        """The previous accept: check and decrement in Python, save whole rows"""
+        trip_request = TripRequest.objects.select_related('trip').get(id=request_id)
+        trip = trip_request.trip
+        if trip_request.status != 'pending' or trip.available_seats < trip_request.seats_requested:
+            return False
+        trip_request.status = 'accepted'
+        trip_request.save()
+        trip.available_seats -= trip_request.seats_requested
+        trip.save()
+        return True
+
+    @staticmethod
+    def _create_sample(request_count, seats):
+        organization = Organization.objects.create(
+            name='Stress Test Org', domain='stress.invalid', address='Stress'
+        )
+        driver = User.objects.create(
+            username='stress_driver', email='driver@stress.invalid',
+            organization=organization, role='driver', gender='male'
+        )
+        trip = Trip.objects.create(
+            driver=driver, start_location='Start', start_latitude=Decimal('19.0600000'),
+            start_longitude=Decimal('72.8400000'), end_location='End',
+            end_latitude=Decimal('19.0200000'), end_longitude=Decimal('72.8470000'),
+            departure_time=timezone.now() + timedelta(hours=2),
+            available_seats=seats, price_per_seat=Decimal('50.00')
+        )
+        passengers = User.objects.bulk_create([
+            User(
+                username=f'stress_passenger_{index}', email=f'p{index}@stress.invalid',
+                organization=organization, role='passenger'
+            )
+            for index in range(request_count)
+        ])
+        requests = TripRequest.objects.bulk_create([
+            TripRequest(trip=trip, passenger=passenger, seats_requested=1)
+            for passenger in passengers
+        ])
+        return organization, driver, trip, [request.id for request in requests]
@@ -3,6 +3,39 @@ Utility functions for trip matching algorithm
 """
 from geopy.distance import geodesic
 from decimal import Decimal
+from datetime import timedelta
+import heapq
+import math
+import numpy as np
+from django.db.models import Q, QuerySet
+from django.utils import timezone
+
+from .spatial_utils import haversine_km, trip_radius_q, trip_field, MIN_KM_PER_DEGREE_LAT
+from .corridor_utils import corridor_q, score_corridor_batch
+from .time_index import TripTimeIndex
+
+
+# Distance modes for batch scoring
+DISTANCE_MODE_PRECISE = 'precise'  # geodesic (ellipsoidal), matches calculate_distance
+DISTANCE_MODE_FAST = 'fast'        # haversine (spherical), fully vectorized
+
+# Match modes
+MATCH_MODE_ENDPOINTS = 'endpoints'  # trip start/end near the rider's start/end
+MATCH_MODE_CORRIDOR = 'corridor'    # trip route passes the rider's start then end
+
+BOUNDING_BOX_SLACK = 1.01
+
+# Share of match_score given to departure-time proximity when a desired
+# departure time is searched; the rest is route overlap
+TIME_SCORE_WEIGHT = 0.3
+DEFAULT_TIME_TOLERANCE_MINUTES = 60
+
+# Haversine and geodesic distances differ by under 0.5%, so a fast-mode
+# score is within this many points of the precise score (overlap only
+# counts while deviation <= route length)
+PRECISE_SCORE_MARGIN = 1.0
+PRECISE_RADIUS_SLACK = 1.01
+RANKING_CHUNK_SIZE = 100
 
 
 def calculate_distance(lat1, lon1, lat2, lon2):
@@ -45,18 +78,220 @@ def check_route_overlap(trip_start, trip_end, search_start, search_end, max_devi
     return False, 0
 
 
-def match_trips(search_params, available_trips, user):
+def batch_distances(lat1, lon1, lat2, lon2, mode=DISTANCE_MODE_PRECISE):
     """
-    Main matching algorithm
-    Filters trips based on:
+    Distances in kilometers between paired coordinate arrays.
+    Fast mode is a single vectorized haversine pass; precise mode evaluates
+    the geodesic for each pair.
+    """
+    if mode == DISTANCE_MODE_FAST:
+        return haversine_km(lat1, lon1, lat2, lon2)
+
+    lat1, lon1, lat2, lon2 = np.broadcast_arrays(
+        np.asarray(lat1, dtype=float), np.asarray(lon1, dtype=float),
+        np.asarray(lat2, dtype=float), np.asarray(lon2, dtype=float)
+    )
+    distances = np.fromiter(
+        (
+            geodesic((a, b), (c, d)).kilometers
+            for a, b, c, d in zip(lat1.ravel(), lon1.ravel(), lat2.ravel(), lon2.ravel())
+        ),
+        dtype=float,
+        count=lat1.size
+    )
+    return distances.reshape(lat1.shape)
+
+
+def score_trips_batch(search_start, search_end, trips, max_deviation_km=5, mode=DISTANCE_MODE_PRECISE):
+    """
+    Vectorized equivalent of check_route_overlap over a whole candidate set
+    Returns list of (trip, overlap_percentage) for matching trips, ranked by
+    overlap (highest first, ties keep input order)
+    """
+    trips = list(trips)
+    if not trips:
+        return []
+
+    coords = np.array(
+        [
+            (
+                trip_field(trip, 'start_latitude'), trip_field(trip, 'start_longitude'),
+                trip_field(trip, 'end_latitude'), trip_field(trip, 'end_longitude')
+            )
+            for trip in trips
+        ],
+        dtype=float
+    )
+    search_start_lat = float(search_start['lat'])
+    search_start_lon = float(search_start['lon'])
+    search_end_lat = float(search_end['lat'])
+    search_end_lon = float(search_end['lon'])
+
+    start_distances = batch_distances(
+        coords[:, 0], coords[:, 1], search_start_lat, search_start_lon, mode
+    )
+    end_distances = batch_distances(
+        coords[:, 2], coords[:, 3], search_end_lat, search_end_lon, mode
+    )
+
+    # Route length is the same for every candidate, so compute it once
+    total_route_distance = float(batch_distances(
+        search_start_lat, search_start_lon, search_end_lat, search_end_lon, mode
+    ))
+
+    mask = (start_distances <= max_deviation_km) & (end_distances <= max_deviation_km)
+    deviation = start_distances + end_distances
+    if total_route_distance > 0:
+        overlap = np.maximum(0, 100 - (deviation / total_route_distance * 100))
+    else:
+        overlap = np.full(len(trips), 100.0)
+
+    matched = np.flatnonzero(mask)
+    ranked = matched[np.argsort(-overlap[matched], kind='stable')]
+    return [(trips[index], float(overlap[index])) for index in ranked]
+
+
+def _degrees(value):
+    return Decimal(str(round(value, 7)))
+
+
+def bounding_box_q(lat_field, lon_field, latitude, longitude, radius_km):
+    """
+    Q object keeping rows whose coordinate lies in the box around a point
+    A box crossing the antimeridian is split into two longitude ranges
+    """
+    latitude = float(latitude)
+    longitude = float(longitude)
+    radius_km = radius_km * BOUNDING_BOX_SLACK
+    lat_delta = radius_km / MIN_KM_PER_DEGREE_LAT
+    cos_lat = max(math.cos(math.radians(min(abs(latitude) + lat_delta, 89.9))), 0.01)
+    lon_delta = radius_km / (MIN_KM_PER_DEGREE_LAT * cos_lat)
+    query = Q(**{f'{lat_field}__range': (_degrees(latitude - lat_delta), _degrees(latitude + lat_delta))})
+
+    west, east = longitude - lon_delta, longitude + lon_delta
+    if east - west >= 360:
+        return query
+    if west < -180:
+        ranges = [(west + 360, 180), (-180, east)]
+    elif east > 180:
+        ranges = [(west, 180), (-180, east - 360)]
+    else:
+        ranges = [(west, east)]
+    lon_query = Q()
+    for low, high in ranges:
+        lon_query |= Q(**{f'{lon_field}__range': (_degrees(low), _degrees(high))})
+    return query & lon_query
+
+
+def departure_window(search_params):
+    """
+    Departure window requested by a search
+    Returns tuple: (earliest, latest), both None if no departure time was given
+    """
+    departure_time = search_params.get('departure_time')
+    if not departure_time:
+        return None, None
+    tolerance = timedelta(minutes=search_params.get('time_tolerance_minutes', DEFAULT_TIME_TOLERANCE_MINUTES))
+    return departure_time - tolerance, departure_time + tolerance
+
+
+def build_trip_filters(search_params, user):
+    """
+    Filter stage of the matching pipeline
+    Compiles every hard constraint into ORM predicates so trips that can
+    never match are excluded by the database:
+    - Scheduled, future trips only
     - Organization
     - Gender preference
-    - Route overlap
     - Available seats
-    - Departure time
+    - Start/end within the search radius (geohash cells + bounding box), or
+      in corridor mode a route crossing the cells around both rider points
+    - Departure date, and departure time window (range scan on the
+      status/departure_time index)
     """
-    matched_trips = []
-    
+    max_distance = float(search_params.get('max_distance_km', 5.0))
+    seats_needed = max(search_params.get('seats_needed', 1), 1)
+
+    filters = Q(
+        status='scheduled',
+        departure_time__gte=timezone.now(),
+        driver__organization=user.organization,
+        # Matches the partial index condition on Trip
+        available_seats__gt=0,
+        available_seats__gte=seats_needed,
+    )
+
+    if user.gender:
+        filters &= Q(gender_preference='any') | Q(gender_preference__iexact=user.gender)
+
+    if search_params.get('match_mode') == MATCH_MODE_CORRIDOR:
+        filters &= corridor_q(search_params)
+    else:
+        filters &= trip_radius_q(search_params)
+        filters &= bounding_box_q(
+            'start_latitude', 'start_longitude',
+            search_params.get('start_latitude'), search_params.get('start_longitude'),
+            max_distance
+        )
+        filters &= bounding_box_q(
+            'end_latitude', 'end_longitude',
+            search_params.get('end_latitude'), search_params.get('end_longitude'),
+            max_distance
+        )
+
+    departure_date = search_params.get('departure_date')
+    if departure_date:
+        filters &= Q(departure_time__date=departure_date)
+
+    earliest, latest = departure_window(search_params)
+    if earliest is not None:
+        filters &= Q(departure_time__range=(earliest, latest))
+
+    return filters
+
+
+def trip_passes_filters(trip, search_params, user):
+    """In-memory equivalent of build_trip_filters' organization/gender/seat/time checks"""
+    if trip.driver.organization != user.organization:
+        return False
+
+    earliest, latest = departure_window(search_params)
+    if earliest is not None and not earliest <= trip.departure_time <= latest:
+        return False
+
+    if trip.gender_preference != 'any':
+        if user.gender and trip.gender_preference.lower() != user.gender.lower():
+            return False
+
+    return trip.available_seats >= search_params.get('seats_needed', 1)
+
+
+def blend_time_scores(scored, departure_time, tolerance_minutes):
+    """
+    Blend departure-time proximity into route overlap scores
+    A trip leaving exactly at departure_time scores 100 on time, falling
+    linearly to 0 at the tolerance edge. Returns (trip, score) re-ranked.
+    """
+    if not scored:
+        return scored
+
+    overlap = np.array([score for _, score in scored], dtype=float)
+    deviation_minutes = np.array(
+        [abs((trip_field(trip, 'departure_time') - departure_time).total_seconds()) / 60 for trip, _ in scored],
+        dtype=float
+    )
+    if tolerance_minutes > 0:
+        time_score = np.clip(100 * (1 - deviation_minutes / tolerance_minutes), 0, 100)
+    else:
+        time_score = np.where(deviation_minutes == 0, 100.0, 0.0)
+
+    blended = (1 - TIME_SCORE_WEIGHT) * overlap + TIME_SCORE_WEIGHT * time_score
+    ranked = np.argsort(-blended, kind='stable')
+    return [(scored[index][0], float(blended[index])) for index in ranked]
+
+
+def _scored_pairs(search_params, trips, mode):
+    """(trip, score) pairs for matching trips, without touching the trips"""
     search_start = {
         'lat': search_params.get('start_latitude'),
         'lon': search_params.get('start_longitude')
@@ -66,44 +301,162 @@ def match_trips(search_params, available_trips, user):
         'lon': search_params.get('end_longitude')
     }
     max_distance = float(search_params.get('max_distance_km', 5.0))
-    seats_needed = search_params.get('seats_needed', 1)
-    
-    for trip in available_trips:
-        # Filter by organization
-        if trip.driver.organization != user.organization:
-            continue
-        
-        # Filter by gender preference
-        if trip.gender_preference != 'any':
-            if user.gender and trip.gender_preference.lower() != user.gender.lower():
-                continue
-        
-        # Filter by available seats
-        if trip.available_seats < seats_needed:
-            continue
-        
-        # Check route overlap
-        trip_start = {
-            'lat': trip.start_latitude,
-            'lon': trip.start_longitude
-        }
-        trip_end = {
-            'lat': trip.end_latitude,
-            'lon': trip.end_longitude
-        }
-        
-        is_match, overlap_pct = check_route_overlap(
-            trip_start, trip_end,
-            search_start, search_end,
-            max_distance
+
+    if search_params.get('match_mode') == MATCH_MODE_CORRIDOR:
+        scored = score_corridor_batch(search_start, search_end, trips, max_distance)
+    else:
+        scored = score_trips_batch(search_start, search_end, trips, max_distance, mode)
+
+    departure_time = search_params.get('departure_time')
+    if departure_time:
+        scored = blend_time_scores(
+            scored,
+            departure_time,
+            search_params.get('time_tolerance_minutes', DEFAULT_TIME_TOLERANCE_MINUTES)
         )
-        
-        if is_match:
-            # Add match score
-            trip.match_score = overlap_pct
-            matched_trips.append(trip)
-    
-    # Sort by match score (highest first)
-    matched_trips.sort(key=lambda x: x.match_score, reverse=True)
-    
-    return matched_trips
+    return scored
+
+
+def _set_match_score(trip, score):
+    if isinstance(trip, dict):
+        trip['match_score'] = score
+    else:
+        trip.match_score = score
+    return trip
+
+
+def score_trips(search_params, trips, mode=DISTANCE_MODE_PRECISE):
+    """
+    Scoring stage of the matching pipeline
+    Sets match_score on each matching trip (or .values() row) and returns
+    them ranked in rank_key order, the same order keyset pages use
+    """
+    scored = sorted(_scored_pairs(search_params, trips, mode), key=lambda item: rank_key(*item))
+    return [_set_match_score(trip, score) for trip, score in scored]
+
+
+def result_rank_id(trip):
+    """
+    Tie-break id of a search result. Occurrences of recurring trips that are
+    not materialized yet (id None) use their negated template id.
+    """
+    trip_id = trip_field(trip, 'id')
+    return trip_id if trip_id is not None else -trip_field(trip, 'recurring_trip')
+
+
+def rank_key(trip, score):
+    """Total order of search results: highest score first, then lowest id"""
+    return (-score, result_rank_id(trip))
+
+
+def iter_ranked_matches(search_params, candidates, mode=DISTANCE_MODE_PRECISE, after=None):
+    """
+    Yield matching trips with match_score set, in rank_key order, scoring lazily
+
+    Args:
+        after: optional (score, trip_id) cursor; only results ranked after it
+            are yielded
+
+    In precise endpoint mode every candidate first gets a cheap vectorized
+    haversine score, an upper bound on its precise score within
+    PRECISE_SCORE_MARGIN. Candidates are then scored precisely in bound
+    order, RANKING_CHUNK_SIZE at a time, and a result is yielded as soon as
+    no unscored candidate can outrank it. Other modes score everything in
+    one vectorized pass and pop results off a heap.
+    """
+    candidates = list(candidates)
+    after_key = rank_key({'id': after[1]}, after[0]) if after else None
+    heap = []
+
+    def push(scored):
+        for trip, score in scored:
+            key = rank_key(trip, score)
+            if after_key is None or key > after_key:
+                heapq.heappush(heap, (key, id(trip), trip))
+
+    precise_endpoints = (
+        mode == DISTANCE_MODE_PRECISE
+        and search_params.get('match_mode') != MATCH_MODE_CORRIDOR
+    )
+    if not precise_endpoints:
+        push(_scored_pairs(search_params, candidates, mode))
+        while heap:
+            key, _, trip = heapq.heappop(heap)
+            yield _set_match_score(trip, -key[0])
+        return
+
+    relaxed_params = {
+        **search_params,
+        'max_distance_km': float(search_params.get('max_distance_km', 5.0)) * PRECISE_RADIUS_SLACK
+    }
+    bounds = sorted(
+        (
+            (score + PRECISE_SCORE_MARGIN, trip)
+            for trip, score in _scored_pairs(relaxed_params, candidates, DISTANCE_MODE_FAST)
+        ),
+        key=lambda item: rank_key(item[1], item[0])
+    )
+
+    position = 0
+    while position < len(bounds) or heap:
+        next_bound = bounds[position][0] if position < len(bounds) else None
+        while heap and (next_bound is None or -heap[0][0][0] > next_bound):
+            key, _, trip = heapq.heappop(heap)
+            yield _set_match_score(trip, -key[0])
+        if next_bound is None:
+            break
+        # Trips certain to rank before the cursor need no precise score
+        chunk = [
+            trip for bound, trip in bounds[position:position + RANKING_CHUNK_SIZE]
+            if after is None or bound - 2 * PRECISE_SCORE_MARGIN <= after[0]
+        ]
+        position += RANKING_CHUNK_SIZE
+        push(_scored_pairs(search_params, chunk, mode))
+
+
+def top_matches(search_params, candidates, limit, mode=DISTANCE_MODE_PRECISE, after=None):
+    """
+    The best `limit` matches ranked after the optional (score, trip_id)
+    cursor, computed with a bounded heap rather than a full sort
+    """
+    if mode == DISTANCE_MODE_PRECISE and search_params.get('match_mode') != MATCH_MODE_CORRIDOR:
+        ranked = iter_ranked_matches(search_params, candidates, mode, after)
+        return [trip for trip, _ in zip(ranked, range(limit))]
+
+    after_key = rank_key({'id': after[1]}, after[0]) if after else None
+    scored = (
+        (rank_key(trip, score), id(trip), trip)
+        for trip, score in _scored_pairs(search_params, list(candidates), mode)
+    )
+    best = heapq.nsmallest(
+        limit,
+        (item for item in scored if after_key is None or item[0] > after_key)
+    )
+    return [_set_match_score(trip, -key[0]) for key, _, trip in best]
+
+
+def filter_candidates(search_params, available_trips, user):
+    """
+    Filter stage of match_trips
+    Querysets are narrowed in SQL; a TripTimeIndex is sliced to the
+    organization's departure window first; other iterables are filtered in
+    Python
+    """
+    if isinstance(available_trips, QuerySet):
+        return available_trips.filter(build_trip_filters(search_params, user))
+    if isinstance(available_trips, TripTimeIndex):
+        earliest, latest = departure_window(search_params)
+        available_trips = available_trips.window(user.organization_id, earliest, latest)
+    return [
+        trip for trip in available_trips
+        if trip_passes_filters(trip, search_params, user)
+    ]
+
+
+def match_trips(search_params, available_trips, user, mode=DISTANCE_MODE_PRECISE):
+    """
+    Main matching algorithm
+    Candidates from the filter stage go through the scoring stage
+    """
+    candidates = filter_candidates(search_params, available_trips, user)
+    return score_trips(search_params, candidates, mode)
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:34
+
+from django.db import migrations, models
+
+
+def populate_geohashes(apps, schema_editor):
+    from ecopool_apps.trips.spatial_utils import encode_geohash
+
+    Trip = apps.get_model('trips', 'Trip')
+    trips = list(Trip.objects.only('id', 'start_latitude', 'start_longitude', 'end_latitude', 'end_longitude'))
+    for trip in trips:
+        trip.start_geohash = encode_geohash(trip.start_latitude, trip.start_longitude)
+        trip.end_geohash = encode_geohash(trip.end_latitude, trip.end_longitude)
+    Trip.objects.bulk_update(trips, ['start_geohash', 'end_geohash'], batch_size=500)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0002_trip_transport_mode_trip_trip_type_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='end_geohash',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=12),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='start_geohash',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=12),
+        ),
+        migrations.RunPython(populate_geohashes, migrations.RunPython.noop),
+    ]
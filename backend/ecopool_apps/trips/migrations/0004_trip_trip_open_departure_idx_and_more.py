@@ -0,0 +1,28 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0002_alter_user_organization'),
+        ('trips', '0003_trip_geohash_cells'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(condition=models.Q(('available_seats__gt', 0)), fields=['status', 'departure_time'], name='trip_open_departure_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['driver', 'status'], name='trip_driver_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='triprequest',
+            index=models.Index(fields=['trip', 'passenger', 'status'], name='triprequest_trip_pass_idx'),
+        ),
+    ]
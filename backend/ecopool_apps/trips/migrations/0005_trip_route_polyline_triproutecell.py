@@ -0,0 +1,44 @@
+# Generated by Django 5.1.4 on 2026-10-18 07:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_route_cells(apps, schema_editor):
+    from ecopool_apps.trips.corridor_utils import compute_route_cells, trip_route_points
+
+    Trip = apps.get_model('trips', 'Trip')
+    TripRouteCell = apps.get_model('trips', 'TripRouteCell')
+    cells = []
+    for trip in Trip.objects.only('id', 'start_latitude', 'start_longitude', 'end_latitude', 'end_longitude', 'route_polyline'):
+        for cell, (first, last) in compute_route_cells(trip_route_points(trip)).items():
+            cells.append(TripRouteCell(trip_id=trip.id, cell=cell, first_offset_km=first, last_offset_km=last))
+    TripRouteCell.objects.bulk_create(cells, batch_size=500)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0004_trip_trip_open_departure_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='route_polyline',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.CreateModel(
+            name='TripRouteCell',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cell', models.CharField(max_length=12)),
+                ('first_offset_km', models.FloatField()),
+                ('last_offset_km', models.FloatField()),
+                ('trip', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='route_cells', to='trips.trip')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['cell', 'trip'], name='triproutecell_cell_trip_idx')],
+            },
+        ),
+        migrations.RunPython(populate_route_cells, migrations.RunPython.noop),
+    ]
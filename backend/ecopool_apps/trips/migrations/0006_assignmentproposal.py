@@ -0,0 +1,39 @@
+# Generated by Django 5.1.4 on 2026-10-18 08:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0002_alter_user_organization'),
+        ('trips', '0005_trip_route_polyline_triproutecell'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssignmentProposal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('run_id', models.UUIDField(db_index=True)),
+                ('seats', models.IntegerField(default=1)),
+                ('cost', models.FloatField()),
+                ('detour_km', models.FloatField(default=0)),
+                ('time_deviation_minutes', models.FloatField(default=0)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('confirmed', 'Confirmed'), ('rejected', 'Rejected'), ('superseded', 'Superseded')], default='pending', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='assignment_proposals', to='authentication.organization')),
+                ('passenger', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='assignment_proposals', to=settings.AUTH_USER_MODEL)),
+                ('seeking_trip', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='seeker_proposals', to='trips.trip')),
+                ('trip', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='assignment_proposals', to='trips.trip')),
+                ('trip_request', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='assignment_proposals', to='trips.triprequest')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['trip', 'status'], name='proposal_trip_status_idx'), models.Index(fields=['organization', 'status'], name='proposal_org_status_idx')],
+            },
+        ),
+    ]
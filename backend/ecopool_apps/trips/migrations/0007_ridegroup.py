@@ -0,0 +1,45 @@
+# Generated by Django 5.1.4 on 2026-10-18 08:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0002_alter_user_organization'),
+        ('trips', '0006_assignmentproposal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RideGroup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transport_mode', models.CharField(choices=[('car', 'Car'), ('bike', 'Bike'), ('auto', 'Auto Rickshaw'), ('public', 'Public Transport'), ('any', 'Any Mode')], max_length=20)),
+                ('capacity', models.IntegerField()),
+                ('member_count', models.IntegerField(default=0)),
+                ('start_latitude', models.FloatField()),
+                ('start_longitude', models.FloatField()),
+                ('end_latitude', models.FloatField()),
+                ('end_longitude', models.FloatField()),
+                ('start_geohash', models.CharField(max_length=12)),
+                ('departure_time', models.DateTimeField()),
+                ('gender_preference', models.CharField(choices=[('any', 'Any'), ('male', 'Male Only'), ('female', 'Female Only')], default='any', max_length=10)),
+                ('gender', models.CharField(blank=True, default='', max_length=20)),
+                ('status', models.CharField(choices=[('forming', 'Forming'), ('full', 'Full'), ('dissolved', 'Dissolved')], default='forming', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ride_groups', to='authentication.organization')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='ride_group',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='members', to='trips.ridegroup'),
+        ),
+        migrations.AddIndex(
+            model_name='ridegroup',
+            index=models.Index(condition=models.Q(('status', 'forming')), fields=['start_geohash', 'departure_time'], name='ridegroup_forming_cell_idx'),
+        ),
+    ]
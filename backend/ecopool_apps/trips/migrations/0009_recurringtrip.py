@@ -0,0 +1,62 @@
+# Generated by Django 5.1.4 on 2026-10-18 08:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0002_alter_user_organization'),
+        ('trips', '0008_seathold'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='occurrence_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='RecurringTrip',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trip_type', models.CharField(choices=[('offering', 'Offering Ride'), ('seeking', 'Seeking Ride')], default='offering', max_length=20)),
+                ('transport_mode', models.CharField(choices=[('car', 'Car'), ('bike', 'Bike'), ('auto', 'Auto Rickshaw'), ('public', 'Public Transport'), ('any', 'Any Mode')], default='car', max_length=20)),
+                ('start_location', models.CharField(max_length=255)),
+                ('start_latitude', models.DecimalField(decimal_places=7, max_digits=10)),
+                ('start_longitude', models.DecimalField(decimal_places=7, max_digits=10)),
+                ('end_location', models.CharField(max_length=255)),
+                ('end_latitude', models.DecimalField(decimal_places=7, max_digits=10)),
+                ('end_longitude', models.DecimalField(decimal_places=7, max_digits=10)),
+                ('route_polyline', models.TextField(blank=True, default='')),
+                ('departure_time_of_day', models.TimeField()),
+                ('weekdays', models.PositiveSmallIntegerField(default=31)),
+                ('interval_weeks', models.PositiveSmallIntegerField(default=1)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField(blank=True, null=True)),
+                ('excluded_dates', models.JSONField(blank=True, default=list)),
+                ('available_seats', models.IntegerField()),
+                ('gender_preference', models.CharField(choices=[('any', 'Any'), ('male', 'Male Only'), ('female', 'Female Only')], default='any', max_length=10)),
+                ('price_per_seat', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('is_active', models.BooleanField(default=True)),
+                ('start_geohash', models.CharField(blank=True, db_index=True, default='', editable=False, max_length=12)),
+                ('end_geohash', models.CharField(blank=True, db_index=True, default='', editable=False, max_length=12)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('driver', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recurring_trips', to=settings.AUTH_USER_MODEL)),
+                ('vehicle', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='recurring_trips', to='authentication.vehicle')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='recurring_trip',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='occurrences', to='trips.recurringtrip'),
+        ),
+        migrations.AddConstraint(
+            model_name='trip',
+            constraint=models.UniqueConstraint(condition=models.Q(('recurring_trip__isnull', False)), fields=('recurring_trip', 'occurrence_date'), name='trip_unique_occurrence'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-18 08:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0009_recurringtrip'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='triprequest',
+            index=models.Index(fields=['passenger', 'updated_at'], name='triprequest_pass_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='triprequest',
+            index=models.Index(fields=['updated_at'], name='triprequest_updated_idx'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
-from ecopool_apps.authentication.models import User, Vehicle
+from ecopool_apps.authentication.models import Organization, User, Vehicle
+from .spatial_utils import encode_geohash
 
 
 class Trip(models.Model):
@@ -30,6 +31,9 @@ class Trip(models.Model):
         ('any', 'Any Mode'),
     ]
 
+    # Fields the corridor cells are derived from
+    ROUTE_FIELDS = ('start_latitude', 'start_longitude', 'end_latitude', 'end_longitude', 'route_polyline')
+
     driver = models.ForeignKey(User, on_delete=models.CASCADE, related_name='driver_trips')
     vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE, related_name='trips', null=True, blank=True)
     trip_type = models.CharField(max_length=20, choices=TRIP_TYPE_CHOICES, default='offering')
@@ -45,12 +49,190 @@ class Trip(models.Model):
     gender_preference = models.CharField(max_length=10, choices=GENDER_PREF_CHOICES, default='any')
     price_per_seat = models.DecimalField(max_digits=8, decimal_places=2)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='scheduled')
+    # Spatial index columns, kept in sync with the coordinates on save
+    start_geohash = models.CharField(max_length=12, blank=True, default='', db_index=True, editable=False)
+    end_geohash = models.CharField(max_length=12, blank=True, default='', db_index=True, editable=False)
+    # Encoded polyline of the planned route; empty means a straight start-end line
+    route_polyline = models.TextField(blank=True, default='')
+    # Set on occurrences materialized from a recurring trip template
+    recurring_trip = models.ForeignKey('RecurringTrip', on_delete=models.SET_NULL, null=True, blank=True, related_name='occurrences')
+    occurrence_date = models.DateField(null=True, blank=True)
+    # Ride-mates group of a 'seeking' trip, maintained by grouping.RideGroupService
+    ride_group = models.ForeignKey('RideGroup', on_delete=models.SET_NULL, null=True, blank=True, related_name='members')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Search candidates: open trips by departure window
+            models.Index(
+                fields=['status', 'departure_time'],
+                name='trip_open_departure_idx',
+                condition=models.Q(available_seats__gt=0),
+            ),
+            models.Index(fields=['driver', 'status'], name='trip_driver_status_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recurring_trip', 'occurrence_date'],
+                name='trip_unique_occurrence',
+                condition=models.Q(recurring_trip__isnull=False),
+            ),
+        ]
+
     def __str__(self):
         return f"{self.start_location} to {self.end_location} - {self.driver.username}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if set(cls.ROUTE_FIELDS).issubset(field_names):
+            instance._route_signature = instance._get_route_signature()
+        if 'departure_time' in field_names:
+            instance._saved_departure_time = instance.departure_time
+        return instance
+
+    def _get_route_signature(self):
+        return tuple(str(getattr(self, field)) for field in self.ROUTE_FIELDS)
+
+    def save(self, *args, **kwargs):
+        """Refresh geohash cells from the start/end coordinates and the route corridor cells"""
+        self.start_geohash = encode_geohash(self.start_latitude, self.start_longitude)
+        self.end_geohash = encode_geohash(self.end_latitude, self.end_longitude)
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if update_fields & {'start_latitude', 'start_longitude'}:
+                update_fields.add('start_geohash')
+            if update_fields & {'end_latitude', 'end_longitude'}:
+                update_fields.add('end_geohash')
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+        self._saved_departure_time = self.departure_time
+
+        if update_fields is not None and not update_fields & set(self.ROUTE_FIELDS):
+            return
+        signature = self._get_route_signature()
+        if signature != getattr(self, '_route_signature', None):
+            from .corridor_utils import rebuild_route_cells
+            rebuild_route_cells(self)
+            self._route_signature = signature
+
+
+class RecurringTrip(models.Model):
+    """
+    Template for a trip repeated on a weekly schedule (like an RRULE with
+    FREQ=WEEKLY;INTERVAL=interval_weeks;BYDAY=weekdays). Occurrences become
+    Trip rows only inside RECURRING_TRIP_HORIZON_DAYS or when booked; see
+    recurrence.py.
+    """
+    # Bit i of weekdays is set when the trip runs on weekday i (Monday = 0)
+    WEEKDAY_NAMES = ['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU']
+
+    driver = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recurring_trips')
+    vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE, related_name='recurring_trips', null=True, blank=True)
+    trip_type = models.CharField(max_length=20, choices=Trip.TRIP_TYPE_CHOICES, default='offering')
+    transport_mode = models.CharField(max_length=20, choices=Trip.TRANSPORT_MODE_CHOICES, default='car')
+    start_location = models.CharField(max_length=255)
+    start_latitude = models.DecimalField(max_digits=10, decimal_places=7)
+    start_longitude = models.DecimalField(max_digits=10, decimal_places=7)
+    end_location = models.CharField(max_length=255)
+    end_latitude = models.DecimalField(max_digits=10, decimal_places=7)
+    end_longitude = models.DecimalField(max_digits=10, decimal_places=7)
+    route_polyline = models.TextField(blank=True, default='')
+    # Local (TIME_ZONE) departure time of every occurrence
+    departure_time_of_day = models.TimeField()
+    weekdays = models.PositiveSmallIntegerField(default=0b0011111)
+    interval_weeks = models.PositiveSmallIntegerField(default=1)
+    start_date = models.DateField()
+    end_date = models.DateField(null=True, blank=True)
+    # ISO dates on which the trip does not run
+    excluded_dates = models.JSONField(default=list, blank=True)
+    available_seats = models.IntegerField()
+    gender_preference = models.CharField(max_length=10, choices=Trip.GENDER_PREF_CHOICES, default='any')
+    price_per_seat = models.DecimalField(max_digits=8, decimal_places=2)
+    is_active = models.BooleanField(default=True)
+    start_geohash = models.CharField(max_length=12, blank=True, default='', db_index=True, editable=False)
+    end_geohash = models.CharField(max_length=12, blank=True, default='', db_index=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        days = ','.join(name for index, name in enumerate(self.WEEKDAY_NAMES) if self.weekdays & (1 << index))
+        return f"{self.start_location} to {self.end_location} ({days}) - {self.driver.username}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Same snapshot as Trip, so search invalidation also covers the old route
+        instance = super().from_db(db, field_names, values)
+        if set(Trip.ROUTE_FIELDS).issubset(field_names):
+            instance._route_signature = tuple(str(getattr(instance, field)) for field in Trip.ROUTE_FIELDS)
+        return instance
+
+    def save(self, *args, **kwargs):
+        self.start_geohash = encode_geohash(self.start_latitude, self.start_longitude)
+        self.end_geohash = encode_geohash(self.end_latitude, self.end_longitude)
+        super().save(*args, **kwargs)
+        self._route_signature = tuple(str(getattr(self, field)) for field in Trip.ROUTE_FIELDS)
+
+
+class RideGroup(models.Model):
+    """Group of 'seeking' trips sharing an auto rickshaw or public transport"""
+    STATUS_CHOICES = [
+        ('forming', 'Forming'),
+        ('full', 'Full'),
+        ('dissolved', 'Dissolved'),
+    ]
+
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='ride_groups')
+    transport_mode = models.CharField(max_length=20, choices=Trip.TRANSPORT_MODE_CHOICES)
+    capacity = models.IntegerField()
+    member_count = models.IntegerField(default=0)
+    # Centroid of the members' origins/destinations and mean departure time
+    start_latitude = models.FloatField()
+    start_longitude = models.FloatField()
+    end_latitude = models.FloatField()
+    end_longitude = models.FloatField()
+    start_geohash = models.CharField(max_length=12)
+    departure_time = models.DateTimeField()
+    # Strictest member preference, and the members' gender when they all share one
+    gender_preference = models.CharField(max_length=10, choices=Trip.GENDER_PREF_CHOICES, default='any')
+    gender = models.CharField(max_length=20, blank=True, default='')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='forming')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Incremental grouping: open groups by origin cell and departure window
+            models.Index(
+                fields=['start_geohash', 'departure_time'],
+                name='ridegroup_forming_cell_idx',
+                condition=models.Q(status='forming'),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.transport_mode} group #{self.id} ({self.member_count}/{self.capacity})"
+
+
+class TripRouteCell(models.Model):
+    """Grid cell crossed by a trip's route, used for corridor matching"""
+    trip = models.ForeignKey(Trip, on_delete=models.CASCADE, related_name='route_cells')
+    cell = models.CharField(max_length=12)
+    # Distance along the route at which the cell is first/last visited
+    first_offset_km = models.FloatField()
+    last_offset_km = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['cell', 'trip'], name='triproutecell_cell_trip_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.cell} - trip #{self.trip_id}"
+
 
 class TripRequest(models.Model):
     """Trip request from passengers"""
@@ -69,5 +251,73 @@ class TripRequest(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['trip', 'passenger', 'status'], name='triprequest_trip_pass_idx'),
+            # Delta sync watermark
+            models.Index(fields=['passenger', 'updated_at'], name='triprequest_pass_updated_idx'),
+            models.Index(fields=['updated_at'], name='triprequest_updated_idx'),
+        ]
+
     def __str__(self):
         return f"{self.passenger.username} - {self.trip}"
+
+
+class SeatHold(models.Model):
+    """Seats set aside for a pending trip request until the driver responds or it expires"""
+    STATUS_CHOICES = [
+        ('active', 'Active'),
+        ('consumed', 'Consumed'),
+        ('released', 'Released'),
+        ('expired', 'Expired'),
+    ]
+
+    trip = models.ForeignKey(Trip, on_delete=models.CASCADE, related_name='seat_holds')
+    trip_request = models.OneToOneField(TripRequest, on_delete=models.CASCADE, related_name='seat_hold')
+    seats = models.IntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['expires_at'], name='seathold_active_expiry_idx', condition=models.Q(status='active')),
+        ]
+
+    def __str__(self):
+        return f"{self.seats} seat(s) on trip #{self.trip_id} ({self.status})"
+
+
+class AssignmentProposal(models.Model):
+    """Seat assignment proposed by a batch matching run, awaiting the driver"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('confirmed', 'Confirmed'),
+        ('rejected', 'Rejected'),
+        ('superseded', 'Superseded'),
+    ]
+
+    run_id = models.UUIDField(db_index=True)
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='assignment_proposals')
+    trip = models.ForeignKey(Trip, on_delete=models.CASCADE, related_name='assignment_proposals')
+    passenger = models.ForeignKey(User, on_delete=models.CASCADE, related_name='assignment_proposals')
+    # Exactly one of these is set: the pending request or the seeking trip being placed
+    trip_request = models.ForeignKey(TripRequest, on_delete=models.CASCADE, null=True, blank=True, related_name='assignment_proposals')
+    seeking_trip = models.ForeignKey(Trip, on_delete=models.CASCADE, null=True, blank=True, related_name='seeker_proposals')
+    seats = models.IntegerField(default=1)
+    cost = models.FloatField()
+    detour_km = models.FloatField(default=0)
+    time_deviation_minutes = models.FloatField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['trip', 'status'], name='proposal_trip_status_idx'),
+            models.Index(fields=['organization', 'status'], name='proposal_org_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.passenger.username} -> trip #{self.trip_id} ({self.status})"
@@ -0,0 +1,24 @@
+"""
+Opaque keyset cursors for ranked trip search results
+A cursor encodes the (match_score, trip id) of the last result on a page.
+"""
+import base64
+import json
+
+
+def encode_cursor(score, trip_id):
+    payload = json.dumps([score, trip_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Returns tuple: (score, trip_id)
+    Raises ValueError if the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        score, trip_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return float(score), int(trip_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as exc:
+        raise ValueError('Invalid cursor') from exc
@@ -0,0 +1,235 @@
+"""
+Recurring trip occurrences
+
+A RecurringTrip is a weekly schedule; its occurrences are not stored ahead
+of time. Occurrences inside RECURRING_TRIP_HORIZON_DAYS are materialized
+as ordinary Trip rows (materialize_recurring_trips), and later ones only
+when someone books them. Search reads the templates directly for dates
+that have no materialized occurrence and returns them as rows with
+id None plus recurring_trip/occurrence_date, which a trip request can name
+instead of a trip id.
+"""
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .matching_utils import bounding_box_q, departure_window
+from .models import Trip, RecurringTrip
+from .search_cache import search_cache, trip_cells
+from .spatial_utils import trip_field, trip_radius_q
+
+
+# Trip fields copied from the template onto each occurrence
+OCCURRENCE_FIELDS = (
+    'driver_id', 'vehicle_id', 'trip_type', 'transport_mode',
+    'start_location', 'start_latitude', 'start_longitude',
+    'end_location', 'end_latitude', 'end_longitude', 'route_polyline',
+    'available_seats', 'gender_preference', 'price_per_seat',
+)
+SCHEDULE_FIELDS = (
+    'departure_time_of_day', 'weekdays', 'interval_weeks', 'start_date', 'end_date', 'excluded_dates',
+)
+# Search result fields that only exist on occurrences
+OCCURRENCE_ONLY_FIELDS = {'id', 'status', 'departure_time', 'ride_group', 'recurring_trip', 'occurrence_date'}
+
+
+def horizon_days():
+    return getattr(settings, 'RECURRING_TRIP_HORIZON_DAYS', 2)
+
+
+def runs_on(template, day):
+    """Whether the schedule (instance or .values() row) has an occurrence on a date"""
+    start_date = trip_field(template, 'start_date')
+    end_date = trip_field(template, 'end_date')
+    if day < start_date or (end_date and day > end_date):
+        return False
+    if not trip_field(template, 'weekdays') & (1 << day.weekday()):
+        return False
+    # Weeks counted Monday to Monday from the week containing start_date
+    weeks = ((day - start_date).days + start_date.weekday()) // 7
+    if weeks % max(trip_field(template, 'interval_weeks'), 1):
+        return False
+    return day.isoformat() not in trip_field(template, 'excluded_dates')
+
+
+def occurrence_dates(template, first_day, last_day):
+    """Dates of occurrences within [first_day, last_day], generated one day at a time"""
+    end_date = trip_field(template, 'end_date')
+    day = max(first_day, trip_field(template, 'start_date'))
+    if end_date:
+        last_day = min(last_day, end_date)
+    while day <= last_day:
+        if runs_on(template, day):
+            yield day
+        day += timedelta(days=1)
+
+
+def occurrence_datetime(template, day):
+    return timezone.make_aware(datetime.combine(day, trip_field(template, 'departure_time_of_day')))
+
+
+def materialize_occurrence(template, day):
+    """Trip row of one occurrence, created on first use"""
+    existing = Trip.objects.filter(recurring_trip=template, occurrence_date=day).first()
+    if existing:
+        return existing
+    trip = Trip(
+        recurring_trip=template,
+        occurrence_date=day,
+        departure_time=occurrence_datetime(template, day),
+        **{field: getattr(template, field) for field in OCCURRENCE_FIELDS}
+    )
+    try:
+        with transaction.atomic():
+            trip.save()
+    except IntegrityError:
+        # Materialized concurrently
+        return Trip.objects.get(recurring_trip=template, occurrence_date=day)
+    return trip
+
+
+def materialize_horizon(templates=None):
+    """
+    Create the missing occurrences of active templates up to the horizon
+    Returns the number of trips created
+    """
+    now = timezone.now()
+    today = timezone.localdate(now)
+    last_day = today + timedelta(days=horizon_days())
+    if templates is None:
+        templates = RecurringTrip.objects.filter(
+            Q(end_date__isnull=True) | Q(end_date__gte=today),
+            is_active=True,
+            start_date__lte=last_day,
+        )
+
+    created = 0
+    for template in templates:
+        if not template.is_active:
+            continue
+        existing = set(Trip.objects.filter(
+            recurring_trip=template, occurrence_date__range=(today, last_day)
+        ).values_list('occurrence_date', flat=True))
+        for day in occurrence_dates(template, today, last_day):
+            if day not in existing and occurrence_datetime(template, day) >= now:
+                materialize_occurrence(template, day)
+                created += 1
+    return created
+
+
+def drop_unbooked_occurrences(template):
+    """Delete future occurrences nobody has requested, e.g. before the schedule changes"""
+    Trip.objects.filter(
+        recurring_trip=template,
+        status='scheduled',
+        departure_time__gte=timezone.now(),
+    ).exclude(requests__status__in=['pending', 'accepted']).delete()
+
+
+def refresh_occurrences(template):
+    """Re-create unbooked occurrences after a template change"""
+    with transaction.atomic():
+        drop_unbooked_occurrences(template)
+        if template.is_active:
+            materialize_horizon([template])
+
+
+def search_occurrences(search_params, user, fields):
+    """
+    Unmaterialized occurrences of recurring trips matching a search
+    Templates are filtered like trips (organization, gender, seats, start/end
+    radius; corridor searches also match templates by endpoints). Each
+    template contributes at most one occurrence: the one closest to the
+    requested departure time, or the next one when no time is given.
+    Returns rows shaped like Trip .values(*fields) rows.
+    """
+    now = timezone.now()
+    max_distance = float(search_params.get('max_distance_km', 5.0))
+    seats_needed = max(search_params.get('seats_needed', 1), 1)
+
+    earliest, latest = departure_window(search_params)
+    departure_date = search_params.get('departure_date')
+    if departure_date:
+        first_day = last_day = departure_date
+    elif earliest is not None:
+        first_day, last_day = timezone.localdate(earliest), timezone.localdate(latest)
+    else:
+        first_day = timezone.localdate(now)
+        last_day = first_day + timedelta(days=getattr(settings, 'RECURRING_TRIP_LOOKAHEAD_DAYS', 60))
+    if last_day < timezone.localdate(now):
+        return []
+
+    filters = Q(
+        Q(end_date__isnull=True) | Q(end_date__gte=first_day),
+        is_active=True,
+        start_date__lte=last_day,
+        driver__organization=user.organization,
+        available_seats__gte=seats_needed,
+    )
+    if user.gender:
+        filters &= Q(gender_preference='any') | Q(gender_preference__iexact=user.gender)
+    filters &= trip_radius_q(search_params)
+    filters &= bounding_box_q(
+        'start_latitude', 'start_longitude',
+        search_params.get('start_latitude'), search_params.get('start_longitude'), max_distance
+    )
+    filters &= bounding_box_q(
+        'end_latitude', 'end_longitude',
+        search_params.get('end_latitude'), search_params.get('end_longitude'), max_distance
+    )
+
+    template_fields = [field for field in fields if field not in OCCURRENCE_ONLY_FIELDS]
+    templates = RecurringTrip.objects.filter(filters).values('id', *template_fields, *SCHEDULE_FIELDS)
+
+    target = search_params.get('departure_time')
+    chosen = {}
+    for template in templates:
+        best = None
+        for day in occurrence_dates(template, first_day, last_day):
+            departure = occurrence_datetime(template, day)
+            if departure < now or (earliest is not None and not earliest <= departure <= latest):
+                continue
+            if target is None:
+                best = (day, departure)
+                break
+            if best is None or abs(departure - target) < abs(best[1] - target):
+                best = (day, departure)
+        if best:
+            chosen[template['id']] = (template, best)
+    if not chosen:
+        return []
+
+    # Occurrences that already exist are found by the regular trip search
+    materialized = set(Trip.objects.filter(
+        recurring_trip_id__in=chosen.keys(),
+        occurrence_date__in={day for _, (day, _) in chosen.values()},
+    ).values_list('recurring_trip_id', 'occurrence_date'))
+
+    rows = []
+    for template_id, (template, (day, departure)) in chosen.items():
+        if (template_id, day) in materialized:
+            continue
+        row = {field: template[field] for field in template_fields}
+        row.update(
+            id=None,
+            status='scheduled',
+            departure_time=departure,
+            ride_group=None,
+            recurring_trip=template_id,
+            occurrence_date=day,
+        )
+        rows.append(row)
+    return rows
+
+
+@receiver(post_save, sender=RecurringTrip)
+@receiver(post_delete, sender=RecurringTrip)
+def invalidate_template_searches(sender, instance, **kwargs):
+    """Searches can return a template's occurrences, so drop them when it changes"""
+    cells = trip_cells(instance)
+    transaction.on_commit(lambda: search_cache.invalidate_cells(cells))
@@ -0,0 +1,229 @@
+"""
+Result cache for trip search
+
+Search responses are cached under a key built from the organization, the
+rider's start/end cells (TRIP_SEARCH_CACHE_KEY_PRECISION), the current
+TRIP_SEARCH_CACHE_BUCKET_MINUTES time bucket and the remaining search
+parameters. Every coarse corridor cell has a version counter and the key
+embeds the versions of the cells a search can reach; saving, cancelling or
+deleting a trip bumps the counters of the cells its route crosses, so only
+searches that could have returned that trip miss afterwards.
+
+The 'django' backend keeps entries and versions in a Django cache, which
+must be shared (Redis, Memcached) when there are several worker processes.
+The local backend keeps them in an in-process LRU and is only correct with
+a single worker. The cache is off unless TRIP_SEARCH_CACHE_ENABLED is set.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .corridor_utils import CORRIDOR_CELL_PRECISION, compute_route_cells, trip_route_points
+from .models import Trip
+from .spatial_utils import encode_geohash, geohash_cells_around
+
+
+class LocalSearchCacheBackend:
+    """In-process LRU of search results plus cell version counters"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_versions(self, cells):
+        with self._lock:
+            return [self._versions.get(cell, 0) for cell in cells]
+
+    def bump_versions(self, cells):
+        with self._lock:
+            for cell in cells:
+                self._versions[cell] = self._versions.get(cell, 0) + 1
+
+    def size(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+
+class DjangoSearchCacheBackend:
+    """Search results and cell versions stored in a shared Django cache"""
+
+    ENTRY_PREFIX = 'tripsearch:entry:'
+    VERSION_PREFIX = 'tripsearch:version:'
+
+    def __init__(self, alias='default'):
+        self.cache = caches[alias]
+
+    def get(self, key):
+        return self.cache.get(self.ENTRY_PREFIX + key)
+
+    def set(self, key, value, timeout):
+        self.cache.set(self.ENTRY_PREFIX + key, value, timeout)
+
+    def get_versions(self, cells):
+        keys = [self.VERSION_PREFIX + cell for cell in cells]
+        stored = self.cache.get_many(keys)
+        return [stored.get(key, 0) for key in keys]
+
+    def bump_versions(self, cells):
+        for cell in cells:
+            key = self.VERSION_PREFIX + cell
+            # add() is a no-op if the counter exists; incr() is atomic on
+            # shared backends such as Redis and Memcached
+            self.cache.add(key, 0, None)
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                self.cache.set(key, 1, None)
+
+    def size(self):
+        return None
+
+    def clear(self):
+        self.cache.clear()
+
+
+class SearchResultCache:
+    """Trip search result cache with per-cell invalidation and hit/miss counters"""
+
+    def __init__(self, backend, bucket_minutes=15, key_precision=7, enabled=True):
+        self.backend = backend
+        self.bucket_minutes = bucket_minutes
+        self.key_precision = key_precision
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def key_for(self, search_params, user, mode, variant=''):
+        """
+        Cache key of a search. Must be computed before the database is read
+        so a concurrent invalidation can never be hidden by a late set().
+        variant distinguishes representations of the same results
+        """
+        start = (search_params['start_latitude'], search_params['start_longitude'])
+        end = (search_params['end_latitude'], search_params['end_longitude'])
+        radius_km = float(search_params.get('max_distance_km', 5.0))
+
+        version_cells = sorted(
+            set(geohash_cells_around(*start, radius_km, CORRIDOR_CELL_PRECISION))
+            | set(geohash_cells_around(*end, radius_km, CORRIDOR_CELL_PRECISION))
+        )
+        versions = self.backend.get_versions(version_cells)
+
+        departure_time = search_params.get('departure_time')
+        bucket = int(timezone.now().timestamp() // (self.bucket_minutes * 60))
+        parts = [
+            user.organization_id,
+            (user.gender or '').lower(),
+            encode_geohash(*start, self.key_precision),
+            encode_geohash(*end, self.key_precision),
+            bucket,
+            departure_time.replace(second=0, microsecond=0).isoformat() if departure_time else '',
+            search_params.get('time_tolerance_minutes', ''),
+            search_params.get('departure_date') or '',
+            search_params.get('seats_needed', 1),
+            radius_km,
+            search_params.get('match_mode', ''),
+            mode,
+            variant,
+            ','.join(f'{cell}:{version}' for cell, version in zip(version_cells, versions)),
+        ]
+        return hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value):
+        if self.enabled:
+            self.backend.set(key, value, self.bucket_minutes * 60)
+
+    def invalidate_cells(self, cells):
+        if cells:
+            self.backend.bump_versions(sorted(cells))
+
+    def invalidate_trips(self, trips):
+        """Invalidate every search that could return one of the trips"""
+        cells = set()
+        for trip in trips:
+            cells |= trip_cells(trip)
+        self.invalidate_cells(cells)
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': self.backend.size()}
+
+    def clear(self):
+        self.backend.clear()
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+
+def trip_cells(trip):
+    """Coarse cells crossed by a trip's route, including its previously saved route"""
+    cells = set(compute_route_cells(trip_route_points(trip)))
+    previous = getattr(trip, '_route_signature', None)
+    if previous is not None:
+        previous_trip = SimpleNamespace(**dict(zip(Trip.ROUTE_FIELDS, previous)))
+        cells |= set(compute_route_cells(trip_route_points(previous_trip)))
+    return cells
+
+
+def _build_search_cache():
+    if getattr(settings, 'TRIP_SEARCH_CACHE_BACKEND', 'django') == 'django':
+        backend = DjangoSearchCacheBackend(getattr(settings, 'TRIP_SEARCH_CACHE_ALIAS', 'default'))
+    else:
+        backend = LocalSearchCacheBackend(getattr(settings, 'TRIP_SEARCH_CACHE_MAX_ENTRIES', 1024))
+    return SearchResultCache(
+        backend,
+        bucket_minutes=getattr(settings, 'TRIP_SEARCH_CACHE_BUCKET_MINUTES', 15),
+        key_precision=getattr(settings, 'TRIP_SEARCH_CACHE_KEY_PRECISION', 7),
+        enabled=getattr(settings, 'TRIP_SEARCH_CACHE_ENABLED', False),
+    )
+
+
+search_cache = _build_search_cache()
+
+
+@receiver(post_save, sender=Trip)
+@receiver(post_delete, sender=Trip)
+def invalidate_trip_searches(sender, instance, **kwargs):
+    """Drop cached searches around a trip once its change is committed"""
+    cells = trip_cells(instance)
+    transaction.on_commit(lambda: search_cache.invalidate_cells(cells))
@@ -1,5 +1,8 @@
+from django.core.files.storage import default_storage
 from rest_framework import serializers
-from .models import Trip, TripRequest
+from .models import Trip, TripRequest, AssignmentProposal, RideGroup, RecurringTrip
+from .corridor_utils import synthesize_route_polyline
+from .spatial_utils import decode_polyline
 from ecopool_apps.authentication.serializers import UserSerializer, VehicleSerializer
 
 
@@ -11,28 +14,150 @@ class TripSerializer(serializers.ModelSerializer):
         model = Trip
         fields = [
             'id', 'driver', 'driver_details', 'vehicle', 'vehicle_details',
-            'start_location', 'start_latitude', 'start_longitude',
+            'trip_type', 'transport_mode', 'ride_group', 'start_location', 'start_latitude', 'start_longitude',
             'end_location', 'end_latitude', 'end_longitude',
             'departure_time', 'available_seats', 'gender_preference',
-            'price_per_seat', 'status', 'created_at', 'updated_at'
+            'price_per_seat', 'status', 'route_polyline', 'recurring_trip', 'occurrence_date',
+            'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'driver', 'created_at', 'updated_at']
+        read_only_fields = [
+            'id', 'driver', 'ride_group', 'recurring_trip', 'occurrence_date', 'created_at', 'updated_at'
+        ]
+
+
+class TripSearchResultSerializer(serializers.BaseSerializer):
+    """
+    Compact search result built from a Trip .values() row (see
+    search_result_fields). Has TripSerializer's top-level keys except
+    route_polyline (read for corridor scoring but left out of result
+    payloads), adds match_score, and nests only the driver/vehicle fields
+    the list UI shows unless expanded.
+    """
+    TRIP_FIELDS = [
+        'id', 'trip_type', 'transport_mode', 'ride_group',
+        'start_location', 'start_latitude', 'start_longitude',
+        'end_location', 'end_latitude', 'end_longitude',
+        'departure_time', 'available_seats', 'gender_preference',
+        'price_per_seat', 'status', 'recurring_trip', 'occurrence_date', 'created_at', 'updated_at'
+    ]
+    DRIVER_FIELDS = ['username', 'first_name', 'last_name']
+    DRIVER_EXPANDED_FIELDS = DRIVER_FIELDS + [
+        'gender', 'profile_picture', 'trust_score', 'total_rides', 'total_co2_saved', 'is_verified'
+    ]
+    VEHICLE_FIELDS = ['model', 'vehicle_type']
+    VEHICLE_EXPANDED_FIELDS = VEHICLE_FIELDS + [
+        'registration_number', 'fuel_type', 'capacity', 'color', 'year', 'is_verified'
+    ]
+    EXPANDABLE = ('driver', 'vehicle')
+    DECIMAL_FIELDS = {
+        'start_latitude', 'start_longitude', 'end_latitude', 'end_longitude',
+        'price_per_seat', 'trust_score', 'total_co2_saved'
+    }
+    DATETIME_FIELDS = {'departure_time', 'created_at', 'updated_at'}
+    DATE_FIELDS = {'occurrence_date'}
+
+    _datetime_field = serializers.DateTimeField()
+    _date_field = serializers.DateField()
+
+    @classmethod
+    def search_result_fields(cls, expand=()):
+        """Columns to pass to .values() for the given expansions"""
+        driver_fields = cls.DRIVER_EXPANDED_FIELDS if 'driver' in expand else cls.DRIVER_FIELDS
+        vehicle_fields = cls.VEHICLE_EXPANDED_FIELDS if 'vehicle' in expand else cls.VEHICLE_FIELDS
+        return (
+            cls.TRIP_FIELDS + ['driver_id', 'vehicle_id', 'route_polyline']
+            + [f'driver__{field}' for field in driver_fields]
+            + [f'vehicle__{field}' for field in vehicle_fields]
+        )
+
+    @classmethod
+    def parse_expand(cls, value):
+        """Valid names from a comma separated ?expand= value"""
+        return tuple(name for name in (value or '').split(',') if name in cls.EXPANDABLE)
+
+    def _format(self, name, value):
+        if value is None:
+            return None
+        if name in self.DECIMAL_FIELDS:
+            return str(value)
+        if name in self.DATETIME_FIELDS:
+            return self._datetime_field.to_representation(value)
+        if name in self.DATE_FIELDS:
+            return self._date_field.to_representation(value)
+        return value
+
+    def _nested(self, row, prefix, fields, object_id):
+        if object_id is None:
+            return None
+        nested = {'id': object_id}
+        for field in fields:
+            nested[field] = self._format(field, row[f'{prefix}__{field}'])
+        if 'profile_picture' in nested:
+            picture = nested['profile_picture']
+            nested['profile_picture'] = default_storage.url(picture) if picture else None
+        return nested
+
+    def to_representation(self, row):
+        expand = self.context.get('expand', ())
+        data = {name: self._format(name, row[name]) for name in self.TRIP_FIELDS}
+        data['driver'] = row['driver_id']
+        data['vehicle'] = row['vehicle_id']
+        data['driver_details'] = self._nested(
+            row, 'driver',
+            self.DRIVER_EXPANDED_FIELDS if 'driver' in expand else self.DRIVER_FIELDS,
+            row['driver_id']
+        )
+        data['vehicle_details'] = self._nested(
+            row, 'vehicle',
+            self.VEHICLE_EXPANDED_FIELDS if 'vehicle' in expand else self.VEHICLE_FIELDS,
+            row['vehicle_id']
+        )
+        data['match_score'] = round(row['match_score'], 2) if 'match_score' in row else None
+        return data
+
+
+class WaypointSerializer(serializers.Serializer):
+    latitude = serializers.DecimalField(max_digits=10, decimal_places=7)
+    longitude = serializers.DecimalField(max_digits=10, decimal_places=7)
 
 
 class TripCreateSerializer(serializers.ModelSerializer):
+    # Intermediate stops used to build route_polyline when none is supplied
+    waypoints = WaypointSerializer(many=True, required=False, write_only=True)
+
     class Meta:
         model = Trip
         fields = [
-            'vehicle', 'start_location', 'start_latitude', 'start_longitude',
+            'vehicle', 'trip_type', 'transport_mode',
+            'start_location', 'start_latitude', 'start_longitude',
             'end_location', 'end_latitude', 'end_longitude',
-            'departure_time', 'available_seats', 'gender_preference', 'price_per_seat'
+            'departure_time', 'available_seats', 'gender_preference', 'price_per_seat',
+            'route_polyline', 'waypoints'
         ]
         extra_kwargs = {
-            'vehicle': {'required': False, 'allow_null': True}
+            'vehicle': {'required': False, 'allow_null': True},
+            'route_polyline': {'required': False}
         }
 
+    def validate_route_polyline(self, value):
+        if value:
+            try:
+                points = decode_polyline(value)
+            except (IndexError, ValueError):
+                raise serializers.ValidationError('Invalid encoded polyline')
+            if len(points) < 2:
+                raise serializers.ValidationError('Route polyline needs at least two points')
+        return value
+
     def create(self, validated_data):
         from ecopool_apps.authentication.models import Vehicle
+        waypoints = validated_data.pop('waypoints', None)
+        if waypoints and not validated_data.get('route_polyline'):
+            validated_data['route_polyline'] = synthesize_route_polyline(
+                (validated_data['start_latitude'], validated_data['start_longitude']),
+                (validated_data['end_latitude'], validated_data['end_longitude']),
+                [(point['latitude'], point['longitude']) for point in waypoints]
+            )
         validated_data['driver'] = self.context['request'].user
         # If no vehicle provided, try to use user's first vehicle
         if not validated_data.get('vehicle'):
@@ -62,5 +187,109 @@ class TripSearchSerializer(serializers.Serializer):
     end_latitude = serializers.DecimalField(max_digits=10, decimal_places=7, required=True)
     end_longitude = serializers.DecimalField(max_digits=10, decimal_places=7, required=True)
     departure_date = serializers.DateField(required=False)
+    departure_time = serializers.DateTimeField(required=False)
+    time_tolerance_minutes = serializers.IntegerField(required=False, default=60, min_value=0, max_value=1440)
     seats_needed = serializers.IntegerField(required=False, default=1)
     max_distance_km = serializers.DecimalField(max_digits=5, decimal_places=2, required=False, default=5.0)
+    match_mode = serializers.ChoiceField(choices=['endpoints', 'corridor'], required=False, default='endpoints')
+
+
+class AssignmentProposalSerializer(serializers.ModelSerializer):
+    passenger_details = UserSerializer(source='passenger', read_only=True)
+
+    class Meta:
+        model = AssignmentProposal
+        fields = [
+            'id', 'run_id', 'trip', 'passenger', 'passenger_details', 'trip_request',
+            'seeking_trip', 'seats', 'cost', 'detour_km', 'time_deviation_minutes',
+            'status', 'created_at', 'updated_at'
+        ]
+        read_only_fields = fields
+
+
+class AssignmentRunSerializer(serializers.Serializer):
+    """Parameters of a batch assignment run"""
+    window_start = serializers.DateTimeField(required=False)
+    window_hours = serializers.IntegerField(required=False, default=2, min_value=1, max_value=48)
+
+
+class BulkIdsSerializer(serializers.Serializer):
+    """Ids for bulk accept/confirm/reject actions"""
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=1000)
+
+
+class RideGroupMemberSerializer(serializers.ModelSerializer):
+    username = serializers.CharField(source='driver.username', read_only=True)
+
+    class Meta:
+        model = Trip
+        fields = ['id', 'username', 'start_location', 'end_location', 'departure_time']
+        read_only_fields = fields
+
+
+class RideGroupSerializer(serializers.ModelSerializer):
+    members = RideGroupMemberSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = RideGroup
+        fields = [
+            'id', 'transport_mode', 'capacity', 'member_count', 'status',
+            'start_latitude', 'start_longitude', 'end_latitude', 'end_longitude',
+            'departure_time', 'gender_preference', 'members', 'created_at', 'updated_at'
+        ]
+        read_only_fields = fields
+
+
+class WeekdaysField(serializers.Field):
+    """RecurringTrip.weekdays bitmask as a list of weekday numbers (Monday = 0)"""
+
+    def to_representation(self, value):
+        return [day for day in range(7) if value & (1 << day)]
+
+    def to_internal_value(self, data):
+        if not isinstance(data, list) or not data:
+            raise serializers.ValidationError('Expected a non-empty list of weekdays (0 = Monday)')
+        mask = 0
+        for day in data:
+            if not isinstance(day, int) or not 0 <= day <= 6:
+                raise serializers.ValidationError('Weekdays must be integers from 0 (Monday) to 6')
+            mask |= 1 << day
+        return mask
+
+
+class RecurringTripSerializer(serializers.ModelSerializer):
+    weekdays = WeekdaysField()
+    excluded_dates = serializers.ListField(child=serializers.DateField(), required=False)
+
+    class Meta:
+        model = RecurringTrip
+        fields = [
+            'id', 'driver', 'vehicle', 'trip_type', 'transport_mode',
+            'start_location', 'start_latitude', 'start_longitude',
+            'end_location', 'end_latitude', 'end_longitude', 'route_polyline',
+            'departure_time_of_day', 'weekdays', 'interval_weeks', 'start_date', 'end_date',
+            'excluded_dates', 'available_seats', 'gender_preference', 'price_per_seat',
+            'is_active', 'created_at', 'updated_at'
+        ]
+        read_only_fields = ['id', 'driver', 'created_at', 'updated_at']
+        extra_kwargs = {
+            'vehicle': {'required': False, 'allow_null': True},
+            'route_polyline': {'required': False}
+        }
+
+    def validate_excluded_dates(self, value):
+        return sorted({day.isoformat() for day in value})
+
+    def validate(self, data):
+        start_date = data.get('start_date', getattr(self.instance, 'start_date', None))
+        end_date = data.get('end_date', getattr(self.instance, 'end_date', None))
+        if start_date and end_date and end_date < start_date:
+            raise serializers.ValidationError({'end_date': 'End date must not be before start date'})
+        return data
+
+    def create(self, validated_data):
+        from ecopool_apps.authentication.models import Vehicle
+        validated_data['driver'] = self.context['request'].user
+        if not validated_data.get('vehicle'):
+            validated_data['vehicle'] = Vehicle.objects.filter(driver=validated_data['driver']).first()
+        return super().create(validated_data)
@@ -0,0 +1,284 @@
+"""
+Spatial indexing utilities for trip matching (geohash grid cells) and the
+encoded polyline codec shared by trip routes and ride tracks
+"""
+import math
+
+import numpy as np
+from django.db.models import Q
+
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_DECODE_MAP = {char: index for index, char in enumerate(GEOHASH_ALPHABET)}
+
+# Precision stored on Trip rows (~5m x 5m cells). Searches use shorter prefixes.
+GEOHASH_PRECISION = 9
+
+KM_PER_DEGREE_LAT = 111.32
+# Shortest length of one degree of latitude (at the equator), in km. Used to
+# size bounding boxes so they never cut off a point inside a radius.
+MIN_KM_PER_DEGREE_LAT = 110.574
+EARTH_RADIUS_KM = 6371.0088
+# Decimal places kept by encoded polylines (Google's default)
+POLYLINE_PRECISION = 5
+
+
+def trip_field(trip, name):
+    """Field of a Trip instance or of a Trip .values() row"""
+    if isinstance(trip, dict):
+        return trip[name]
+    return getattr(trip, name)
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Encode a coordinate into a geohash string of the given precision"""
+    latitude = float(latitude)
+    longitude = float(longitude)
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+
+    geohash = []
+    bits = 0
+    bit_count = 0
+    even_bit = True
+
+    while len(geohash) < precision:
+        if even_bit:
+            mid = (lon_range[0] + lon_range[1]) / 2
+            if longitude >= mid:
+                bits = (bits << 1) | 1
+                lon_range[0] = mid
+            else:
+                bits = bits << 1
+                lon_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                bits = (bits << 1) | 1
+                lat_range[0] = mid
+            else:
+                bits = bits << 1
+                lat_range[1] = mid
+
+        even_bit = not even_bit
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+
+    return ''.join(geohash)
+
+
+def decode_geohash_bounds(geohash):
+    """
+    Decode a geohash into its bounding box
+    Returns tuple: (min_lat, min_lon, max_lat, max_lon)
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even_bit = True
+
+    for char in geohash:
+        value = GEOHASH_DECODE_MAP[char]
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            target = lon_range if even_bit else lat_range
+            mid = (target[0] + target[1]) / 2
+            if bit:
+                target[0] = mid
+            else:
+                target[1] = mid
+            even_bit = not even_bit
+
+    return lat_range[0], lon_range[0], lat_range[1], lon_range[1]
+
+
+def geohash_cell_size_deg(precision):
+    """Return (lat_degrees, lon_degrees) spanned by a cell of the given precision"""
+    total_bits = precision * 5
+    lon_bits = math.ceil(total_bits / 2)
+    lat_bits = total_bits // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lon_bits)
+
+
+def precision_for_radius(latitude, radius_km, max_precision=GEOHASH_PRECISION):
+    """
+    Pick the finest geohash precision whose cells are at least radius_km
+    on each side, so the 3x3 block around a point covers the whole radius
+    """
+    cos_lat = max(math.cos(math.radians(float(latitude))), 0.01)
+    best = 1
+    for precision in range(1, max_precision + 1):
+        lat_deg, lon_deg = geohash_cell_size_deg(precision)
+        height_km = lat_deg * KM_PER_DEGREE_LAT
+        width_km = lon_deg * KM_PER_DEGREE_LAT * cos_lat
+        if height_km < radius_km or width_km < radius_km:
+            break
+        best = precision
+    return best
+
+
+def geohash_cells_for_radius(latitude, longitude, radius_km):
+    """
+    Return the geohash prefixes (center cell plus its 8 neighbours) that
+    together cover every point within radius_km of the given coordinate
+    """
+    precision = precision_for_radius(latitude, radius_km)
+    center = encode_geohash(latitude, longitude, precision)
+    min_lat, min_lon, max_lat, max_lon = decode_geohash_bounds(center)
+    lat_step = max_lat - min_lat
+    lon_step = max_lon - min_lon
+    center_lat = (min_lat + max_lat) / 2
+    center_lon = (min_lon + max_lon) / 2
+
+    cells = set()
+    for d_lat in (-1, 0, 1):
+        neighbour_lat = center_lat + d_lat * lat_step
+        if neighbour_lat < -90 or neighbour_lat > 90:
+            continue
+        for d_lon in (-1, 0, 1):
+            neighbour_lon = center_lon + d_lon * lon_step
+            # Wrap around the antimeridian
+            neighbour_lon = (neighbour_lon + 180) % 360 - 180
+            cells.add(encode_geohash(neighbour_lat, neighbour_lon, precision))
+
+    return sorted(cells)
+
+
+def geohash_cells_in_bbox(min_lat, min_lon, max_lat, max_lon, precision):
+    """Return every geohash cell of the given precision that intersects a bounding box"""
+    lat_step, lon_step = geohash_cell_size_deg(precision)
+    min_lat = max(float(min_lat), -90.0)
+    max_lat = min(float(max_lat), 90.0)
+    min_lon = float(min_lon)
+    max_lon = float(max_lon)
+
+    cells = set()
+    lat = min_lat
+    while True:
+        lon = min_lon
+        while True:
+            cells.add(encode_geohash(lat, (lon + 180) % 360 - 180, precision))
+            if lon >= max_lon:
+                break
+            lon = min(lon + lon_step, max_lon)
+        if lat >= max_lat:
+            break
+        lat = min(lat + lat_step, max_lat)
+
+    return sorted(cells)
+
+
+def geohash_cells_around(latitude, longitude, radius_km, precision):
+    """Return the cells of a fixed precision covering a radius around a point"""
+    latitude = float(latitude)
+    longitude = float(longitude)
+    lat_delta = radius_km / MIN_KM_PER_DEGREE_LAT
+    cos_lat = max(math.cos(math.radians(min(abs(latitude) + lat_delta, 89.9))), 0.01)
+    lon_delta = radius_km / (MIN_KM_PER_DEGREE_LAT * cos_lat)
+    return geohash_cells_in_bbox(
+        latitude - lat_delta, longitude - lon_delta,
+        latitude + lat_delta, longitude + lon_delta,
+        precision
+    )
+
+
+def geohash_prefix_q(field_name, prefixes):
+    """
+    Build a Q object matching rows whose geohash column starts with any of
+    the given prefixes. Uses range lookups so a plain B-tree index applies.
+    """
+    query = Q()
+    for prefix in prefixes:
+        # '{' sorts directly after 'z', the last geohash character
+        query |= Q(**{
+            f'{field_name}__gte': prefix,
+            f'{field_name}__lt': prefix + '{',
+        })
+    return query
+
+
+def trip_radius_q(search_params):
+    """
+    Q object restricting trips to those whose start and end geohash cells
+    fall inside the search radius around the rider's start and end points
+    """
+    radius_km = float(search_params.get('max_distance_km', 5.0))
+    start_cells = geohash_cells_for_radius(
+        search_params.get('start_latitude'),
+        search_params.get('start_longitude'),
+        radius_km
+    )
+    end_cells = geohash_cells_for_radius(
+        search_params.get('end_latitude'),
+        search_params.get('end_longitude'),
+        radius_km
+    )
+    return geohash_prefix_q('start_geohash', start_cells) & geohash_prefix_q('end_geohash', end_cells)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """
+    Great-circle distance in kilometers. Accepts scalars or NumPy arrays
+    (broadcast against each other) and returns a float or an array.
+    """
+    lat1 = np.radians(np.asarray(lat1, dtype=float))
+    lon1 = np.radians(np.asarray(lon1, dtype=float))
+    lat2 = np.radians(np.asarray(lat2, dtype=float))
+    lon2 = np.radians(np.asarray(lon2, dtype=float))
+
+    d_lat = lat2 - lat1
+    d_lon = lon2 - lon1
+    a = np.sin(d_lat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(d_lon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _encode_value(value):
+    value = ~(value << 1) if value < 0 else value << 1
+    chunks = []
+    while value >= 0x20:
+        chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+        value >>= 5
+    chunks.append(chr(value + 63))
+    return ''.join(chunks)
+
+
+def encode_polyline(points, precision=POLYLINE_PRECISION):
+    """Encode (lat, lon) pairs with the Google encoded polyline algorithm"""
+    factor = 10 ** precision
+    encoded = []
+    previous_lat = previous_lon = 0
+    for lat, lon in points:
+        lat = int(round(float(lat) * factor))
+        lon = int(round(float(lon) * factor))
+        encoded.append(_encode_value(lat - previous_lat))
+        encoded.append(_encode_value(lon - previous_lon))
+        previous_lat, previous_lon = lat, lon
+    return ''.join(encoded)
+
+
+def decode_polyline(encoded, precision=POLYLINE_PRECISION):
+    """Decode a Google encoded polyline into a list of (lat, lon) floats"""
+    factor = 10 ** precision
+    points = []
+    index = lat = lon = 0
+    length = len(encoded)
+
+    while index < length:
+        deltas = []
+        for _ in range(2):
+            result = shift = 0
+            while True:
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lon += deltas[1]
+        points.append((lat / factor, lon / factor))
+
+    return points
@@ -0,0 +1,65 @@
+"""Model factories for the trips tests"""
+from datetime import timedelta
+from decimal import Decimal
+
+import factory
+from django.utils import timezone
+
+from ecopool_apps.authentication.models import Organization, User, Vehicle
+from ecopool_apps.trips.models import Trip
+
+
+class OrganizationFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = Organization
+
+    name = factory.Sequence(lambda n: f'Organization {n}')
+    domain = factory.Sequence(lambda n: f'org{n}.example.com')
+    address = 'Test address'
+
+
+class UserFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = User
+
+    username = factory.Sequence(lambda n: f'user{n}')
+    email = factory.LazyAttribute(lambda user: f'{user.username}@{user.organization.domain}')
+    organization = factory.SubFactory(OrganizationFactory)
+    role = 'passenger'
+    gender = 'female'
+    # Unusable password: tests authenticate with force_authenticate, and
+    # skipping the hasher keeps bulk user creation fast
+    password = factory.django.Password(None)
+
+
+class VehicleFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = Vehicle
+
+    driver = factory.SubFactory(UserFactory, role='driver')
+    vehicle_type = 'Sedan'
+    model = 'Test car'
+    registration_number = factory.Sequence(lambda n: f'KA01AB{n:04d}')
+    fuel_type = 'petrol'
+    capacity = 4
+    color = 'white'
+    year = 2022
+
+
+class TripFactory(factory.django.DjangoModelFactory):
+    """Offered trip across central Mumbai (Bandra to Worli) two hours from now"""
+
+    class Meta:
+        model = Trip
+
+    driver = factory.SubFactory(UserFactory, role='driver')
+    vehicle = factory.SubFactory(VehicleFactory, driver=factory.SelfAttribute('..driver'))
+    start_location = 'Bandra'
+    start_latitude = Decimal('19.0596000')
+    start_longitude = Decimal('72.8295000')
+    end_location = 'Worli'
+    end_latitude = Decimal('19.0176000')
+    end_longitude = Decimal('72.8562000')
+    departure_time = factory.LazyFunction(lambda: timezone.now() + timedelta(hours=2))
+    available_seats = 3
+    price_per_seat = Decimal('50.00')
@@ -0,0 +1,95 @@
+"""SeatAssignmentSolver against brute force, and all-or-nothing multi-seat requests"""
+import itertools
+import random
+from datetime import timedelta
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from ecopool_apps.trips.assignment import BatchAssignmentService
+from ecopool_apps.trips.assignment_utils import SeatAssignmentSolver
+from ecopool_apps.trips.models import AssignmentProposal, TripRequest
+
+from .factories import TripFactory, UserFactory
+
+
+def brute_force(capacities, riders):
+    """
+    (riders placed, total cost) the solver must reach: the most riders, then
+    the cheapest; when seats are plentiful the placed riders are the ones an
+    in-order admission keeps, then the cheapest for them
+    """
+    names = list(riders)
+    costs = {}      # frozenset of placed riders -> cheapest total cost
+    for choice in itertools.product(*[[None] + list(riders[name]) for name in names]):
+        used = {}
+        for trip in choice:
+            if trip is not None:
+                used[trip] = used.get(trip, 0) + 1
+        if any(count > capacities.get(trip, 0) for trip, count in used.items()):
+            continue
+        placed = frozenset(name for name, trip in zip(names, choice) if trip is not None)
+        cost = sum(riders[name][trip] for name, trip in zip(names, choice) if trip is not None)
+        costs[placed] = min(cost, costs.get(placed, cost))
+
+    if len(riders) <= sum(capacities.values()):
+        admitted = frozenset()
+        for name in names:
+            if admitted | {name} in costs:
+                admitted |= {name}
+        return len(admitted), costs[admitted]
+    most = max(len(placed) for placed in costs)
+    return most, min(cost for placed, cost in costs.items() if len(placed) == most)
+
+
+class SeatAssignmentSolverTests(SimpleTestCase):
+
+    def test_matches_brute_force_on_small_instances(self):
+        rng = random.Random(7)
+        for _ in range(300):
+            trips = [f't{index}' for index in range(rng.randint(1, 3))]
+            capacities = {trip: rng.randint(0, 2) for trip in trips}
+            riders = {}
+            for index in range(rng.randint(1, 6)):
+                candidates = rng.sample(trips, rng.randint(0, len(trips)))
+                riders[f'r{index}'] = {trip: rng.randint(0, 9) for trip in candidates}
+
+            solver = SeatAssignmentSolver(capacities)
+            for rider, candidates in riders.items():
+                solver.add_rider(rider, candidates.items())
+            assignment = solver.solve()
+
+            for rider, trip in assignment.items():
+                self.assertIn(trip, riders[rider])
+            for trip, seats in capacities.items():
+                self.assertLessEqual(sum(1 for assigned in assignment.values() if assigned == trip), seats)
+            self.assertEqual((len(assignment), solver.total_cost()), brute_force(capacities, riders),
+                             (capacities, riders))
+
+    def test_riders_admitted_in_order_when_seats_are_plentiful(self):
+        solver = SeatAssignmentSolver({'a': 1, 'b': 5})
+        solver.add_rider('first', [('a', 0)])
+        solver.add_rider('second', [('a', 0), ('b', 3)])
+        self.assertEqual(solver.solve(), {'first': 'a', 'second': 'b'})
+
+
+@override_settings(TRIP_SEAT_HOLD_MINUTES=0)
+class MultiSeatRequestTests(TestCase):
+
+    def test_partially_placed_request_gives_its_seats_to_other_riders(self):
+        offer = TripFactory(available_seats=2)
+        organization = offer.driver.organization
+        # Asks for more seats than the trip has, so it can only be placed partially
+        TripRequest.objects.create(
+            trip=offer, passenger=UserFactory(organization=organization), seats_requested=3
+        )
+        seeker = TripFactory(
+            driver=UserFactory(organization=organization), vehicle=None, trip_type='seeking',
+            departure_time=offer.departure_time + timedelta(minutes=5),
+        )
+
+        now = timezone.now()
+        summary = BatchAssignmentService.run(organization, now, now + timedelta(hours=4))
+
+        proposals = AssignmentProposal.objects.filter(run_id=summary['run_id'])
+        self.assertEqual(list(proposals.values_list('seeking_trip_id', 'trip_request_id', 'seats')), [(seeker.id, None, 1)])
@@ -0,0 +1,70 @@
+"""Edited seeking trips stay in a group that still fits them"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from ecopool_apps.trips.models import RideGroup
+
+from .factories import OrganizationFactory, TripFactory, UserFactory
+
+
+class EditedTripGroupingTests(TestCase):
+    def setUp(self):
+        self.organization = OrganizationFactory()
+        self.departure = (timezone.now() + timedelta(hours=3)).replace(microsecond=0)
+        self.first = self.seeking_trip()
+        self.second = self.seeking_trip()
+
+    def seeking_trip(self):
+        return TripFactory(
+            driver=UserFactory(organization=self.organization), vehicle=None,
+            trip_type='seeking', transport_mode='auto', departure_time=self.departure,
+        )
+
+    def edit(self, trip, **data):
+        client = APIClient()
+        client.force_authenticate(trip.driver)
+        response = client.patch(f'/api/trips/{trip.id}/', data, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        trip.refresh_from_db()
+        return trip
+
+    def test_new_trips_share_a_group(self):
+        self.assertIsNotNone(self.first.ride_group_id)
+        self.assertEqual(self.first.ride_group_id, self.second.ride_group_id)
+
+    def test_later_departure_moves_trip_to_new_group(self):
+        group_id = self.first.ride_group_id
+        second = self.edit(self.second, departure_time=(self.departure + timedelta(hours=10)).isoformat())
+
+        self.assertNotEqual(second.ride_group_id, group_id)
+        old_group = RideGroup.objects.get(id=group_id)
+        self.assertEqual(old_group.member_count, 1)
+        self.assertEqual(old_group.departure_time, self.departure)
+        self.assertEqual(second.ride_group.departure_time, second.departure_time)
+
+    def test_moved_destination_moves_trip_to_new_group(self):
+        group_id = self.first.ride_group_id
+        second = self.edit(self.second, end_latitude='19.1000000', end_longitude='72.9000000')
+
+        self.assertNotEqual(second.ride_group_id, group_id)
+        self.assertEqual(RideGroup.objects.get(id=group_id).member_count, 1)
+
+    def test_small_edit_keeps_group_and_recentres_it(self):
+        group_id = self.first.ride_group_id
+        second = self.edit(self.second, departure_time=(self.departure + timedelta(minutes=10)).isoformat())
+
+        self.assertEqual(second.ride_group_id, group_id)
+        group = RideGroup.objects.get(id=group_id)
+        self.assertEqual(group.member_count, 2)
+        self.assertEqual(group.departure_time, self.departure + timedelta(minutes=5))
+
+    def test_unrelated_edit_leaves_group_alone(self):
+        group_id = self.first.ride_group_id
+        second = self.edit(self.second, start_location='Bandra West', end_latitude=str(Decimal('19.0176000')))
+
+        self.assertEqual(second.ride_group_id, group_id)
+        self.assertEqual(RideGroup.objects.get(id=group_id).member_count, 2)
@@ -0,0 +1,104 @@
+"""A cached trip search must never serve a seat count that changed since"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from ecopool_apps.trips.models import TripRequest
+from ecopool_apps.trips.search_cache import search_cache
+
+from .factories import TripFactory, UserFactory
+
+
+SEARCH = {
+    'start_latitude': '19.0590000',
+    'start_longitude': '72.8300000',
+    'end_latitude': '19.0180000',
+    'end_longitude': '72.8560000',
+}
+
+
+class SearchCacheInvalidationTests(TestCase):
+
+    def setUp(self):
+        self._enabled = search_cache.enabled
+        search_cache.enabled = True
+        search_cache.clear()
+        self.trip = TripFactory()
+        self.driver = self.trip.driver
+        self.passenger = UserFactory(organization=self.driver.organization)
+        self.client = APIClient()
+
+    def tearDown(self):
+        search_cache.clear()
+        search_cache.enabled = self._enabled
+
+    def search_seats(self):
+        """available_seats of self.trip in a search as the passenger"""
+        self.client.force_authenticate(self.passenger)
+        response = self.client.post('/api/trips/search/', SEARCH, format='json')
+        self.assertEqual(response.status_code, 200)
+        seats = [result['available_seats'] for result in response.data if result['id'] == self.trip.id]
+        self.assertEqual(len(seats), 1)
+        return seats[0]
+
+    def request_trip(self, seats=1):
+        self.client.force_authenticate(self.passenger)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/api/trip-requests/', {'trip': self.trip.id, 'seats_requested': seats}, format='json'
+            )
+        self.assertEqual(response.status_code, 201)
+        return TripRequest.objects.get(id=response.data['id'])
+
+    def accept(self, trip_request):
+        self.client.force_authenticate(self.driver)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/api/trip-requests/{trip_request.id}/accept/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_repeated_search_is_served_from_cache(self):
+        self.assertEqual(self.search_seats(), 3)
+        hits = search_cache.stats()['hits']
+        self.assertEqual(self.search_seats(), 3)
+        self.assertEqual(search_cache.stats()['hits'], hits + 1)
+
+    @override_settings(TRIP_SEAT_HOLD_MINUTES=0)
+    def test_accept_invalidates_cached_seat_count(self):
+        self.assertEqual(self.search_seats(), 3)
+        trip_request = self.request_trip(seats=2)
+        self.assertEqual(self.search_seats(), 3)
+
+        self.accept(trip_request)
+
+        self.assertEqual(self.search_seats(), 1)
+
+    def test_held_request_then_accept_never_serves_stale_seats(self):
+        self.assertEqual(self.search_seats(), 3)
+        trip_request = self.request_trip(seats=1)
+        # The request holds its seat at once
+        self.assertEqual(self.search_seats(), 2)
+
+        self.accept(trip_request)
+
+        self.assertEqual(self.search_seats(), 2)
+        self.trip.refresh_from_db()
+        self.assertEqual(self.trip.available_seats, 2)
+
+    def test_unrelated_trip_change_keeps_entry(self):
+        self.assertEqual(self.search_seats(), 3)
+        # Pune, far outside every cell the Mumbai search can reach
+        other = TripFactory(
+            driver=UserFactory(organization=self.driver.organization, role='driver'),
+            start_latitude=Decimal('18.5204000'), start_longitude=Decimal('73.8567000'),
+            end_latitude=Decimal('18.5600000'), end_longitude=Decimal('73.9100000'),
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            other.available_seats = 1
+            other.departure_time += timedelta(minutes=5)
+            other.save()
+
+        hits = search_cache.stats()['hits']
+        self.assertEqual(self.search_seats(), 3)
+        self.assertEqual(search_cache.stats()['hits'], hits + 1)
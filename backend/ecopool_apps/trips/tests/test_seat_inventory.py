@@ -0,0 +1,96 @@
+"""
+Concurrent bookings never overbook a trip
+Each booking runs on its own thread and database connection. On SQLite
+(transaction_mode IMMEDIATE) transactions are serialized, so these tests
+mainly guard the conditional UPDATEs and row locks relied on elsewhere.
+"""
+import threading
+
+from django.db import close_old_connections, connection
+from django.test import TransactionTestCase, override_settings
+
+from ecopool_apps.trips.inventory import SeatInventoryService
+from ecopool_apps.trips.models import SeatHold, TripRequest
+
+from .factories import TripFactory, UserFactory
+
+
+def run_in_parallel(calls):
+    """Run the callables on their own threads, released together; returns their results"""
+    barrier = threading.Barrier(len(calls))
+    results = [None] * len(calls)
+    errors = []
+
+    def worker(index, call):
+        try:
+            barrier.wait()
+            results[index] = call()
+        except Exception as exc:
+            errors.append(exc)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(index, call)) for index, call in enumerate(calls)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    close_old_connections()
+    if errors:
+        raise errors[0]
+    return results
+
+
+class ParallelAcceptTests(TransactionTestCase):
+    PASSENGERS = 40
+    SEATS = 5
+
+    def setUp(self):
+        self.trip = TripFactory(available_seats=self.SEATS)
+        self.driver = self.trip.driver
+        organization = self.driver.organization
+        self.requests = [
+            TripRequest.objects.create(
+                trip=self.trip, passenger=UserFactory(organization=organization), seats_requested=1 + index % 2
+            )
+            for index in range(self.PASSENGERS)
+        ]
+
+    def assert_not_overbooked(self):
+        self.trip.refresh_from_db()
+        accepted = TripRequest.objects.filter(trip=self.trip, status='accepted')
+        booked = sum(accepted.values_list('seats_requested', flat=True))
+        held = sum(SeatHold.objects.filter(trip=self.trip, status='active').values_list('seats', flat=True))
+        self.assertGreaterEqual(self.trip.available_seats, 0)
+        self.assertLessEqual(booked + held, self.SEATS)
+        self.assertEqual(self.trip.available_seats + booked + held, self.SEATS)
+        return booked
+
+    @override_settings(TRIP_SEAT_HOLD_MINUTES=0)
+    def test_parallel_accepts_never_overbook(self):
+        results = run_in_parallel([
+            lambda request=request: SeatInventoryService.accept([request.id], self.driver)
+            for request in self.requests
+        ])
+
+        booked = self.assert_not_overbooked()
+        accepted_ids = {request_id for result in results for request_id in result['accepted']}
+        self.assertEqual(
+            accepted_ids, set(TripRequest.objects.filter(status='accepted').values_list('id', flat=True))
+        )
+        # Requests are for one or two seats, so a five-seat trip fills to at least four
+        self.assertGreaterEqual(booked, self.SEATS - 1)
+
+    def test_parallel_holds_and_accepts_never_overbook(self):
+        held = run_in_parallel([
+            lambda request=request: SeatInventoryService.hold(request) for request in self.requests
+        ])
+        self.assertTrue(any(held))
+        self.assert_not_overbooked()
+
+        run_in_parallel([
+            lambda request=request: SeatInventoryService.accept([request.id], self.driver)
+            for request in self.requests
+        ])
+
+        self.assert_not_overbooked()
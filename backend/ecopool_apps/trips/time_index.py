@@ -0,0 +1,66 @@
+"""
+In-memory departure-time index for batch matching
+
+Trips are kept in per-organization arrays sorted by departure time, so a
+departure window is located with two bisections and only the trips inside
+it are handed to the matching pipeline.
+"""
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+import threading
+
+
+class TripTimeIndex:
+    """Per-organization, departure-time sorted collection of trips"""
+
+    def __init__(self, trips=()):
+        self._times = defaultdict(list)   # org_id -> sorted departure times
+        self._trips = defaultdict(list)   # org_id -> trips, parallel to _times
+        self._lock = threading.Lock()
+
+        grouped = defaultdict(list)
+        for trip in trips:
+            grouped[trip.driver.organization_id].append(trip)
+        for organization_id, org_trips in grouped.items():
+            org_trips.sort(key=lambda trip: (trip.departure_time, trip.id))
+            self._trips[organization_id] = org_trips
+            self._times[organization_id] = [trip.departure_time for trip in org_trips]
+
+    def __len__(self):
+        return sum(len(trips) for trips in self._trips.values())
+
+    def add(self, trip):
+        """Insert a trip keeping its organization's array sorted"""
+        organization_id = trip.driver.organization_id
+        with self._lock:
+            times = self._times[organization_id]
+            index = bisect_right(times, trip.departure_time)
+            times.insert(index, trip.departure_time)
+            self._trips[organization_id].insert(index, trip)
+
+    def discard(self, trip):
+        """
+        Remove a trip (matched by id) if it is indexed
+        The trip's departure_time must be the indexed one, so discard
+        before changing it and add again after.
+        """
+        organization_id = trip.driver.organization_id
+        with self._lock:
+            times = self._times[organization_id]
+            trips = self._trips[organization_id]
+            start = bisect_left(times, trip.departure_time)
+            end = bisect_right(times, trip.departure_time, lo=start)
+            for index in range(start, end):
+                if trips[index].id == trip.id:
+                    del trips[index]
+                    del times[index]
+                    return True
+        return False
+
+    def window(self, organization_id, earliest=None, latest=None):
+        """Trips of an organization departing within [earliest, latest]"""
+        with self._lock:
+            times = self._times.get(organization_id, [])
+            start = 0 if earliest is None else bisect_left(times, earliest)
+            end = len(times) if latest is None else bisect_right(times, latest)
+            return self._trips.get(organization_id, [])[start:end]
@@ -1,15 +1,39 @@
+import json
+
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.settings import api_settings
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
 from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.db import transaction
 from django.db.models import Q
-from .models import Trip, TripRequest
+from datetime import timedelta
+from ecopool_apps.rides.sync import DeltaSyncMixin
+from .models import Trip, TripRequest, AssignmentProposal, RideGroup, RecurringTrip
 from .serializers import (
     TripSerializer, TripCreateSerializer, 
-    TripRequestSerializer, TripSearchSerializer
+    TripRequestSerializer, TripSearchSerializer, TripSearchResultSerializer,
+    AssignmentProposalSerializer, AssignmentRunSerializer, BulkIdsSerializer,
+    RideGroupSerializer, RecurringTripSerializer
+)
+from .assignment import BatchAssignmentService
+from .inventory import SeatInventoryService
+from .recurrence import (
+    search_occurrences, runs_on, occurrence_datetime, materialize_occurrence, refresh_occurrences,
+    materialize_horizon, drop_unbooked_occurrences
 )
-from .matching_utils import match_trips
+from .grouping import RideGroupService, is_groupable
+from .matching_utils import (
+    filter_candidates, score_trips, top_matches, iter_ranked_matches, result_rank_id,
+    DISTANCE_MODE_PRECISE
+)
+from .pagination import encode_cursor, decode_cursor
+from .search_cache import search_cache
 
 
 class TripViewSet(viewsets.ModelViewSet):
@@ -51,25 +75,79 @@ class TripViewSet(viewsets.ModelViewSet):
         """
         serializer = TripSearchSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
+        mode = getattr(settings, 'TRIP_MATCH_DISTANCE_MODE', DISTANCE_MODE_PRECISE)
+        
+        expand = TripSearchResultSerializer.parse_expand(request.query_params.get('expand'))
+        stream = request.query_params.get('stream') == 'ndjson'
+        
+        # Keyset pagination is opt-in: ?page_size=N and/or ?cursor=...
+        cursor = request.query_params.get('cursor')
+        page_size = request.query_params.get('page_size')
+        paginate = cursor is not None or page_size is not None
+        after = None
+        if paginate:
+            try:
+                page_size = int(page_size or api_settings.PAGE_SIZE)
+                after = decode_cursor(cursor) if cursor else None
+            except ValueError:
+                return Response(
+                    {'error': 'Invalid cursor or page_size'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            page_size = min(max(page_size, 1), getattr(settings, 'TRIP_SEARCH_MAX_PAGE_SIZE', 100))
+        
+        if not stream:
+            variant = ','.join(sorted(expand))
+            if paginate:
+                variant += f'|page={page_size}|cursor={cursor or ""}'
+            cache_key = search_cache.key_for(serializer.validated_data, request.user, mode, variant=variant)
+            cached = search_cache.get(cache_key)
+            if cached is not None:
+                return Response(cached)
+        
+        # Organization, seats, gender, radius and date filters are applied
+        # in SQL by the matching pipeline's filter stage; rows are projected
+        # with .values() so no model instances are built
+        fields = TripSearchResultSerializer.search_result_fields(expand)
+        candidates = filter_candidates(serializer.validated_data, Trip.objects.values(*fields), request.user)
+        # Recurring trips contribute occurrences that have no Trip row yet
+        occurrences = search_occurrences(serializer.validated_data, request.user, fields)
+        if occurrences:
+            candidates = list(candidates) + occurrences
         
-        # Get available trips (scheduled and not full)
-        available_trips = Trip.objects.filter(
-            status='scheduled',
-            available_seats__gt=0,
-            departure_time__gte=timezone.now(),
-            driver__organization=request.user.organization
-        ).select_related('driver', 'vehicle')
-        
-        # Apply matching algorithm
-        matched_trips = match_trips(
-            serializer.validated_data,
-            available_trips,
-            request.user
-        )
-        
-        # Serialize results
-        result_serializer = TripSerializer(matched_trips, many=True)
-        return Response(result_serializer.data)
+        if stream:
+            return StreamingHttpResponse(
+                self._stream_search_results(serializer.validated_data, candidates, mode, after, expand),
+                content_type='application/x-ndjson'
+            )
+        
+        if paginate:
+            # One extra result tells whether another page exists
+            page = top_matches(serializer.validated_data, candidates, page_size + 1, mode, after)
+            next_cursor = None
+            if len(page) > page_size:
+                page = page[:page_size]
+                next_cursor = encode_cursor(page[-1]['match_score'], result_rank_id(page[-1]))
+            data = {
+                'results': TripSearchResultSerializer(page, many=True, context={'expand': expand}).data,
+                'next_cursor': next_cursor,
+            }
+        else:
+            # Apply matching algorithm
+            matched_trips = score_trips(serializer.validated_data, candidates, mode)
+            data = TripSearchResultSerializer(
+                matched_trips, many=True, context={'expand': expand}
+            ).data
+        
+        search_cache.set(cache_key, data)
+        return Response(data)
+    
+    @staticmethod
+    def _stream_search_results(search_params, candidates, mode, after, expand):
+        """Yield search results as newline-delimited JSON, best first, as they are scored"""
+        result_serializer = TripSearchResultSerializer(context={'expand': expand})
+        for trip in iter_ranked_matches(search_params, candidates, mode, after):
+            yield json.dumps(result_serializer.to_representation(trip), cls=DjangoJSONEncoder) + '\n'
     
     @action(detail=True, methods=['post'])
     def cancel(self, request, pk=None):
@@ -95,6 +173,34 @@ class TripViewSet(viewsets.ModelViewSet):
         
         return Response({'message': 'Trip cancelled successfully'})
     
+    @action(detail=True, methods=['get'], url_path='group-suggestions')
+    def group_suggestions(self, request, pk=None):
+        """Current ride-mate group of a seeking trip and other groups it could join"""
+        trip = self.get_object()
+        
+        if trip.driver != request.user:
+            return Response(
+                {'error': 'Only the trip owner can view group suggestions'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        if not is_groupable(trip):
+            return Response(
+                {'error': 'Only seeking trips by auto, public transport or bike are grouped'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        suggestions = []
+        for score, group in RideGroupService.candidates(trip, trip.ride_group_id)[:5]:
+            data = RideGroupSerializer(group).data
+            data['score'] = round(score, 3)
+            suggestions.append(data)
+        
+        return Response({
+            'current_group': RideGroupSerializer(trip.ride_group).data if trip.ride_group else None,
+            'suggestions': suggestions,
+        })
+    
     @action(detail=True, methods=['get'])
     def requests(self, request, pk=None):
         """Get all requests for a trip"""
@@ -111,12 +217,14 @@ class TripViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class TripRequestViewSet(viewsets.ModelViewSet):
+class TripRequestViewSet(DeltaSyncMixin, viewsets.ModelViewSet):
     """
     ViewSet for trip requests (passengers requesting to join trips)
+    The list supports delta sync (?updated_since=) and ETags
     """
     permission_classes = [IsAuthenticated]
     serializer_class = TripRequestSerializer
+    sync_model = 'trip_request'
     
     def get_queryset(self):
         user = self.request.user
@@ -132,12 +240,13 @@ class TripRequestViewSet(viewsets.ModelViewSet):
             ).select_related('trip', 'passenger')
     
     def create(self, request):
-        """Create a trip request"""
-        trip_id = request.data.get('trip')
+        """Create a trip request for a trip, or for an occurrence of a recurring trip"""
+        if request.data.get('recurring_trip'):
+            trip = self._occurrence_trip(request)
+        else:
+            trip = Trip.objects.filter(id=request.data.get('trip')).first()
         
-        try:
-            trip = Trip.objects.get(id=trip_id)
-        except Trip.DoesNotExist:
+        if trip is None:
             return Response(
                 {'error': 'Trip not found'},
                 status=status.HTTP_404_NOT_FOUND
@@ -150,9 +259,13 @@ class TripRequestViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        if trip.available_seats < request.data.get('seats_requested', 1):
+        try:
+            seats_requested = int(request.data.get('seats_requested', 1))
+        except (TypeError, ValueError):
+            seats_requested = 0
+        if seats_requested < 1:
             return Response(
-                {'error': 'Not enough seats available'},
+                {'error': 'Invalid seats_requested'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
@@ -169,17 +282,39 @@ class TripRequestViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Create request
-        trip_request = TripRequest.objects.create(
-            trip=trip,
-            passenger=request.user,
-            seats_requested=request.data.get('seats_requested', 1),
-            message=request.data.get('message', '')
-        )
+        # Create request and hold its seats until the driver responds
+        with transaction.atomic():
+            trip_request = TripRequest.objects.create(
+                trip=trip,
+                passenger=request.user,
+                seats_requested=seats_requested,
+                message=request.data.get('message', '')
+            )
+            if not SeatInventoryService.hold(trip_request):
+                transaction.set_rollback(True)
+                return Response(
+                    {'error': 'Not enough seats available'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
         
         serializer = TripRequestSerializer(trip_request)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     
+    @staticmethod
+    def _occurrence_trip(request):
+        """Trip row of a requested recurring trip occurrence, materialized on first booking"""
+        template = RecurringTrip.objects.filter(
+            id=request.data.get('recurring_trip'),
+            driver__organization=request.user.organization,
+            is_active=True
+        ).first()
+        occurrence_date = parse_date(str(request.data.get('occurrence_date', '')))
+        if template is None or occurrence_date is None or not runs_on(template, occurrence_date):
+            return None
+        if occurrence_datetime(template, occurrence_date) < timezone.now():
+            return None
+        return materialize_occurrence(template, occurrence_date)
+    
     @action(detail=True, methods=['post'])
     def accept(self, request, pk=None):
         """Accept a trip request (driver only)"""
@@ -197,20 +332,12 @@ class TripRequestViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        if trip_request.trip.available_seats < trip_request.seats_requested:
+        if not SeatInventoryService.accept([trip_request.id], request.user)['accepted']:
             return Response(
                 {'error': 'Not enough seats available'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        trip_request.status = 'accepted'
-        trip_request.save()
-        
-        # Update available seats
-        trip = trip_request.trip
-        trip.available_seats -= trip_request.seats_requested
-        trip.save()
-        
         # TODO: Notify passenger
         
         return Response({'message': 'Request accepted successfully'})
@@ -226,9 +353,168 @@ class TripRequestViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        trip_request.status = 'rejected'
-        trip_request.save()
+        SeatInventoryService.reject([trip_request.id], request.user)
         
         # TODO: Notify passenger
         
         return Response({'message': 'Request rejected'})
+    
+    @action(detail=False, methods=['post'], url_path='bulk-accept')
+    def bulk_accept(self, request):
+        """Accept many pending requests for the driver's trips in one transaction"""
+        serializer = BulkIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        result = SeatInventoryService.accept(serializer.validated_data['ids'], request.user)
+        return Response(result)
+    
+    @action(detail=False, methods=['post'], url_path='bulk-reject')
+    def bulk_reject(self, request):
+        """Reject many requests for the driver's trips in one transaction"""
+        serializer = BulkIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        rejected = SeatInventoryService.reject(serializer.validated_data['ids'], request.user)
+        return Response({'rejected': rejected})
+
+
+class AssignmentProposalViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Proposals from batch assignment runs. Drivers see proposals for their
+    trips and confirm or reject them in bulk; riders see their own.
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = AssignmentProposalSerializer
+
+    def get_queryset(self):
+        user = self.request.user
+        queryset = AssignmentProposal.objects.filter(
+            Q(trip__driver=user) | Q(passenger=user)
+        ).select_related('passenger')
+        proposal_status = self.request.query_params.get('status')
+        if proposal_status:
+            queryset = queryset.filter(status=proposal_status)
+        return queryset.order_by('trip_id', 'cost', 'id')
+
+    @action(detail=False, methods=['post'])
+    def run(self, request):
+        """Run batch assignment for the admin's organization (admin only)"""
+        if request.user.role != 'admin':
+            return Response(
+                {'error': 'Only admins can run batch assignment'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        if not request.user.organization_id:
+            return Response(
+                {'error': 'User is not part of an organization'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        serializer = AssignmentRunSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        window_start = serializer.validated_data.get('window_start') or timezone.now()
+        window_end = window_start + timedelta(hours=serializer.validated_data['window_hours'])
+
+        summary = BatchAssignmentService.run(request.user.organization, window_start, window_end)
+        return Response(summary, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'])
+    def confirm(self, request):
+        """Confirm pending proposals for the driver's trips"""
+        serializer = BulkIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        result = BatchAssignmentService.confirm(serializer.validated_data['ids'], request.user)
+        return Response(result)
+
+    @action(detail=False, methods=['post'])
+    def reject(self, request):
+        """Reject pending proposals for the driver's trips"""
+        serializer = BulkIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        rejected = BatchAssignmentService.reject(serializer.validated_data['ids'], request.user)
+        return Response({'rejected': rejected})
+
+
+class RideGroupViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Ride-mate groups of the user's seeking trips
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = RideGroupSerializer
+
+    def get_queryset(self):
+        if self.action == 'join':
+            # Any open group of the organization can be joined
+            queryset = RideGroup.objects.filter(organization=self.request.user.organization, status='forming')
+        else:
+            queryset = RideGroup.objects.filter(members__driver=self.request.user).distinct()
+        return queryset.prefetch_related('members__driver').order_by('departure_time')
+
+    def _seeking_trip(self, request):
+        try:
+            return Trip.objects.select_related('driver').get(
+                id=request.data.get('trip'), driver=request.user, status='scheduled'
+            )
+        except (Trip.DoesNotExist, ValueError, TypeError):
+            return None
+
+    @action(detail=True, methods=['post'])
+    def join(self, request, pk=None):
+        """Move one of the user's seeking trips into this group"""
+        group = self.get_object()
+        trip = self._seeking_trip(request)
+        if trip is None or not is_groupable(trip):
+            return Response(
+                {'error': 'Seeking trip not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        if trip.ride_group_id == group.id:
+            return Response(
+                {'error': 'Trip is already in this group'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if not RideGroupService.move(trip, group):
+            return Response(
+                {'error': 'Trip cannot join this group'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        group.refresh_from_db()
+        return Response(RideGroupSerializer(group).data)
+
+    @action(detail=True, methods=['post'])
+    def leave(self, request, pk=None):
+        """Take one of the user's seeking trips out of this group"""
+        group = self.get_object()
+        trip = self._seeking_trip(request)
+        if trip is None or trip.ride_group_id != group.id:
+            return Response(
+                {'error': 'Trip is not in this group'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        RideGroupService.leave(trip)
+        return Response({'message': 'Left the group'})
+
+
+class RecurringTripViewSet(viewsets.ModelViewSet):
+    """
+    Recurring trip templates of the current driver
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = RecurringTripSerializer
+
+    def get_queryset(self):
+        return RecurringTrip.objects.filter(driver=self.request.user).order_by('-created_at')
+
+    def perform_create(self, serializer):
+        template = serializer.save()
+        materialize_horizon([template])
+
+    def perform_update(self, serializer):
+        template = serializer.save()
+        refresh_occurrences(template)
+
+    def perform_destroy(self, instance):
+        drop_unbooked_occurrences(instance)
+        instance.delete()
@@ -0,0 +1,238 @@
+"""
+Synthetic city workloads for load testing and benchmarks
+
+Organizations are placed in a city and given an office campus in one of
+its business districts. Employees live around the city centre (normal
+distribution, HOME_SPREAD_KM) and work at their campus (OFFICE_SPREAD_KM),
+and trips follow commute peaks: home to office in the morning, office to
+home in the evening, on the coming weekdays.
+
+Generated organizations use a '.workload.invalid' domain so they can be
+removed again with clear_workload().
+"""
+import math
+import random
+import uuid
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from ecopool_apps.authentication.models import Organization, User, Vehicle
+from ecopool_apps.rewards.models import DiamondWallet
+from .corridor_utils import compute_route_cells, trip_route_points
+from .models import Trip, TripRouteCell
+from .spatial_utils import encode_geohash, MIN_KM_PER_DEGREE_LAT
+
+
+WORKLOAD_DOMAIN_SUFFIX = '.workload.invalid'
+
+# City centre and business districts (latitude, longitude)
+CITY_PRESETS = {
+    'mumbai': {
+        'center': (19.0760, 72.8777),
+        'districts': [(19.0669, 72.8670), (18.9322, 72.8264), (19.1176, 72.9060)],
+    },
+    'bangalore': {
+        'center': (12.9716, 77.5946),
+        'districts': [(12.9698, 77.7500), (12.8452, 77.6602), (13.0475, 77.6211)],
+    },
+    'delhi': {
+        'center': (28.6139, 77.2090),
+        'districts': [(28.4950, 77.0895), (28.6315, 77.2167), (28.6270, 77.3727)],
+    },
+    'pune': {
+        'center': (18.5204, 73.8567),
+        'districts': [(18.5912, 73.7389), (18.5515, 73.9348)],
+    },
+}
+
+HOME_SPREAD_KM = 8.0
+OFFICE_SPREAD_KM = 0.8
+DRIVER_SHARE = 0.35
+# Commute peaks: (mean, standard deviation) in minutes after midnight
+MORNING_PEAK = (8 * 60 + 45, 35)
+EVENING_PEAK = (18 * 60 + 15, 45)
+MORNING_SHARE = 0.6
+SEEKING_SHARE = 0.1
+
+
+def _jitter(rng, point, spread_km):
+    """Point moved by a normally distributed offset of spread_km per axis"""
+    latitude, longitude = point
+    d_lat = rng.gauss(0, spread_km) / MIN_KM_PER_DEGREE_LAT
+    d_lon = rng.gauss(0, spread_km) / (MIN_KM_PER_DEGREE_LAT * math.cos(math.radians(latitude)))
+    return round(latitude + d_lat, 7), round(longitude + d_lon, 7)
+
+
+def _commute_departure(rng, day, peak):
+    mean, deviation = peak
+    minutes = min(max(int(rng.gauss(mean, deviation)), 0), 24 * 60 - 1)
+    return timezone.make_aware(datetime.combine(day, time(minutes // 60, minutes % 60)))
+
+
+def _upcoming_weekdays(days):
+    today = timezone.localdate()
+    weekdays = []
+    day = today + timedelta(days=1)
+    while len(weekdays) < days:
+        if day.weekday() < 5:
+            weekdays.append(day)
+        day += timedelta(days=1)
+    return weekdays
+
+
+def generate_workload(organizations=5, users_per_org=200, trips=10000, cities=('mumbai',), days=5, seed=42):
+    """
+    Create organizations, employees (with vehicles for drivers), diamond
+    wallets and commute trips, using bulk inserts
+    Returns dict with counts and the organization ids
+    """
+    rng = random.Random(seed)
+    token = uuid.uuid4().hex[:8]
+    weekdays = _upcoming_weekdays(days)
+    password = make_password(None)
+
+    with transaction.atomic():
+        orgs = Organization.objects.bulk_create([
+            Organization(
+                name=f'Workload Org {index}',
+                domain=f'org{index}-{token}{WORKLOAD_DOMAIN_SUFFIX}',
+                address=cities[index % len(cities)].title()
+            )
+            for index in range(organizations)
+        ])
+        campuses = {}
+        for index, org in enumerate(orgs):
+            city = CITY_PRESETS[cities[index % len(cities)]]
+            campuses[org.id] = (city, rng.choice(city['districts']))
+
+        users = []
+        for org in orgs:
+            for index in range(users_per_org):
+                users.append(User(
+                    username=f'wl_{token}_{org.id}_{index}',
+                    email=f'user{index}@org{org.id}-{token}{WORKLOAD_DOMAIN_SUFFIX}',
+                    password=password,
+                    organization=org,
+                    role='driver' if index == 0 or rng.random() < DRIVER_SHARE else 'passenger',
+                    gender=rng.choice(['male', 'female']),
+                ))
+        users = User.objects.bulk_create(users, batch_size=1000)
+        # Mirrors the create_diamond_wallet signal, which bulk_create skips
+        DiamondWallet.objects.bulk_create([DiamondWallet(user=user) for user in users], batch_size=1000)
+
+        drivers = [user for user in users if user.role == 'driver']
+        vehicles = Vehicle.objects.bulk_create([
+            Vehicle(
+                driver=driver,
+                vehicle_type=rng.choice(['Hatchback', 'Sedan', 'SUV']),
+                model='Workload',
+                registration_number=f'WL{token}{driver.id}'[:20],
+                fuel_type=rng.choice(['petrol', 'petrol', 'diesel', 'electric', 'hybrid']),
+                capacity=rng.choice([4, 4, 6]),
+                color='white',
+                year=rng.randint(2012, 2024),
+            )
+            for driver in drivers
+        ], batch_size=1000)
+        vehicle_by_driver = {vehicle.driver_id: vehicle for vehicle in vehicles}
+        homes = {user.id: _jitter(rng, campuses[user.organization_id][0]['center'], HOME_SPREAD_KM) for user in users}
+
+        trip_rows = []
+        for _ in range(trips):
+            if rng.random() < SEEKING_SHARE:
+                user = rng.choice(users)
+                trip_type, transport_mode, vehicle, seats = 'seeking', 'auto', None, 1
+            else:
+                user = rng.choice(drivers)
+                vehicle = vehicle_by_driver[user.id]
+                trip_type, transport_mode, seats = 'offering', 'car', rng.randint(1, vehicle.capacity - 1)
+            home = _jitter(rng, homes[user.id], 0.3)
+            office = _jitter(rng, campuses[user.organization_id][1], OFFICE_SPREAD_KM)
+            day = rng.choice(weekdays)
+            if rng.random() < MORNING_SHARE:
+                start, end, departure = home, office, _commute_departure(rng, day, MORNING_PEAK)
+            else:
+                start, end, departure = office, home, _commute_departure(rng, day, EVENING_PEAK)
+            trip_rows.append(Trip(
+                driver=user,
+                vehicle=vehicle,
+                trip_type=trip_type,
+                transport_mode=transport_mode,
+                start_location='Home' if start is home else 'Office',
+                start_latitude=Decimal(str(start[0])),
+                start_longitude=Decimal(str(start[1])),
+                end_location='Office' if start is home else 'Home',
+                end_latitude=Decimal(str(end[0])),
+                end_longitude=Decimal(str(end[1])),
+                # bulk_create skips Trip.save(), which normally fills these
+                start_geohash=encode_geohash(start[0], start[1]),
+                end_geohash=encode_geohash(end[0], end[1]),
+                departure_time=departure,
+                available_seats=seats,
+                gender_preference='any' if rng.random() < 0.85 else user.gender,
+                price_per_seat=Decimal(rng.choice([30, 40, 50, 60, 80])),
+            ))
+        trip_rows = Trip.objects.bulk_create(trip_rows, batch_size=1000)
+
+        cells = [
+            TripRouteCell(trip_id=trip.id, cell=cell, first_offset_km=first, last_offset_km=last)
+            for trip in trip_rows
+            for cell, (first, last) in compute_route_cells(trip_route_points(trip)).items()
+        ]
+        TripRouteCell.objects.bulk_create(cells, batch_size=2000)
+
+    return {
+        'organizations': len(orgs),
+        'users': len(users),
+        'drivers': len(drivers),
+        'trips': len(trip_rows),
+        'route_cells': len(cells),
+        'organization_ids': [org.id for org in orgs],
+        'seed': seed,
+    }
+
+
+def sample_commute_searches(organization_ids, count, seed=42):
+    """
+    Commute-shaped searches by passengers of the generated organizations
+    Returns list of (user, search_params)
+    """
+    rng = random.Random(seed)
+    passengers = list(
+        User.objects.filter(organization_id__in=organization_ids, role='passenger')
+        .select_related('organization')
+    )
+    weekdays = _upcoming_weekdays(1)
+    searches = []
+    for _ in range(count):
+        user = rng.choice(passengers)
+        # Reuse a real trip's endpoints in the rider's organization as the commute
+        trip = Trip.objects.filter(
+            driver__organization_id=user.organization_id
+        ).order_by('?').values('start_latitude', 'start_longitude', 'end_latitude', 'end_longitude').first()
+        start = _jitter(rng, (float(trip['start_latitude']), float(trip['start_longitude'])), 1.0)
+        end = _jitter(rng, (float(trip['end_latitude']), float(trip['end_longitude'])), 0.5)
+        searches.append((user, {
+            'start_latitude': Decimal(str(start[0])),
+            'start_longitude': Decimal(str(start[1])),
+            'end_latitude': Decimal(str(end[0])),
+            'end_longitude': Decimal(str(end[1])),
+            'departure_time': _commute_departure(rng, weekdays[0], MORNING_PEAK),
+            'time_tolerance_minutes': 60,
+            'seats_needed': 1,
+            'max_distance_km': Decimal('5.0'),
+        }))
+    return searches
+
+
+def clear_workload():
+    """Delete every generated organization with its users and trips; returns the number removed"""
+    organizations = Organization.objects.filter(domain__endswith=WORKLOAD_DOMAIN_SUFFIX)
+    count = organizations.count()
+    User.objects.filter(organization__in=organizations).delete()
+    organizations.delete()
+    return count
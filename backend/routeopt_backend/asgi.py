@@ -11,21 +11,24 @@ import os
 
 from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
+from channels.security.websocket import AllowedHostsOriginValidator
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'routeopt_backend.settings')
 
 django_asgi_app = get_asgi_application()
 
 # Import routing after Django setup
-# from ecopool_apps.rides import routing
+from ecopool_apps.authentication.middleware import JWTAuthMiddleware
+from ecopool_apps.rides import routing
 
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
     # WebSocket routing for real-time features (chat, location tracking)
-    # "websocket": AuthMiddlewareStack(
-    #     URLRouter(
-    #         routing.websocket_urlpatterns
-    #     )
-    # ),
+    "websocket": AllowedHostsOriginValidator(
+        JWTAuthMiddleware(
+            URLRouter(
+                routing.websocket_urlpatterns
+            )
+        )
+    ),
 })
@@ -86,6 +86,24 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Take the write lock when a transaction starts so concurrent
+            # writers wait (up to timeout seconds) instead of failing with
+            # "database is locked" when upgrading a read lock.
+            # Trade-off: this applies to every atomic() block, read-only ones
+            # included (ATOMIC_REQUESTS is off, so plain reads outside
+            # atomic() are unaffected), so transactions run one at a time.
+            # Keep atomic blocks short; on PostgreSQL the seat inventory
+            # relies on row locks and conditional UPDATEs instead
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        # File-backed test database: threads in concurrency tests then wait
+        # on the write lock instead of failing as they do on shared-cache
+        # in-memory databases
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
@@ -203,6 +221,113 @@ CHANNEL_LAYERS = {
 }
 
 
+# Trip matching
+# 'fast' scores candidates with vectorized haversine distances,
+# 'precise' uses geodesic distances (slower, ellipsoidal accuracy)
+TRIP_MATCH_DISTANCE_MODE = os.getenv('TRIP_MATCH_DISTANCE_MODE', 'fast')
+# Search result cache. 'django' shares entries and invalidations through
+# CACHES[TRIP_SEARCH_CACHE_ALIAS]; 'local' keeps an in-process LRU and is only
+# correct with a single worker, since other workers would keep serving seat
+# counts they never saw change. Off by default: enable it together with a
+# shared CACHES backend (Redis, Memcached) or on a single-process deployment
+TRIP_SEARCH_CACHE_ENABLED = os.getenv('TRIP_SEARCH_CACHE_ENABLED', 'False') == 'True'
+TRIP_SEARCH_CACHE_BACKEND = os.getenv('TRIP_SEARCH_CACHE_BACKEND', 'django')
+TRIP_SEARCH_CACHE_ALIAS = 'default'
+TRIP_SEARCH_CACHE_MAX_ENTRIES = 1024
+TRIP_SEARCH_CACHE_BUCKET_MINUTES = 15
+# Geohash precision of the start/end cells in the key (7 = ~150m)
+TRIP_SEARCH_CACHE_KEY_PRECISION = 7
+# Upper bound for ?page_size= on keyset-paginated search
+TRIP_SEARCH_MAX_PAGE_SIZE = 100
+
+# Recurring trips: occurrences within HORIZON_DAYS are created as Trip rows
+# (materialize_recurring_trips); later ones are served from the templates
+# until booked. Searches without a date look LOOKAHEAD_DAYS ahead for the
+# next occurrence.
+RECURRING_TRIP_HORIZON_DAYS = 2
+RECURRING_TRIP_LOOKAHEAD_DAYS = 60
+
+# Minutes a new trip request holds its seats while waiting for the driver
+# (0 = no holds; seats are only taken on accept)
+TRIP_SEAT_HOLD_MINUTES = 15
+
+# Batch assignment (run_batch_assignment / POST /api/assignment-proposals/run/)
+# Seeking trips are matched to offers whose start and end are both within
+# MAX_DETOUR_KM and whose departure is within MAX_TIME_DEVIATION_MINUTES.
+# Cost = detour_km * DETOUR_WEIGHT + minutes * TIME_WEIGHT
+#        + (5 - driver trust score) * TRUST_WEIGHT
+TRIP_ASSIGNMENT_MAX_DETOUR_KM = 5.0
+TRIP_ASSIGNMENT_MAX_TIME_DEVIATION_MINUTES = 30
+TRIP_ASSIGNMENT_MAX_CANDIDATES = 10
+TRIP_ASSIGNMENT_DETOUR_WEIGHT = 1.0
+TRIP_ASSIGNMENT_TIME_WEIGHT = 0.1
+TRIP_ASSIGNMENT_TRUST_WEIGHT = 1.0
+# Ride-mate groups for seeking trips: members' origins and destinations
+# within TRIP_GROUP_RADIUS_KM of the group centroid and departures within
+# TRIP_GROUP_TIME_TOLERANCE_MINUTES; one minute of offset scores like
+# TRIP_GROUP_KM_PER_MINUTE km of distance
+TRIP_GROUP_RADIUS_KM = 1.0
+TRIP_GROUP_TIME_TOLERANCE_MINUTES = 15
+TRIP_GROUP_KM_PER_MINUTE = 0.1
+
+
+# Diamond leaderboard
+# Keep sorted per-organization/global leaderboards in process memory instead
+# of counting wallets in the database on each dashboard load. Single process
+# only: wallet changes made by other workers are not seen (new wallets are,
+# by reloading on a miss)
+LEADERBOARD_IN_MEMORY = os.getenv('LEADERBOARD_IN_MEMORY', 'False') == 'True'
+
+
+# Ride tracking ingestion
+# GPS fixes are buffered per process and written with bulk_create when
+# either limit is reached. The buffers (and the live socket writer below)
+# assume a single worker process: ride completion, the tracking endpoint
+# and track compression only see the current process's unsaved points, so
+# with several workers fixes buffered elsewhere miss settlement. Running
+# more workers needs a shared queue in front of ingest_location_fixes.
+RIDE_TRACKING_BATCH_SIZE = 100
+RIDE_TRACKING_FLUSH_SECONDS = 5.0
+# Fixes pushed over the live ride WebSocket are broadcast immediately and
+# written to the database by a background thread every this many seconds
+RIDE_LIVE_WRITE_SECONDS = 1.0
+# Chat messages sent over the live ride WebSocket are delivered at once and
+# written with bulk_create every FLUSH_SECONDS or once BATCH_SIZE are
+# waiting; a connecting participant gets at most BACKLOG_LIMIT missed messages
+CHAT_PERSIST_BATCH_SIZE = 50
+CHAT_PERSIST_FLUSH_SECONDS = 0.5
+CHAT_BACKLOG_LIMIT = 200
+
+# Delta sync (?since_id= / ?updated_since= on chat, trip request and ride
+# lists): rows per response, how long rows stay in the window after an
+# update so late commits are not missed, and how long deletions are kept
+# as tombstones (clients offline for longer should do a full sync)
+SYNC_MAX_RESULTS = 500
+SYNC_WATERMARK_LAG_SECONDS = 5
+SYNC_TOMBSTONE_RETENTION_DAYS = 7
+# Ride membership checks (chat, SOS, live channel) are answered from a
+# per-process cache of members for this many seconds; 0 disables it
+RIDE_MEMBERSHIP_CACHE_SECONDS = 30
+
+# Retention purges (purge_expired_data): rows deleted per transaction, pause
+# between batches, and how long finished rides keep raw GPS points and
+# expired redemptions are kept
+RETENTION_BATCH_SIZE = 1000
+RETENTION_BATCH_SLEEP_SECONDS = 0.05
+RETENTION_RIDE_TRACKING_DAYS = 30
+RETENTION_REDEMPTION_DAYS = 365
+# Maximum deviation (meters) allowed when simplifying a completed ride's track
+RIDE_TRACK_TOLERANCE_METERS = 5.0
+# Path length filtering: ignore moves shorter than this (GPS jitter) and
+# fixes implying a speed above this (outliers)
+RIDE_PATH_MIN_STEP_METERS = 10.0
+RIDE_PATH_MAX_SPEED_KMH = 180.0
+# Device clocks may run this far ahead of the server; fixes stamped later
+# than that are taken as recorded now, so a phone with a wrong clock cannot
+# freeze the ride's position or distance
+RIDE_FIX_MAX_CLOCK_SKEW_SECONDS = 120
+
+
 # Logging configuration
 LOGGING = {
     'version': 1,
@@ -26,6 +26,9 @@ router.register(r'vehicles', auth_views.VehicleViewSet, basename='vehicle')
 # Trip routes
 router.register(r'trips', trip_views.TripViewSet, basename='trip')
 router.register(r'trip-requests', trip_views.TripRequestViewSet, basename='trip-request')
+router.register(r'recurring-trips', trip_views.RecurringTripViewSet, basename='recurring-trip')
+router.register(r'assignment-proposals', trip_views.AssignmentProposalViewSet, basename='assignment-proposal')
+router.register(r'ride-groups', trip_views.RideGroupViewSet, basename='ride-group')
 
 # Ride routes
 router.register(r'rides', ride_views.RideViewSet, basename='ride')